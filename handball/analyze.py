@@ -1,10 +1,33 @@
 # coding: utf-8
+import json
+import re
+
 from itertools import chain, ifilter, imap
 
+from .database import MatchDatabase, is_database
+from .identity import PlayerIndex
+from .leaderboards import Leaderboards  # noqa, for the shell
+from .reader import MatchFile
+from .stats import aggregate, aggregate_all  # noqa, for the shell
+from .store import MatchStore
+from .timeline import Timeline  # noqa, for the shell
+
+# Used to check the raw JSON text of a match before it's decoded (see
+# handball.reader). They may match more than the predicates do but never
+# less.
+JSON_STRING = r'("[^"\\]*(?:\\.[^"\\]*)*")'
+RAW_NAME_RE = re.compile(r'"name":\s*' + JSON_STRING)
+RAW_TOURNAMENT_RE = re.compile(r'"tournament":\s*' + JSON_STRING)
+RAW_YEAR_RE = re.compile(r'"year":\s*(-?\d+)')
+
 
 def player_in_match(name):
     _name = name.lower()
 
+    def raw(text):
+        return any(json.loads(value).lower() == _name
+                   for value in RAW_NAME_RE.findall(text))
+
     def get_lowercase_name(player):
         return player.get("name", "").lower()
 
@@ -16,24 +39,40 @@ def player_in_match(name):
                 return True
         return False
 
+    wrapped.raw = raw
     return wrapped
 
 
 def match_in_season(year):
+    def raw(text):
+        found = RAW_YEAR_RE.search(text)
+        return not found or int(found.group(1)) == year
+
     def wrapped(match):
         return match["year"] == year
+
+    wrapped.raw = raw
     return wrapped
 
 
 def match_in_tournament(tournament_name):
     tournament = tournament_name.lower()
 
+    def raw(text):
+        found = RAW_TOURNAMENT_RE.search(text)
+        return not found or json.loads(found.group(1)).lower() == tournament
+
     def wrapped(match):
         return match["tournament"].lower() == tournament
+
+    wrapped.raw = raw
     return wrapped
 
 
 def count_goals(name, matches):
+    if isinstance(matches, (MatchStore, PlayerIndex, MatchDatabase)):
+        return matches.count_goals(name)
+
     _name = name.lower()
 
     def find_goals(match):
@@ -44,18 +83,34 @@ def count_goals(name, matches):
 
         return 0
 
+    if isinstance(matches, MatchFile):
+        matches = matches.where(player_in_match(name))
+
     return sum(imap(find_goals, matches))
 
 
 def count_appearances(name, matches):
-    return len(filter(player_in_match(name), data))
+    if isinstance(matches, (MatchStore, PlayerIndex, MatchDatabase)):
+        return matches.count_appearances(name)
+
+    predicate = player_in_match(name)
+    if isinstance(matches, MatchFile):
+        return sum(1 for _ in matches.where(predicate))
+
+    return sum(1 for _ in ifilter(predicate, matches))
 
 
 if __name__ == "__main__":
     import code
-    import json
+    import os
     import sys
-    data = json.load(open(sys.argv[1], "r"))
+    if os.path.exists(os.path.join(sys.argv[1], "meta.json")):
+        data = MatchStore.load(sys.argv[1])
+    elif is_database(sys.argv[1]):
+        data = MatchDatabase(sys.argv[1])
+    else:
+        # read lazily every time `data` is iterated over
+        data = MatchFile(sys.argv[1])
 
     code.interact("Play around with the data. It's in the `data` variable",
                   local=locals())
@@ -0,0 +1,34 @@
+# coding: utf-8
+"""
+Micro-benchmarks for the spider's parsing code. They run over the pages in
+``handball/tests/responses`` so no network access is needed, e.g.:
+
+    $ python -m handball.benchmarks.dates
+"""
+import os
+import timeit
+
+RESPONSES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "tests", "responses")
+
+
+def response_files():
+    """
+    The absolute paths of all the fixture pages.
+    """
+    return sorted(
+        os.path.join(RESPONSES_DIR, name)
+        for name in os.listdir(RESPONSES_DIR) if name.endswith(".html"))
+
+
+def best_of(function, number, repeat=5):
+    """
+    The best time, in seconds, of ``repeat`` runs of ``number`` calls to
+    ``function``.
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat))
+
+
+def report(name, seconds, count, unit):
+    print("{0:<30} {1:>12,.0f} {2}/sec".format(name, count / seconds, unit))
@@ -0,0 +1,139 @@
+# coding: utf-8
+"""
+Time a whole hsi-scraper crawl against the stand-in site (see
+``handball.benchmarks.site``), with the project's settings, the downloader,
+the middlewares and the pipelines, and report the requests and items per
+second, the CPU time and the peak memory of the crawl.
+
+The site is served from another process so its work isn't counted. The
+HTTP cache is off and the crawl's settings can be changed with ``-s``:
+
+    $ python -m handball.benchmarks.crawl --seasons 2 --tournaments 20 \\
+        --games 100 --latency 0.05 -s CONCURRENT_REQUESTS=32
+
+The results are also written as JSON with ``--output``.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+
+from collections import OrderedDict
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from ..spiders.hsi import HSISpider
+from .site import GAMES, SEASONS, TOURNAMENTS
+
+SETTINGS = {
+    "HTTPCACHE_ENABLED": False,
+    "ROBOTSTXT_OBEY": False,
+    "TELNETCONSOLE_ENABLED": False,
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def start_site(args):
+    """
+    Start serving the site in a new process. Returns the process and the
+    port it's listening on.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "handball.benchmarks.site", "--port", "0",
+         "--latency", str(args.latency), "--seasons", str(args.seasons),
+         "--tournaments", str(args.tournaments), "--games", str(args.games)],
+        stdout=subprocess.PIPE)
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError("The site didn't start")
+    return process, int(line.split()[-1])
+
+
+def parse_settings(values):
+    """
+    The ``-s NAME=VALUE`` arguments as a dict.
+    """
+    settings = {}
+    for value in values:
+        name, _, value = value.partition("=")
+        settings[name] = value
+    return settings
+
+
+def summarize(stats, cpu, peak_rss):
+    """
+    The results of a crawl from its stats, the CPU seconds and the peak
+    resident memory in KB.
+    """
+    seconds = (stats["finish_time"] - stats["start_time"]).total_seconds()
+    requests = stats.get("downloader/request_count", 0)
+    items = stats.get("item_scraped_count", 0)
+    return OrderedDict([
+        ("seconds", seconds),
+        ("requests", requests),
+        ("items", items),
+        ("requests_per_second", requests / seconds),
+        ("items_per_second", items / seconds),
+        ("cpu_seconds", cpu),
+        ("cpu_utilization", cpu / seconds),
+        ("peak_rss_mb", peak_rss / 1024.0),
+        ("errors", stats.get("log_count/ERROR", 0)),
+        ("not_found", stats.get("downloader/response_status_count/404", 0)),
+    ])
+
+
+def crawl(port, settings):
+    """
+    Crawl the site served on ``port``. Returns the results of the crawl.
+    """
+    os.environ["http_proxy"] = "http://127.0.0.1:{0}".format(port)
+    project_settings = get_project_settings()
+    project_settings.setdict(dict(SETTINGS, **settings), priority="cmdline")
+
+    process = CrawlerProcess(project_settings)
+    crawler = process.create_crawler(HSISpider)
+    process.crawl(crawler)
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    process.start()
+    after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu = (after.ru_utime - before.ru_utime) + \
+        (after.ru_stime - before.ru_stime)
+    # ru_maxrss is in KB on Linux
+    return summarize(crawler.stats.get_stats(), cpu, after.ru_maxrss)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seasons", type=int, default=SEASONS)
+    parser.add_argument("--tournaments", type=int, default=TOURNAMENTS)
+    parser.add_argument("--games", type=int, default=GAMES,
+                        help="games per tournament")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before each response (default 0)")
+    parser.add_argument("-s", dest="settings", action="append", default=[],
+                        metavar="NAME=VALUE", help="a crawl setting")
+    parser.add_argument("--output", help="write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    site, port = start_site(args)
+    try:
+        results = crawl(port, parse_settings(args.settings))
+    finally:
+        site.terminate()
+        site.wait()
+
+    for name, value in results.items():
+        print("{0:<22} {1:>12,.2f}".format(name, value))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return 1 if results["errors"] or results["not_found"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
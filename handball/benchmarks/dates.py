@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+Benchmark ``_parse_date`` over the date of every game row in the fixture
+pages, with and without its cache, and compare with the locale based
+``strptime`` implementation if the is_IS locale is installed.
+
+    $ python -m handball.benchmarks.dates
+"""
+import locale
+
+from ..spiders import hsi
+from ..tests.utils import fake_response_from_file
+from . import best_of, report, response_files
+
+
+def fixture_dates():
+    """
+    All the "date time" strings from the game rows in the fixture pages, as
+    they are passed to ``_parse_date`` by ``parse_tournament``.
+    """
+    dates = []
+    for file_name in response_files():
+        response = fake_response_from_file(file_name)
+        for row in response.xpath(
+                "//th[text() = 'Dagur']/../following-sibling::tr"
+                "[count(td) = 6]"):
+            date, time = row.xpath("td")[:2]
+            dates.append(" ".join((hsi._text(date), hsi._text(time))))
+    return dates
+
+
+def has_icelandic_locale():
+    try:
+        with hsi.use_locale("is_IS.UTF-8"):
+            return True
+    except locale.Error:
+        return False
+
+
+def main():
+    dates = fixture_dates()
+    print("{0} dates from the fixture pages".format(len(dates)))
+
+    def uncached():
+        hsi._date_cache.clear()
+        for date in dates:
+            hsi._parse_date(date)
+
+    def cached():
+        for date in dates:
+            hsi._parse_date(date)
+
+    report("_parse_date (uncached)", best_of(uncached, 100),
+           100 * len(dates), "dates")
+    report("_parse_date (cached)", best_of(cached, 100),
+           100 * len(dates), "dates")
+
+    if not has_icelandic_locale():
+        print("is_IS.UTF-8 locale not installed, skipping strptime")
+        return
+
+    def strptime():
+        for date in dates:
+            hsi._parse_date_strptime(date)
+
+    report("_parse_date_strptime", best_of(strptime, 100),
+           100 * len(dates), "dates")
+    mismatches = [date for date in dates
+                  if hsi._parse_date(date) != hsi._parse_date_strptime(date)]
+    print("{0} mismatches with strptime".format(len(mismatches)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# coding: utf-8
+"""
+Benchmark the roster table extraction in ``parse_game`` on the game pages in
+the fixtures. Compares the single pass ``roster_rows`` with the per cell
+XPath evaluation it replaced, both on their own and as part of a full
+``parse_game`` run (including building the response and parsing the HTML),
+inline and in a ``ParseWorkerPool``.
+
+    $ python -m handball.benchmarks.game
+"""
+import cPickle as pickle
+import multiprocessing
+import os
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.selector import Selector
+
+from ..spiders import hsi
+from ..spiders.hsi import HSISpider, clean_tag_text, game_item, roster_rows
+from ..workers import ParseWorkerPool, _parse
+from . import best_of, report, response_files
+
+GAME_PAGES = (
+    "game.html",
+    "kr-throttur-missing-column.html",
+    "selfoss-stjarnan-1994-missing-team.html",
+    "selfoss-vikingur-1994.html",
+)
+
+
+def xpath_roster_rows(team):
+    """
+    The XPath based roster table walk ``roster_rows`` replaced. Accepts the
+    team link selector.
+    """
+    for row in team.xpath("ancestor::tr/following-sibling::tr"):
+        if row.xpath("th"):
+            yield True, [clean_tag_text(" ".join(f)) for f in (
+                e.xpath("text()").extract() for e in row.xpath("th"))]
+        else:
+            yield False, [clean_tag_text(" ".join(s)) for s in (
+                e.xpath("text()").extract() for e in row.xpath("td"))]
+
+
+def game_pages():
+    """
+    The bodies of the game pages in the fixtures, keyed on the file name.
+    """
+    pages = {}
+    for file_name in response_files():
+        if os.path.basename(file_name) in GAME_PAGES:
+            with open(file_name, "rb") as f:
+                pages[os.path.basename(file_name)] = f.read()
+    return pages
+
+
+def make_response(body):
+    url = "http://hsi.is/motamal/game.htm"
+    return HtmlResponse(url=url, request=Request(url), body=body,
+                        encoding="iso-8859-1")
+
+
+def main():
+    spider = HSISpider()
+    pages = game_pages()
+    responses = [make_response(body) for body in pages.values()]
+    teams = [team for response in responses
+             for team in response.xpath("//td[@class = 'haus']/a")]
+
+    for team in teams:
+        assert list(xpath_roster_rows(team)) == list(roster_rows(team.root))
+
+    def extract_xpath():
+        for team in teams:
+            list(xpath_roster_rows(team))
+
+    def extract_single_pass():
+        for team in teams:
+            list(roster_rows(team.root))
+
+    def parse_pages():
+        for body in pages.values():
+            list(spider.parse_game(make_response(body)))
+
+    report("roster tables (xpath)", best_of(extract_xpath, 50),
+           50 * len(responses), "pages")
+    report("roster tables (single pass)", best_of(extract_single_pass, 50),
+           50 * len(responses), "pages")
+
+    report("parse_game", best_of(parse_pages, 50),
+           50 * len(pages), "pages")
+    # run parse_game again with the XPath walk swapped in
+    original = hsi.roster_rows
+    hsi.roster_rows = lambda root: xpath_roster_rows(
+        Selector(root=root, type="html"))
+    try:
+        report("parse_game (xpath)", best_of(parse_pages, 50),
+               50 * len(pages), "pages")
+    finally:
+        hsi.roster_rows = original
+
+    # the same pages in a worker pool, including sending the bodies to the
+    # workers and the items back
+    workers = ParseWorkerPool()
+    url = make_response("").url
+
+    def parse_in_workers():
+        for result in [
+                workers.pool.apply_async(_parse, (pickle.dumps(
+                    (game_item, url, body, "iso-8859-1", {}),
+                    pickle.HIGHEST_PROTOCOL),))
+                for _ in xrange(50) for body in pages.values()]:
+            assert result.get()[0]
+
+    try:
+        report("parse_game ({0} workers)".format(multiprocessing.cpu_count()),
+               best_of(parse_in_workers, 1), 50 * len(pages), "pages")
+    finally:
+        workers.close()
+
+
+if __name__ == "__main__":
+    main()
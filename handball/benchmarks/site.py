@@ -0,0 +1,236 @@
+# coding: utf-8
+"""
+A stand-in for the hsi.is results site, to crawl offline.
+
+The site is generated from the fixture pages: SEASONS seasons, each with
+TOURNAMENTS tournament pages (the fixture tournament page with its title,
+year and game rows rewritten) and GAMES games per tournament. The games
+take turns being one of the fixture game pages, each with its row from the
+fixture tournament page so the score adds up to the rosters. The newest season is at
+http://hsi.is/motamal/ like on the real site.
+
+The server is an HTTP proxy: the spider is crawled with ``http_proxy``
+pointing at it so the urls, the duplicate filter and the page classes are
+the same as against hsi.is. Every response is held back for ``--latency``
+seconds:
+
+    $ python -m handball.benchmarks.site --port 8080 --latency 0.05
+    $ http_proxy=http://127.0.0.1:8080 scrapy crawl hsi-scraper \\
+        -s HTTPCACHE_ENABLED=0
+
+See ``handball.benchmarks.crawl`` for timing a whole crawl against it.
+"""
+import argparse
+import re
+import sys
+import urlparse
+
+from twisted.internet import reactor
+from twisted.web import resource, server
+
+from .suite import load_pages
+
+SEASONS = 3
+TOURNAMENTS = 10
+GAMES = 50
+LAST_YEAR = 2016
+
+# the fixture game pages and the index of their game's row on the fixture
+# tournament page
+FIXTURE_GAMES = (
+    ("game.html", 3),
+    ("kr-throttur-missing-column.html", 74),
+)
+
+ENCODING = "iso-8859-1"
+
+TOURNAMENT_LINK_RE = re.compile(
+    r'[ \t]*<a href = "mot_\d+\.htm">([^<]*)</a><br>\n')
+SEASON_LINKS_RE = re.compile(
+    r'(nnur t\xedmabil</td></tr>\s*<tr><td>\n)(.*?)(\s*</td></tr>)',
+    re.DOTALL)
+GAME_ROWS_RE = re.compile(r"(<th>Dagur</th>.*?</tr>\n)(.*?)(   </table>)",
+                          re.DOTALL)
+GAME_ROW_RE = re.compile(r"   <tr><td nowrap class=lina\w*\s*>.*?</tr>\n",
+                         re.DOTALL)
+GAME_LINK_RE = re.compile(r'<a href="\d+_\d+\.htm">')
+DATE_YEAR_RE = re.compile(r"(\d+\.\w+\.)(\d{4})")
+TITLE_RE = re.compile(r"(<td class=haus>\s*)[^<]*?(\s*<a href = \")"
+                      r"HSI\d{4}\.HTM(\" class=timabil> )\d{4}")
+YEAR_RE = re.compile(r"(Handknattleikur\s+-\s+)\d{4}")
+
+
+def _template(body):
+    return body.decode(ENCODING).replace(u"\r\n", u"\n")
+
+
+class SyntheticSite(object):
+    """
+    The pages (latin-1 bytes) of a generated site, by path.
+
+    Tournament ids are the year followed by the tournament's number in the
+    season and a game's number in its tournament is in its url, so a page
+    is generated from its path alone when it's requested.
+    """
+
+    def __init__(self, pages, seasons=SEASONS, tournaments=TOURNAMENTS,
+                 games=GAMES, last_year=LAST_YEAR):
+        self.years = range(last_year - seasons + 1, last_year + 1)
+        self.tournaments = tournaments
+        self.games = games
+
+        self.season_template = _template(pages["tournament_list.html"])
+        # the titles in the men's and women's tables
+        self.titles = TOURNAMENT_LINK_RE.findall(self.season_template[
+            self.season_template.index(u">Karlar<"):
+            self.season_template.index(u">Landsleikir<")])
+        self.tournament_template = _template(pages["tournament.html"])
+        rows = GAME_ROW_RE.findall(
+            GAME_ROWS_RE.search(self.tournament_template).group(2))
+        self.game_rows = [rows[index] for _, index in FIXTURE_GAMES]
+        self.game_pages = [pages[name] for name, _ in FIXTURE_GAMES]
+
+    def title(self, number):
+        title = self.titles[number % len(self.titles)]
+        if number >= len(self.titles):
+            title = u"{0} {1}".format(title, number // len(self.titles) + 1)
+        return title
+
+    def tournament_id(self, year, number):
+        return year * 1000 + number
+
+    def season_page(self, year):
+        links = u"".join(
+            u'       <a href = "HSI{0}.HTM"> {0} </a><br>\n'.format(other)
+            for other in self.years if other != year)
+        page = SEASON_LINKS_RE.sub(
+            lambda found: found.group(1) + links + found.group(3).lstrip("\n"),
+            self.season_template)
+        page = YEAR_RE.sub(lambda found: found.group(1) + str(year), page)
+
+        # all the tournaments go in the first list of the men's table
+        links = u"".join(
+            u'          <a href = "mot_{0:010d}.htm">{1}</a><br>\n'.format(
+                self.tournament_id(year, number), self.title(number))
+            for number in xrange(self.tournaments))
+        page = TOURNAMENT_LINK_RE.sub(u"", page)
+        start = page.index(u"<tr><td>\n", page.index(u">Karlar<")) + 9
+        page = page[:start] + links + page[start:]
+        return page.encode(ENCODING)
+
+    def tournament_page(self, tournament_id):
+        year, number = divmod(tournament_id, 1000)
+        if year not in self.years or number >= self.tournaments:
+            return None
+
+        rows = []
+        for game in xrange(self.games):
+            row = self.game_rows[game % len(self.game_rows)]
+            row = GAME_LINK_RE.sub(
+                u'<a href="{0:010d}_{1:08d}.htm">'.format(tournament_id, game),
+                row)
+            # the fixture page is from the 2016 season
+            rows.append(DATE_YEAR_RE.sub(
+                lambda found: found.group(1) + str(
+                    int(found.group(2)) + year - LAST_YEAR), row))
+        page = GAME_ROWS_RE.sub(
+            lambda found: found.group(1) + u"".join(rows) + found.group(3),
+            self.tournament_template)
+        page = TITLE_RE.sub(
+            lambda found: u"{0}{1}{2}HSI{3}.HTM{4}{3}".format(
+                found.group(1), self.title(number), found.group(2), year,
+                found.group(3)), page)
+        return page.encode(ENCODING)
+
+    def game_page(self, tournament_id, game):
+        year, number = divmod(tournament_id, 1000)
+        if year not in self.years or number >= self.tournaments or \
+                game >= self.games:
+            return None
+        return self.game_pages[game % len(self.game_pages)]
+
+    def page(self, path):
+        """
+        The body of the page at ``path`` or None if there's no such page.
+        Paths are case insensitive, like on hsi.is.
+        """
+        path = path.lower()
+        if path.rstrip("/") == "/motamal":
+            return self.season_page(self.years[-1])
+        found = re.match(r"^/motamal/hsi(\d{4})\.htm$", path)
+        if found:
+            year = int(found.group(1))
+            return self.season_page(year) if year in self.years else None
+        found = re.match(r"^/motamal/mot_(\d+)\.htm$", path)
+        if found:
+            return self.tournament_page(int(found.group(1)))
+        found = re.match(r"^/motamal/(\d+)_(\d+)\.htm$", path)
+        if found:
+            return self.game_page(int(found.group(1)), int(found.group(2)))
+        return None
+
+    def __len__(self):
+        """
+        The number of pages on the site.
+        """
+        return len(self.years) * (1 + self.tournaments * (1 + self.games))
+
+
+class SiteResource(resource.Resource):
+    """
+    Serves the pages of a ``SyntheticSite``, each after ``latency`` seconds.
+    """
+    isLeaf = True
+
+    def __init__(self, site, latency=0.0):
+        resource.Resource.__init__(self)
+        self.site = site
+        self.latency = latency
+        self.requests = 0
+
+    def render_GET(self, request):
+        self.requests += 1
+        # proxied requests have the absolute url
+        body = self.site.page(urlparse.urlparse(request.uri).path)
+        if body is None:
+            request.setResponseCode(404)
+            body = b"Not found"
+        else:
+            request.setHeader(b"Content-Type",
+                              b"text/html; charset=" + ENCODING)
+        if not self.latency:
+            return body
+
+        def respond():
+            if not request._disconnected:
+                request.write(body)
+                request.finish()
+        reactor.callLater(self.latency, respond)
+        return server.NOT_DONE_YET
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8080,
+                        help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before each response (default 0)")
+    parser.add_argument("--seasons", type=int, default=SEASONS)
+    parser.add_argument("--tournaments", type=int, default=TOURNAMENTS)
+    parser.add_argument("--games", type=int, default=GAMES,
+                        help="games per tournament")
+    args = parser.parse_args(argv)
+
+    site = SyntheticSite(load_pages(), args.seasons, args.tournaments,
+                         args.games)
+    port = reactor.listenTCP(args.port, server.Site(
+        SiteResource(site, args.latency)), interface="127.0.0.1")
+    # the crawl harness reads the port from the first line
+    print("Serving {0} pages on port {1}".format(len(site),
+                                                 port.getHost().port))
+    sys.stdout.flush()
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# coding: utf-8
+"""
+Time the spider's parse callbacks end to end (building the response from
+the page body, parsing the HTML and running the callback) over a synthetic
+full season, and compare the results with a stored baseline.
+
+The fixture pages are read once and replicated in memory into a season: the
+season page, TOURNAMENTS tournament pages and GAMES game pages (the fixture
+game pages with the urls and meta of the games on the tournament pages).
+
+    $ python -m handball.benchmarks.suite
+    $ python -m handball.benchmarks.suite --update-baseline
+
+The rates are stored relative to a fixed pure Python workload (see
+``calibrate``) so a baseline taken on one machine can be compared with runs
+on another. A benchmark more than ``--tolerance`` slower than the baseline
+fails the run with exit status 1.
+
+Memory is measured with ``tracemalloc`` (in KB allocated per page) when it
+can be imported and otherwise as the number of objects the garbage
+collector tracks after parsing, per page.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+
+from collections import OrderedDict
+
+from scrapy.http import HtmlResponse, Request
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from ..spiders.hsi import HSISpider, roster_rows
+from ..spiders.hsi_profiles import get_player_parser
+from . import RESPONSES_DIR, best_of
+from .game import GAME_PAGES
+
+BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        "baseline.json")
+
+SEASON_URL = "http://hsi.is/motamal/"
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_{0:010d}.htm"
+
+TOURNAMENTS = 20
+GAMES = 2000
+
+
+def load_pages():
+    """
+    The bodies of the fixture pages, keyed on the file name.
+    """
+    pages = {}
+    for name in os.listdir(RESPONSES_DIR):
+        if name.endswith(".html"):
+            with open(os.path.join(RESPONSES_DIR, name), "rb") as f:
+                pages[name] = f.read()
+    return pages
+
+
+def make_response(url, body, meta=None):
+    return HtmlResponse(url=url, request=Request(url, meta=meta or {}),
+                        body=body, encoding="iso-8859-1")
+
+
+class Season(object):
+    """
+    A synthetic season: (url, body, meta) for the season page, the
+    tournament pages and the game pages.
+    """
+
+    def __init__(self, pages, tournaments=TOURNAMENTS, games=GAMES):
+        spider = HSISpider()
+        self.season = [(SEASON_URL, pages["tournament_list.html"], {})]
+        self.tournaments = [
+            (TOURNAMENT_URL.format(i), pages["tournament.html"], {})
+            for i in xrange(tournaments)]
+
+        requests = [
+            request for url, body, meta in self.tournaments
+            for request in spider.parse_tournament(make_response(url, body))
+            if isinstance(request, Request)]
+        bodies = [pages[name] for name in GAME_PAGES]
+        self.games = [
+            (requests[i % len(requests)].url, bodies[i % len(bodies)],
+             requests[i % len(requests)].meta)
+            for i in xrange(games)]
+
+        self.headers = [
+            tuple(fields) for url, body, meta in self.games
+            for team in make_response(url, body).xpath(
+                "//td[@class = 'haus']/a")
+            for is_header, fields in roster_rows(team.root) if is_header]
+
+
+def benchmarks(season):
+    """
+    (name, function, units per call, unit) for each benchmark. The functions
+    return what they parsed.
+    """
+    spider = HSISpider()
+
+    def run(callback, pages):
+        def parse():
+            return [result for url, body, meta in pages
+                    for result in callback(make_response(url, body, meta))]
+        return parse
+
+    return [
+        ("parse", run(spider.parse, season.season * 10),
+         10 * len(season.season), "pages"),
+        ("parse_tournament", run(spider.parse_tournament, season.tournaments),
+         len(season.tournaments), "pages"),
+        ("parse_game", run(spider.parse_game, season.games),
+         len(season.games), "pages"),
+        ("get_player_parser",
+         lambda: [get_player_parser(header) for header in season.headers],
+         len(season.headers), "headers"),
+    ]
+
+
+def calibrate():
+    """
+    Calls per second of a fixed pure Python workload (string formatting,
+    dict and list operations), to compare rates across machines.
+    """
+    def workload():
+        counts = {}
+        for i in xrange(20000):
+            key = "{0}-{1}".format(i % 97, i % 13)
+            counts[key] = counts.get(key, 0) + 1
+        return sorted(counts.items())
+    return 10 / best_of(workload, 10)
+
+
+def memory_per_unit(function, count):
+    """
+    KB allocated (at peak) per unit with tracemalloc, otherwise the objects
+    the garbage collector tracks after the function ran, per unit.
+    """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 1024.0 / count, "KB"
+
+    before = len(gc.get_objects())
+    result = function()
+    objects = len(gc.get_objects()) - before
+    del result
+    return float(objects) / count, "objects"
+
+
+def run(season, repeat=3):
+    """
+    The rate, unit and memory per unit of each benchmark.
+    """
+    results = OrderedDict()
+    for name, function, count, unit in benchmarks(season):
+        seconds = best_of(function, 1, repeat)
+        memory, memory_unit = memory_per_unit(function, count)
+        results[name] = {
+            "rate": count / seconds,
+            "unit": unit,
+            "memory": memory,
+            "memory_unit": memory_unit,
+        }
+    return results
+
+
+def compare(results, calibration, baseline, tolerance):
+    """
+    The names of the benchmarks that are more than ``tolerance`` (a
+    fraction) slower than the baseline, after adjusting the baseline rates
+    to the speed of this machine.
+    """
+    scale = calibration / baseline["calibration"]
+    return sorted(
+        name for name, result in results.items()
+        if name in baseline["benchmarks"] and result["rate"] <
+        baseline["benchmarks"][name]["rate"] * scale * (1 - tolerance))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=GAMES)
+    parser.add_argument("--tournaments", type=int, default=TOURNAMENTS)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="how much slower than the baseline is a "
+                             "regression (default 0.3)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    season = Season(load_pages(), args.tournaments, args.games)
+    calibration = calibrate()
+    results = run(season)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    scale = calibration / baseline["calibration"] if baseline else None
+
+    for name, result in results.items():
+        line = "{0:<20} {1:>10,.0f} {2}/sec {3:>10,.1f} {4}/{5}".format(
+            name, result["rate"], result["unit"], result["memory"],
+            result["memory_unit"], result["unit"].rstrip("s"))
+        expected = baseline and baseline["benchmarks"].get(name)
+        if expected:
+            line += " {0:>+7.1%} vs baseline".format(
+                result["rate"] / (expected["rate"] * scale) - 1)
+        print(line)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"calibration": calibration, "benchmarks": results}, f,
+                      indent=2, separators=(",", ": "), sort_keys=True)
+            f.write("\n")
+        print("Baseline written to {0}".format(args.baseline))
+        return 0
+
+    if baseline:
+        slower = compare(results, calibration, baseline, args.tolerance)
+        if slower:
+            print("REGRESSION: {0} more than {1:.0%} slower than the "
+                  "baseline".format(", ".join(slower), args.tolerance))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# coding: utf-8
+"""
+A normalized SQLite database of the matches scraped by the hsi-scraper
+spider.
+
+Tournaments, teams, venues and people (players and team officials) are
+stored once and referenced by id from the matches and the roster lines:
+
+* **matches** - one row per match, unique on the game page url (or, for
+  matches without a game page, when it was played and by whom, see
+  ``handball.identity.match_key``) so adding a match again replaces it
+* **roster_lines** - one row per roster entry in a match with the player's
+  attempts, penalties and saves. The ``player_lines`` and ``officials``
+  views split them into players and team officials.
+
+There are indexes on the people's lowercased names, the teams, the year and
+the tournament, so per player queries like ``count_goals`` are index
+lookups:
+
+    $ python -m handball.database output.json output.sqlite
+    $ python -m handball.analyze output.sqlite
+
+The database is also written during the crawl by ``SQLiteExportPipeline``.
+"""
+import sqlite3
+import sys
+
+from datetime import datetime
+
+from .identity import match_key
+from .reader import MatchFile
+from .utils import DATETIME_FORMAT, SIDES, team_name
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tournaments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS teams (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS venues (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    lowercase_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    url TEXT,
+    tournament_id INTEGER REFERENCES tournaments (id),
+    year INTEGER,
+    datetime TEXT,
+    venue_id INTEGER REFERENCES venues (id),
+    home_id INTEGER REFERENCES teams (id),
+    away_id INTEGER REFERENCES teams (id),
+    full_time TEXT,
+    half_time TEXT
+);
+CREATE TABLE IF NOT EXISTS roster_lines (
+    id INTEGER PRIMARY KEY,
+    match_id INTEGER NOT NULL REFERENCES matches (id),
+    team_id INTEGER REFERENCES teams (id),
+    side TEXT NOT NULL,
+    person_id INTEGER NOT NULL REFERENCES people (id),
+    type TEXT,
+    number TEXT,
+    goals INTEGER,
+    saved INTEGER,
+    missed INTEGER,
+    yellow INTEGER,
+    suspensions INTEGER,
+    red INTEGER,
+    saves_9m INTEGER,
+    saves_6m INTEGER,
+    saves_7m INTEGER
+);
+CREATE VIEW IF NOT EXISTS player_lines AS
+    SELECT * FROM roster_lines WHERE type != 'official';
+CREATE VIEW IF NOT EXISTS officials AS
+    SELECT * FROM roster_lines WHERE type = 'official';
+CREATE INDEX IF NOT EXISTS people_lowercase_name
+    ON people (lowercase_name);
+CREATE INDEX IF NOT EXISTS matches_year ON matches (year);
+CREATE INDEX IF NOT EXISTS matches_tournament ON matches (tournament_id);
+CREATE INDEX IF NOT EXISTS matches_home ON matches (home_id);
+CREATE INDEX IF NOT EXISTS matches_away ON matches (away_id);
+CREATE INDEX IF NOT EXISTS roster_lines_person ON roster_lines (person_id);
+CREATE INDEX IF NOT EXISTS roster_lines_match ON roster_lines (match_id);
+CREATE INDEX IF NOT EXISTS roster_lines_team ON roster_lines (team_id);
+"""
+
+# The statements are constants so the sqlite3 module's statement cache
+# prepares each of them once per connection
+UPSERT_MATCH = """
+INSERT INTO matches (key, url, tournament_id, year, datetime, venue_id,
+                     home_id, away_id, full_time, half_time)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    url = excluded.url,
+    tournament_id = excluded.tournament_id,
+    year = excluded.year,
+    datetime = excluded.datetime,
+    venue_id = excluded.venue_id,
+    home_id = excluded.home_id,
+    away_id = excluded.away_id,
+    full_time = excluded.full_time,
+    half_time = excluded.half_time
+"""
+# ON CONFLICT DO UPDATE needs SQLite 3.24, older versions replace the row
+# and keep its id
+UPSERT_SUPPORTED = sqlite3.sqlite_version_info >= (3, 24, 0)
+REPLACE_MATCH = """
+INSERT OR REPLACE INTO matches (id, key, url, tournament_id, year, datetime,
+                                venue_id, home_id, away_id, full_time,
+                                half_time)
+VALUES ((SELECT id FROM matches WHERE key = ?), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SELECT_MATCH_ID = "SELECT id FROM matches WHERE key = ?"
+DELETE_ROSTER_LINES = "DELETE FROM roster_lines WHERE match_id = ?"
+INSERT_ROSTER_LINE = """
+INSERT INTO roster_lines (match_id, team_id, side, person_id, type, number,
+                          goals, saved, missed, yellow, suspensions, red,
+                          saves_9m, saves_6m, saves_7m)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+COUNT_GOALS = """
+SELECT COALESCE(SUM(goals), 0) FROM roster_lines
+WHERE person_id IN (SELECT id FROM people WHERE lowercase_name = ?)
+"""
+COUNT_APPEARANCES = """
+SELECT COUNT(DISTINCT match_id) FROM roster_lines
+WHERE person_id IN (SELECT id FROM people WHERE lowercase_name = ?)
+"""
+
+
+def is_database(path):
+    """
+    Whether the file at ``path`` is an SQLite database.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except IOError:
+        return False
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+class MatchDatabase(object):
+    """
+    The matches in a normalized SQLite database.
+
+    Matches are added in batches, each in a single transaction. The
+    database is in WAL mode so it can be queried while a crawl is writing
+    to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self._ids = dict(
+            (table, {}) for table in ("tournaments", "teams", "venues",
+                                      "people"))
+
+    @classmethod
+    def from_matches(cls, path, matches, batch_size=1000):
+        database = cls(path)
+        batch = []
+        for match in matches:
+            batch.append(match)
+            if len(batch) >= batch_size:
+                database.add_matches(batch)
+                batch = []
+        database.add_matches(batch)
+        return database
+
+    def close(self):
+        self.connection.close()
+
+    def add_matches(self, matches):
+        """
+        Add (or replace) the matches in a single transaction.
+        """
+        try:
+            with self.connection:
+                for match in matches:
+                    self._add_match(match)
+        except Exception:
+            # names added in the rolled back transaction are gone again
+            for ids in self._ids.values():
+                ids.clear()
+            raise
+
+    def _id(self, table, name):
+        """
+        The id of the name in one of the name tables, added if needed.
+        """
+        if name is None:
+            return None
+        ids = self._ids[table]
+        try:
+            return ids[name]
+        except KeyError:
+            pass
+        if table == "people":
+            self.connection.execute(
+                "INSERT OR IGNORE INTO people (name, lowercase_name) "
+                "VALUES (?, ?)", (name, name.lower()))
+        else:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO {0} (name) VALUES (?)".format(table),
+                (name,))
+        ids[name] = self.connection.execute(
+            "SELECT id FROM {0} WHERE name = ?".format(table),
+            (name,)).fetchone()[0]
+        return ids[name]
+
+    def _add_match(self, match):
+        key = match_key(match)
+        teams = [match.get(side) for side in SIDES]
+        team_ids = [self._id("teams", team_name(team)) for team in teams]
+        values = (
+            key,
+            match.get("url"),
+            self._id("tournaments", match.get("tournament")),
+            match.get("year"),
+            _text(match.get("datetime")),
+            self._id("venues", match.get("venue")),
+            team_ids[0],
+            team_ids[1],
+            match.get("full-time"),
+            match.get("half-time"),
+        )
+        cursor = self.connection.cursor()
+        # the old roster lines go first, replacing the row on older SQLite
+        # versions would break their foreign key
+        row = cursor.execute(SELECT_MATCH_ID, (key,)).fetchone()
+        if row is not None:
+            cursor.execute(DELETE_ROSTER_LINES, row)
+        if UPSERT_SUPPORTED:
+            cursor.execute(UPSERT_MATCH, values)
+        else:
+            cursor.execute(REPLACE_MATCH, (key,) + values)
+        match_id = row[0] if row is not None else cursor.lastrowid
+
+        lines = []
+        for side, team, team_id in zip(SIDES, teams, team_ids):
+            if not hasattr(team, "get"):
+                continue
+            for player in team.get("roster", []):
+                if not player.get("name"):
+                    continue
+                attempts = player.get("attempts", {})
+                penalties = player.get("penalties", {})
+                saves = player.get("saves", {})
+                lines.append((
+                    match_id, team_id, side,
+                    self._id("people", player["name"]),
+                    player.get("type"),
+                    player.get("number"),
+                    attempts.get("goals"),
+                    attempts.get("saved"),
+                    attempts.get("missed"),
+                    penalties.get("yellow"),
+                    penalties.get("suspensions"),
+                    penalties.get("red"),
+                    saves.get("9m"),
+                    saves.get("6m"),
+                    saves.get("7m"),
+                ))
+        cursor.executemany(INSERT_ROSTER_LINE, lines)
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def count_goals(self, name):
+        return self.connection.execute(
+            COUNT_GOALS, (name.lower(),)).fetchone()[0]
+
+    def count_appearances(self, name):
+        return self.connection.execute(
+            COUNT_APPEARANCES, (name.lower(),)).fetchone()[0]
+
+    def matches_in_season(self, year):
+        return [key for key, in self.connection.execute(
+            "SELECT key FROM matches WHERE year = ? ORDER BY id", (year,))]
+
+    def matches_in_tournament(self, tournament_name):
+        # SQLite's lower() only folds ASCII letters
+        tournament = tournament_name.lower()
+        ids = [tournament_id for tournament_id, name in
+               self.connection.execute("SELECT id, name FROM tournaments")
+               if name.lower() == tournament]
+        return [key for key, in self.connection.execute(
+            "SELECT key FROM matches WHERE tournament_id IN ({0}) "
+            "ORDER BY id".format(", ".join("?" * len(ids))), ids)]
+
+
+if __name__ == "__main__":
+    MatchDatabase.from_matches(sys.argv[2], MatchFile(sys.argv[1])).close()
@@ -0,0 +1,70 @@
+# coding: utf-8
+"""
+A duplicate request filter that fingerprints requests by their canonical
+url (see ``handball.utils.canonical_url``), so variants of a url with the
+query arguments in another order, session parameters or different case
+(hsi.is doesn't care) are filtered as the same page.
+
+Every season page links to all the other seasons, so most season requests
+are duplicates. The filtered requests are counted in the crawl stats by page
+class (``dupefilter/filtered/<class>``), as are the requests whose url
+wasn't canonical (``dupefilter/canonicalized``).
+
+With JOBDIR set the fingerprints are kept in ``requests.seen`` like with
+Scrapy's own filter, so a crawl that is resumed doesn't request the pages it
+has seen again. In memory they're kept as binary digests, half the size of
+the hex digests Scrapy keeps.
+"""
+import binascii
+import os
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+from scrapy.utils.request import request_fingerprint
+
+from .utils import canonical_url, url_class
+
+
+class CanonicalDupeFilter(RFPDupeFilter):
+
+    def __init__(self, path=None, debug=False, stats=None):
+        super(CanonicalDupeFilter, self).__init__(None, debug)
+        self.stats = stats
+        if path:
+            self.file = open(os.path.join(path, "requests.seen"), "a+")
+            self.file.seek(0)
+            self.fingerprints.update(
+                binascii.unhexlify(line.rstrip()) for line in self.file)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(job_dir(settings), settings.getbool("DUPEFILTER_DEBUG"))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(job_dir(crawler.settings),
+                   crawler.settings.getbool("DUPEFILTER_DEBUG"),
+                   crawler.stats)
+
+    def request_seen(self, request):
+        fingerprint = self.request_fingerprint(request)
+        if fingerprint in self.fingerprints:
+            return True
+        self.fingerprints.add(fingerprint)
+        if self.file:
+            self.file.write(binascii.hexlify(fingerprint) + os.linesep)
+
+    def request_fingerprint(self, request):
+        url = canonical_url(request.url)
+        if url != request.url:
+            if self.stats:
+                self.stats.inc_value("dupefilter/canonicalized")
+            request = request.replace(url=url)
+        return binascii.unhexlify(request_fingerprint(request))
+
+    def log(self, request, spider):
+        super(CanonicalDupeFilter, self).log(request, spider)
+        spider.crawler.stats.inc_value(
+            "dupefilter/filtered/{0}".format(
+                url_class(canonical_url(request.url))),
+            spider=spider)
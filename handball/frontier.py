@@ -0,0 +1,307 @@
+# coding: utf-8
+"""
+A resumable crawl with the request frontier on disk.
+
+With JOBDIR set ``FrontierScheduler`` keeps the scheduled requests and the
+fingerprints of the requests seen so far in an SQLite database
+(``<JOBDIR>/frontier.sqlite``) instead of in memory, so the memory use of
+the crawl doesn't grow with the number of seasons crawled. At most
+FRONTIER_WINDOW new requests are held in memory before they're written in
+one batch.
+
+Requests are taken highest priority first and, within a priority, newest
+first, which together with the depth-first page class priorities (see
+``handball.middlewares``, the default with JOBDIR) drains the game pages of
+a tournament before new tournaments are expanded.
+
+The frontier is committed every FRONTIER_CHECKPOINT_INTERVAL seconds. A
+request taken from the frontier is only removed from it when its callback
+has finished (``FrontierMiddleware``), in the same transaction as the
+requests the callback yielded, so a killed crawl resumes from the last
+checkpoint without losing requests:
+
+    scrapy crawl hsi-scraper -s JOBDIR=crawl-job -o output.jl
+    # killed, then resumed with the same command
+
+Requests that were being downloaded when the crawl stopped (or whose
+download failed) are scheduled again when it's resumed. A retry or a
+redirect replaces the request it was made from.
+
+Without JOBDIR the scheduler is Scrapy's in memory scheduler.
+"""
+import cPickle as pickle
+import logging
+import os
+import sqlite3
+import weakref
+
+from scrapy.core.scheduler import Scheduler
+from scrapy.utils.reqser import request_from_dict, request_to_dict
+from scrapy.utils.request import request_fingerprint
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    in_flight INTEGER NOT NULL DEFAULT 0,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_next
+    ON requests (in_flight, priority, id);
+CREATE TABLE IF NOT EXISTS seen (
+    fingerprint BLOB PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+class Frontier(object):
+    """
+    Serialized requests in an SQLite database, taken by priority and then
+    newest first, and the fingerprints of the requests seen.
+
+    Nothing is committed until ``checkpoint`` is called.
+    """
+
+    def __init__(self, path, window=1000):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+        self.window = window
+        self.buffer = []
+        self.pending = self.db.execute(
+            "SELECT COUNT(*) FROM requests WHERE in_flight = 0").fetchone()[0]
+
+    def resume(self):
+        """
+        Put the requests that were in flight when the crawl stopped back in
+        the queue. Returns the number of requests in the queue.
+        """
+        self.pending += self.db.execute(
+            "UPDATE requests SET in_flight = 0 WHERE in_flight = 1").rowcount
+        return self.pending
+
+    def seen(self, fingerprint):
+        """
+        Has a request with this fingerprint been seen? Remembers it if not.
+        """
+        fingerprint = sqlite3.Binary(fingerprint)
+        if self.db.execute("SELECT 1 FROM seen WHERE fingerprint = ?",
+                           (fingerprint,)).fetchone():
+            return True
+        self.db.execute("INSERT INTO seen (fingerprint) VALUES (?)",
+                        (fingerprint,))
+        return False
+
+    def push(self, data, priority):
+        self.buffer.append((priority, sqlite3.Binary(data)))
+        self.pending += 1
+        if len(self.buffer) >= self.window:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.db.executemany(
+                "INSERT INTO requests (priority, data) VALUES (?, ?)",
+                self.buffer)
+            self.buffer = []
+
+    def pop(self):
+        """
+        (id, data) of the next request, which is in flight until it's
+        completed, or None.
+        """
+        self.flush()
+        row = self.db.execute(
+            "SELECT id, data FROM requests WHERE in_flight = 0 "
+            "ORDER BY priority DESC, id DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self.db.execute(
+            "UPDATE requests SET in_flight = 1 WHERE id = ?", (row[0],))
+        self.pending -= 1
+        return row[0], bytes(row[1])
+
+    def complete(self, request_id):
+        self.db.execute("DELETE FROM requests WHERE id = ?", (request_id,))
+
+    def checkpoint(self):
+        self.flush()
+        self.db.commit()
+
+    def close(self):
+        self.checkpoint()
+        self.db.close()
+
+    def __len__(self):
+        return self.pending
+
+
+class FrontierScheduler(Scheduler):
+    """
+    Scrapy's scheduler with the disk queues and the duplicate filter's seen
+    set replaced by a ``Frontier`` when JOBDIR is set. Requests that can't
+    be serialized are kept in memory.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = super(FrontierScheduler, cls).from_crawler(crawler)
+        scheduler.window = crawler.settings.getint("FRONTIER_WINDOW", 1000)
+        scheduler.checkpoint_interval = crawler.settings.getfloat(
+            "FRONTIER_CHECKPOINT_INTERVAL", 30)
+        return scheduler
+
+    def _dqdir(self, jobdir):
+        return jobdir
+
+    def open(self, spider):
+        self.spider = spider
+        self.mqs = self._mq()
+        self.frontier = None
+        self.task = None
+        if not self.dqdir:
+            self.dqs = None
+            return self.df.open()
+
+        self.dqs = self.frontier = Frontier(
+            os.path.join(self.dqdir, "frontier.sqlite"),
+            getattr(self, "window", 1000))
+        if self.frontier.resume():
+            logger.info("Resuming crawl (%(queuesize)d requests scheduled)",
+                        {"queuesize": len(self.frontier)},
+                        extra={"spider": spider})
+        if getattr(self, "checkpoint_interval", None):
+            self.task = task.LoopingCall(self.checkpoint)
+            self.task.start(self.checkpoint_interval, now=False)
+
+    def close(self, reason):
+        if self.frontier is None:
+            return self.df.close(reason)
+        if self.task and self.task.running:
+            self.task.stop()
+        self.frontier.close()
+        self.df.close(reason)
+        logger.info("Frontier saved (%(queuesize)d requests scheduled)",
+                    {"queuesize": len(self.frontier)},
+                    extra={"spider": self.spider})
+
+    def checkpoint(self):
+        self.frontier.checkpoint()
+        self.stats.set_value("frontier/pending", len(self.frontier),
+                             spider=self.spider)
+
+    def _fingerprint(self, request):
+        fingerprint = getattr(self.df, "request_fingerprint",
+                              request_fingerprint)(request)
+        return fingerprint.encode("ascii") if isinstance(
+            fingerprint, unicode) else fingerprint
+
+    def enqueue_request(self, request):
+        if self.frontier is None:
+            return super(FrontierScheduler, self).enqueue_request(request)
+        # retries and redirects copy the meta of a request taken from the
+        # frontier, they replace it there
+        replaces = request.meta.pop("frontier_id", None)
+        # the frontier keeps the seen set, not the duplicate filter
+        if not request.dont_filter and \
+                self.frontier.seen(self._fingerprint(request)):
+            self.df.log(request, self.spider)
+            if replaces is not None:
+                self.frontier.complete(replaces)
+            return False
+        if self._dqpush(request):
+            if replaces is not None:
+                self.frontier.complete(replaces)
+            self.stats.inc_value("scheduler/enqueued/disk", spider=self.spider)
+        else:
+            # the request is completed when the copy in memory is
+            if replaces is not None:
+                request.meta["frontier_id"] = replaces
+            self._mqpush(request)
+            self.stats.inc_value("scheduler/enqueued/memory",
+                                 spider=self.spider)
+        self.stats.inc_value("scheduler/enqueued", spider=self.spider)
+        return True
+
+    def _dqpush(self, request):
+        if self.frontier is None:
+            return
+        try:
+            data = pickle.dumps(request_to_dict(request, self.spider),
+                                protocol=2)
+        except (ValueError, TypeError, pickle.PicklingError) as e:
+            if self.logunser:
+                logger.warning(
+                    "Unable to serialize request: %(request)s - reason: "
+                    "%(reason)s - no more unserializable requests will be "
+                    "logged (stats being collected)",
+                    {"request": request, "reason": e},
+                    extra={"spider": self.spider})
+                self.logunser = False
+            self.stats.inc_value("scheduler/unserializable",
+                                 spider=self.spider)
+            return
+        self.frontier.push(data, request.priority)
+        return True
+
+    def _dqpop(self):
+        if self.frontier is None:
+            return
+        popped = self.frontier.pop()
+        if popped is None:
+            return
+        request_id, data = popped
+        request = request_from_dict(pickle.loads(data), self.spider)
+        request.meta["frontier_id"] = request_id
+        return request
+
+    def complete(self, request_id):
+        """
+        Remove a request taken from the frontier (by the ``frontier_id`` it
+        had in its meta), its callback has finished.
+        """
+        if self.frontier is not None:
+            self.frontier.complete(request_id)
+
+
+class FrontierMiddleware(object):
+    """
+    Tell the ``FrontierScheduler`` when a callback has finished with a
+    response, so the request is removed from the frontier. The id of the
+    request is taken out of the meta before the callback runs, so it isn't
+    copied into the items.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        # response -> the id of its request in the frontier
+        self.request_ids = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _complete(self, response):
+        request_id = self.request_ids.pop(response, None)
+        scheduler = getattr(getattr(self.crawler.engine, "slot", None),
+                            "scheduler", None)
+        if request_id is not None and hasattr(scheduler, "complete"):
+            scheduler.complete(request_id)
+
+    def process_spider_input(self, response, spider):
+        request = getattr(response, "request", None)
+        request_id = request.meta.pop("frontier_id", None) \
+            if request is not None else None
+        if request_id is not None:
+            self.request_ids[response] = request_id
+
+    def process_spider_output(self, response, result, spider):
+        for output in result:
+            yield output
+        self._complete(response)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._complete(response)
@@ -0,0 +1,220 @@
+# coding: utf-8
+"""
+A content addressed HTTP cache for the hsi-scraper spider and an offline
+replay of the spider over it.
+
+The cache keeps one gzip compressed file per distinct response body (named
+by its SHA-1, so identical pages are only stored once) and a SQLite index
+from request fingerprint to url, status, headers and body. Enable it with:
+
+    HTTPCACHE_ENABLED = True
+    HTTPCACHE_STORAGE = 'handball.httpcache.ContentAddressedCacheStorage'
+
+Several crawls (e.g. the shards of ``handball.parallel``) can share the
+cache, the index is in WAL mode and a crawl waits up to 30 seconds
+(HTTPCACHE_SQLITE_TIMEOUT) for the others' writes.
+
+How long a cached page is used depends on what kind of page it is (see
+``url_class``) and is set with HTTPCACHE_EXPIRATION_SECS_BY_CLASS. Pages
+belonging to past seasons never change and never expire. With
+HTTPCACHE_OFFLINE set nothing expires.
+
+The spider can also be re-run over the cache without Scrapy's engine, which
+is handy after changing the parsers:
+
+    $ python -m handball.httpcache output.jl
+"""
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+
+from collections import deque
+from datetime import datetime
+from time import time
+
+from scrapy.http import Headers, Request
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from scrapy.utils.request import request_fingerprint
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from .utils import SEASON_URL_RE, url_class
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPIRATION_SECS_BY_CLASS = {
+    "season": 60 * 60,
+    "tournament": 6 * 60 * 60,
+    "game": 6 * 60 * 60,
+    "other": 60 * 60,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    response_url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    body TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+"""
+
+
+def request_year(request):
+    """
+    The season the requested page belongs to, if we know it.
+    """
+    if request.meta.get("year"):
+        return request.meta["year"]
+    season = SEASON_URL_RE.search(request.url)
+    return int(season.group(1)) if season else None
+
+
+class ContentAddressedCacheStorage(object):
+    """
+    A Scrapy HTTP cache storage (see HTTPCACHE_STORAGE) that deduplicates and
+    compresses the response bodies.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.offline = settings.getbool('HTTPCACHE_OFFLINE')
+        self.expiration_secs = dict(DEFAULT_EXPIRATION_SECS_BY_CLASS)
+        self.expiration_secs.update(
+            settings.getdict('HTTPCACHE_EXPIRATION_SECS_BY_CLASS'))
+        self.timeout = settings.getfloat('HTTPCACHE_SQLITE_TIMEOUT', 30)
+        self.db = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, spider.name)
+        if not os.path.isdir(os.path.join(path, "bodies")):
+            os.makedirs(os.path.join(path, "bodies"))
+        self.path = path
+        self.db = sqlite3.connect(os.path.join(path, "index.db"),
+                                  timeout=self.timeout)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+
+    def close_spider(self, spider):
+        self.db.commit()
+        self.db.close()
+
+    def _body_path(self, digest):
+        return os.path.join(self.path, "bodies", digest[:2], digest + ".gz")
+
+    def _expiration(self, spider, request):
+        """
+        Seconds until a cached response to ``request`` expires, 0 means
+        never.
+        """
+        if self.offline:
+            return 0
+        year = request_year(request)
+        current_year = getattr(spider, "current_year", None) or \
+            datetime.now().year
+        if year is not None and year < current_year:
+            return 0
+        return self.expiration_secs[url_class(request.url)]
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        row = self.db.execute(
+            "SELECT response_url, status, headers, body, timestamp "
+            "FROM responses WHERE fingerprint = ?",
+            (request_fingerprint(request),)).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, digest, timestamp = row
+
+        expiration = self._expiration(spider, request)
+        if expiration and time() - timestamp > expiration:
+            return None
+
+        with gzip.open(self._body_path(digest), "rb") as f:
+            body = f.read()
+        headers = Headers(headers_raw_to_dict(bytes(raw_headers)))
+        respcls = responsetypes.from_args(headers=headers, url=url)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        digest = hashlib.sha1(response.body).hexdigest()
+        path = self._body_path(digest)
+        if not os.path.exists(path):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            # other crawls sharing the cache may write the same body
+            tmp = "{0}.{1}.tmp".format(path, os.getpid())
+            with gzip.open(tmp, "wb") as f:
+                f.write(response.body)
+            os.rename(tmp, path)
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(fingerprint, url, response_url, status, headers, body, "
+            " timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (request_fingerprint(request), request.url, response.url,
+             response.status,
+             sqlite3.Binary(headers_dict_to_raw(response.headers)),
+             digest, time()))
+        self.db.commit()
+
+
+def replay(spider, storage):
+    """
+    Run the spider over the cached responses in ``storage`` (which must be
+    open) and yield the items. Requests that aren't in the cache are
+    skipped.
+    """
+    seen = set()
+    queue = deque(spider.start_requests())
+    missing = 0
+    while queue:
+        request = queue.popleft()
+        fingerprint = request_fingerprint(request)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+
+        response = storage.retrieve_response(spider, request)
+        if response is None:
+            missing += 1
+            continue
+        response.request = request
+
+        callback = request.callback or spider.parse
+        for result in callback(response) or ():
+            if isinstance(result, Request):
+                queue.append(result)
+            else:
+                yield result
+    logger.info("Replayed %d requests, %d not in the cache",
+                len(seen) - missing, missing)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.serialize import ScrapyJSONEncoder
+
+    from .items import serialize
+    from .spiders.hsi import HSISpider
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_project_settings()
+    settings.set("HTTPCACHE_OFFLINE", True)
+    spider = HSISpider()
+    storage = ContentAddressedCacheStorage(settings)
+    storage.open_spider(spider)
+    encoder = ScrapyJSONEncoder()
+    try:
+        with open(sys.argv[1], "w") as f:
+            for item in replay(spider, storage):
+                f.write(encoder.encode(serialize(item)) + "\n")
+    finally:
+        storage.close_spider(spider)
@@ -0,0 +1,225 @@
+# coding: utf-8
+"""
+Resolve the player names on the rosters to stable player ids.
+
+Names on the HSÍ pages aren't always spelled the same way. Accents come and
+go (á/a, ð/d, þ/th) and middle names are sometimes left out. The
+``PlayerIndex`` maps a normalized name key (accent folded, lowercased,
+whitespace collapsed) to player ids, and uses the team and squad number to
+decide whether a name with a middle name missing belongs to a player we
+already know.
+
+The index keeps the matches and goals per player so per player queries
+don't need to scan the matches again. Build it once, save it and add new
+matches as they are scraped:
+
+    $ python -m handball.identity output.json players.json
+"""
+import json
+import os
+
+from collections import defaultdict
+from itertools import chain
+
+from .utils import SIDES, ascii_fold
+
+
+def name_key(name):
+    """
+    The normalized key for a name, e.g. u"Þórður  Ægisson" -> "thordur
+    aegisson".
+    """
+    return " ".join(ascii_fold(name).lower().split())
+
+
+def short_key(key):
+    """
+    The first and last name of a normalized name key.
+    """
+    names = key.split()
+    return " ".join((names[0], names[-1])) if len(names) > 2 else key
+
+
+def match_key(match):
+    """
+    Identify a match by its game page url or, for matches without one, by
+    when it was played and by whom.
+    """
+    if match.get("url"):
+        return match["url"]
+    home, away = (
+        team.get("name") if hasattr(team, "get") else team
+        for team in (match.get("home"), match.get("away")))
+    return u"|".join(u"{0}".format(value) for value in (
+        match.get("tournament"), match.get("year"), match.get("datetime"),
+        home, away))
+
+
+class PlayerIndex(object):
+    """
+    Player ids by normalized name, with the teams, squad numbers, matches
+    and goals of each player.
+    """
+
+    def __init__(self):
+        self.players = []
+        self.matches = set()
+        self._by_key = defaultdict(list)
+        self._by_short_key = defaultdict(list)
+
+    @classmethod
+    def from_matches(cls, matches):
+        index = cls()
+        index.update(matches)
+        return index
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, "r") as f:
+            data = json.load(f)
+        index.matches = set(data["matches"])
+        for player in data["players"]:
+            player["names"] = set(player["names"])
+            player["teams"] = set(player["teams"])
+            player["numbers"] = set(
+                tuple(number) for number in player["numbers"])
+            player["matches"] = set(player["matches"])
+            index._add_player(player)
+        return index
+
+    def save(self, path):
+        data = {
+            "matches": sorted(self.matches),
+            "players": [
+                dict(player, **dict(
+                    (key, sorted(player[key]))
+                    for key in ("names", "teams", "numbers", "matches")))
+                for player in self.players],
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.rename(path + ".tmp", path)
+
+    def update(self, matches):
+        """
+        Add the roster entries of the matches that aren't in the index yet.
+        """
+        for match in matches:
+            key = match_key(match)
+            if key in self.matches:
+                continue
+            self.matches.add(key)
+            for side in SIDES:
+                team = match.get(side)
+                if not hasattr(team, "get"):
+                    continue
+                for player in team.get("roster", []):
+                    if player.get("name"):
+                        self._add_appearance(key, team.get("name"), player)
+
+    def _add_player(self, player):
+        self.players.append(player)
+        for key in player["names"]:
+            self._index_name(player["id"], key)
+
+    def _index_name(self, player_id, key):
+        if player_id not in self._by_key[key]:
+            self._by_key[key].append(player_id)
+        if player_id not in self._by_short_key[short_key(key)]:
+            self._by_short_key[short_key(key)].append(player_id)
+
+    def _add_appearance(self, match, team_name, entry):
+        team = name_key(team_name or u"")
+        number = (team, entry.get("number") or u"")
+        player_id = self.resolve(entry["name"], team_name, entry.get("number"),
+                                 match=match)
+        if player_id is None:
+            player_id = len(self.players)
+            self._add_player({
+                "id": player_id,
+                "name": entry["name"],
+                "names": set(),
+                "teams": set(),
+                "numbers": set(),
+                "matches": set(),
+                "goals": 0,
+            })
+
+        player = self.players[player_id]
+        key = name_key(entry["name"])
+        if key not in player["names"]:
+            player["names"].add(key)
+            self._index_name(player_id, key)
+        player["teams"].add(team)
+        player["numbers"].add(number)
+        player["matches"].add(match)
+        player["goals"] += entry.get("attempts", {}).get("goals", 0)
+
+    def resolve(self, name, team=None, number=None, match=None):
+        """
+        The id of the player with this name (on this team with this squad
+        number, if given) or None if we don't know the player.
+
+        Players with the same normalized name are told apart by team and
+        squad number. Failing that, the name is matched on first and last
+        name if there's exactly one player with that name on the team. A
+        player with the name on another team is only taken (e.g. a player
+        who has moved) if that player isn't in ``match``, the key of the match
+        being added, otherwise it's a different player.
+        """
+        key = name_key(name)
+        candidates = self._by_key.get(key, [])
+        if team:
+            team = name_key(team)
+            in_context = [
+                player_id for player_id in candidates
+                if (team, number or u"") in self.players[player_id]["numbers"]
+            ] or [
+                player_id for player_id in candidates
+                if team in self.players[player_id]["teams"]]
+            if in_context:
+                return in_context[0]
+
+            same_team = [
+                player_id for player_id in
+                self._by_short_key.get(short_key(key), [])
+                if team in self.players[player_id]["teams"]]
+            if len(same_team) == 1:
+                return same_team[0]
+
+        # e.g. a player who has moved to another team, but not one who is
+        # on the other team in the same match
+        candidates = [player_id for player_id in candidates
+                      if match is None or
+                      match not in self.players[player_id]["matches"]]
+        return candidates[0] if candidates else None
+
+    def lookup(self, name):
+        """
+        The ids of all the players known by this name.
+        """
+        key = name_key(name)
+        return self._by_key.get(key) or self._by_short_key.get(key, [])
+
+    def count_goals(self, name):
+        return sum(self.players[player_id]["goals"]
+                   for player_id in self.lookup(name))
+
+    def count_appearances(self, name):
+        return len(set(chain.from_iterable(
+            self.players[player_id]["matches"]
+            for player_id in self.lookup(name))))
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .reader import MatchFile
+
+    if os.path.exists(sys.argv[2]):
+        index = PlayerIndex.load(sys.argv[2])
+    else:
+        index = PlayerIndex()
+    index.update(MatchFile(sys.argv[1]))
+    index.save(sys.argv[2])
@@ -4,11 +4,261 @@
 #
 # See documentation in:
 # http://doc.scrapy.org/en/latest/topics/items.html
+"""
+Compact records for the scraped matches.
 
-import scrapy
+A match used to be a dict with a dict per team and four dicts per player
+(the player, penalties, attempts and saves). ``Match``, ``TeamSheet`` and
+``PlayerLine`` keep the same values in slots instead, which takes a fraction
+of the memory, and read like the dicts they replace (``match["home"]
+["roster"][0]["attempts"]["goals"]``) so code written for the JSON output
+works on them too. ``serialize`` turns them into the JSON shape.
+"""
+from scrapy.item import BaseItem
 
 
-class HandballItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+def serialize(value):
+    """
+    ``value`` with the records in it turned into dicts in the JSON shape.
+    """
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return dict((key, serialize(item)) for key, item in value.iteritems())
+    if isinstance(value, list):
+        return [serialize(item) for item in value]
+    return value
+
+
+class ExportFields(object):
+    """
+    The field metadata Scrapy's item exporters look up (``item.fields``),
+    which makes them serialize every field with ``serialize``.
+    """
+
+    def __getitem__(self, key):
+        return {"serializer": serialize}
+
+
+class Record(object):
+    """
+    Read only dict access for the records. Subclasses implement ``keys`` and
+    ``__getitem__``.
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    iterkeys = __iter__
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def to_dict(self):
+        return dict((key, serialize(value)) for key, value in self.items())
+
+    def __eq__(self, other):
+        if not hasattr(other, "keys"):
+            return NotImplemented
+        return self.to_dict() == serialize(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{0}({1!r})".format(type(self).__name__, self.to_dict())
+
+
+class SlotRecord(Record):
+    """
+    A record with a slot for each key, in ``KEYS`` (key, slot name) order.
+    Slots that aren't set are missing keys.
+    """
+    __slots__ = ()
+    KEYS = ()
+
+    def __init__(self, values=(), **kwargs):
+        self.update(values, **kwargs)
+
+    def keys(self):
+        return [key for key, slot in self.KEYS if hasattr(self, slot)]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.SLOTS[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, self.SLOTS[key], value)
+        except KeyError:
+            raise KeyError("{0} has no {1}".format(type(self).__name__, key))
+
+    def update(self, values=(), **kwargs):
+        for key, value in getattr(values, "iteritems", lambda: values)():
+            self[key] = value
+        for key, value in kwargs.iteritems():
+            self[key] = value
+
+
+class PlayerLine(Record):
+    """
+    A line on a team sheet: a player or a team official.
+
+    Officials (and the lines of tables we know nothing about) only have a
+    type and a name, the others have a number, penalties and attempts as
+    well, and goalkeepers the saves from 9m, 6m and 7m.
+    """
+    __slots__ = ("type", "name", "number", "goals", "saved", "missed",
+                 "yellow", "suspensions", "red", "saves_9m", "saves_6m",
+                 "saves_7m")
+
+    def __init__(self, type, name, number=None, stats=False, saves=False):
+        self.type = type
+        self.name = name
+        self.number = number
+        self.goals = self.saved = self.missed = self.suspensions = \
+            0 if stats else None
+        self.yellow = self.red = False if stats else None
+        self.saves_9m = self.saves_6m = self.saves_7m = 0 if saves else None
+
+    @property
+    def has_stats(self):
+        return self.goals is not None
+
+    @property
+    def has_saves(self):
+        return self.saves_9m is not None
+
+    def set_saves(self, distance, value):
+        if not self.has_saves:
+            self.saves_9m = self.saves_6m = self.saves_7m = 0
+        setattr(self, "saves_" + distance, value)
+
+    def keys(self):
+        keys = ["type", "name"]
+        if self.has_stats:
+            keys.extend(("number", "penalties", "attempts"))
+        if self.has_saves:
+            keys.append("saves")
+        return keys
+
+    def __getitem__(self, key):
+        if key == "type":
+            return self.type
+        if key == "name":
+            return self.name
+        if self.has_stats:
+            if key == "number":
+                return self.number
+            if key == "penalties":
+                return {
+                    "yellow": self.yellow,
+                    "suspensions": self.suspensions,
+                    "red": self.red,
+                }
+            if key == "attempts":
+                return {
+                    "goals": self.goals,
+                    "saved": self.saved,
+                    "missed": self.missed,
+                }
+        if key == "saves" and self.has_saves:
+            return {
+                "9m": self.saves_9m,
+                "6m": self.saves_6m,
+                "7m": self.saves_7m,
+            }
+        raise KeyError(key)
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+class TeamSheet(SlotRecord):
+    """
+    A team in a match and its roster (a list of ``PlayerLine``).
+    """
+    __slots__ = ("name", "roster")
+    KEYS = (("name", "name"), ("roster", "roster"))
+    SLOTS = dict(KEYS)
+
+
+class Match(SlotRecord, BaseItem):
+    """
+    A match. The home and away teams are ``TeamSheet`` records for matches
+    with a game page and team names for the others.
+
+    Keys other than the match fields (e.g. what Scrapy adds to the request
+    meta) are kept in a dict so the output doesn't change.
+    """
+    __slots__ = ("tournament", "year", "datetime", "venue", "home", "away",
+                 "full_time", "half_time", "url", "meta", "extra")
+    KEYS = (
+        ("tournament", "tournament"),
+        ("year", "year"),
+        ("datetime", "datetime"),
+        ("venue", "venue"),
+        ("home", "home"),
+        ("away", "away"),
+        ("full-time", "full_time"),
+        ("half-time", "half_time"),
+        ("url", "url"),
+        ("meta", "meta"),
+    )
+    SLOTS = dict(KEYS)
+    fields = ExportFields()
+
+    # Scrapy keeps track of the items in a WeakKeyDictionary, like
+    # scrapy.Item they're hashed by identity
+    __hash__ = object.__hash__
+
+    def keys(self):
+        keys = super(Match, self).keys()
+        if hasattr(self, "extra"):
+            keys.extend(self.extra)
+        return keys
+
+    def __getitem__(self, key):
+        if key not in self.SLOTS and hasattr(self, "extra"):
+            try:
+                return self.extra[key]
+            except KeyError:
+                pass
+        return super(Match, self).__getitem__(key)
+
+    def __setitem__(self, key, value):
+        if key in self.SLOTS:
+            super(Match, self).__setitem__(key, value)
+            return
+        if not hasattr(self, "extra"):
+            self.extra = {}
+        self.extra[key] = value
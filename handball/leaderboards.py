@@ -0,0 +1,279 @@
+# coding: utf-8
+"""
+Leaderboards per season and per tournament, kept up to date as matches are
+scraped.
+
+The player totals are kept per partition (a year and a tournament) with the
+contribution of every match in it, and the leaderboards of each partition
+and of each season (all its tournaments) are sorted ahead of time, so
+reading one is a dict lookup:
+
+    boards = Leaderboards.from_matches(data)
+    boards.top("goals", 2016, u"Olís deild karla")
+    boards.top("save_percentage", 2016)
+
+``update`` takes new (or scraped again) matches and only touches the
+partitions they're in: a match that is already in the partition with the
+same roster lines is skipped, one that changed has its old contribution
+taken out (of the partition it was in, if its year or tournament changed)
+before the new one is added. The boards can be saved and updated
+after every crawl:
+
+    $ python -m handball.leaderboards output.jl leaderboards.json
+
+Players are grouped by lowercased name and team. The save
+percentage of a goalkeeper is saves / (saves + goals conceded), where the
+goals the team conceded in a match (by the score, or the opponent's roster
+if there's none) are split between its goalkeepers by
+their share of the saves.
+"""
+import json
+import os
+
+from collections import defaultdict
+
+from .identity import match_key
+from .stats import StatsTable
+from .timeline import parse_score
+from .utils import SIDES, team_name
+
+# (name, column it's sorted by)
+BOARDS = (
+    ("goals", "goals"),
+    ("suspensions", "suspensions"),
+    ("save_percentage", "save_percentage"),
+)
+
+# boards where a zero counts, players with none of the others aren't on them
+RATES = frozenset(("save_percentage",))
+
+# the leaderboard rows kept for each partition and board
+BOARD_SIZE = 100
+
+# goalkeepers need to have faced this many shots to be on the save
+# percentage board
+MIN_SHOTS = 50
+
+# the totals kept per player, a match contribution is a list of
+# [lowercased name, name, team] + TOTALS
+TOTALS = ("appearances", "goals", "suspensions", "red", "saves",
+          "goals_against")
+
+COLUMNS = ("player", "team") + TOTALS + ("save_percentage",)
+
+
+def contributions(match):
+    """
+    The totals for each player on the rosters of the match.
+    """
+    teams = [match.get(side) for side in SIDES]
+    rosters = [
+        [player for player in team.get("roster", [])
+         if player.get("type") != "official" and player.get("name")]
+        if hasattr(team, "get") else []
+        for team in teams]
+    # the rosters can be missing or without goals, the score is used if
+    # there is one
+    scored = parse_score(match.get("full-time")) or [
+        sum(player.get("attempts", {}).get("goals", 0) for player in roster)
+        for roster in rosters]
+
+    rows = []
+    for side, (team, roster) in enumerate(zip(teams, rosters)):
+        conceded = scored[1 - side]
+        keepers = [player for player in roster if "saves" in player]
+        team_saves = sum(sum(player["saves"].values()) for player in keepers)
+        for player in roster:
+            saves = sum(player.get("saves", {}).values())
+            goals_against = 0
+            if "saves" in player:
+                goals_against = float(conceded) * saves / team_saves \
+                    if team_saves else float(conceded) / len(keepers)
+            penalties = player.get("penalties", {})
+            rows.append([
+                player["name"].lower(), player["name"], team_name(team),
+                1,
+                player.get("attempts", {}).get("goals", 0),
+                penalties.get("suspensions", 0),
+                int(bool(penalties.get("red"))),
+                saves,
+                goals_against,
+            ])
+    return rows
+
+
+def _row(totals):
+    name, team = totals[:2]
+    values = dict(zip(TOTALS, totals[2:]))
+    shots = values["saves"] + values["goals_against"]
+    save_percentage = 100.0 * values["saves"] / shots \
+        if shots >= MIN_SHOTS else None
+    return (name, team) + tuple(values[total] for total in TOTALS) + \
+        (save_percentage,)
+
+
+def _rank(players):
+    """
+    The top BOARD_SIZE rows of each board from the player totals.
+    """
+    rows = [_row(totals) for totals in players.itervalues()]
+    boards = {}
+    for board, column in BOARDS:
+        i = COLUMNS.index(column)
+        ranked = sorted((row for row in rows if row[i] or (
+                            column in RATES and row[i] is not None)),
+                        key=lambda row: (-row[i], row[0]))
+        boards[board] = ranked[:BOARD_SIZE]
+    return boards
+
+
+class Leaderboards(object):
+    """
+    Player totals and leaderboards per (year, tournament) partition and per
+    season.
+    """
+
+    def __init__(self):
+        # (year, lowercased tournament) -> match key -> contributions
+        self.matches = defaultdict(dict)
+        # match key -> (year, lowercased tournament) the match is in
+        self.partitions = {}
+        # (year, lowercased tournament) -> (lowercased name, team) -> totals
+        self.players = defaultdict(dict)
+        # (year, lowercased tournament or None) -> board -> rows
+        self.boards = {}
+        self.tournament_names = {}
+
+    @classmethod
+    def from_matches(cls, matches):
+        boards = cls()
+        boards.update(matches)
+        return boards
+
+    @classmethod
+    def load(cls, path):
+        boards = cls()
+        with open(path, "r") as f:
+            data = json.load(f)
+        for partition in data["partitions"]:
+            key = (partition["year"], partition["tournament"])
+            boards.tournament_names[key] = partition["name"]
+            boards.matches[key] = partition["matches"]
+            for match_id, contribution in partition["matches"].iteritems():
+                boards.partitions[match_id] = key
+                boards._add(key, contribution, 1)
+        for year in set(year for year, _ in boards.matches):
+            boards._refresh_season(year)
+        for key in boards.matches:
+            boards.boards[key] = _rank(boards.players[key])
+        return boards
+
+    def save(self, path):
+        data = {
+            "partitions": [
+                {
+                    "year": year,
+                    "tournament": tournament,
+                    "name": self.tournament_names[(year, tournament)],
+                    "matches": matches,
+                }
+                for (year, tournament), matches in self.matches.iteritems()],
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.rename(path + ".tmp", path)
+
+    def update(self, matches):
+        """
+        Add the matches that are new or changed and refresh the boards of
+        the partitions they're in. Returns the changed partitions.
+        """
+        changed = set()
+        for match in matches:
+            key = (match.get("year"), (match.get("tournament") or u"").lower())
+            rows = contributions(match)
+            match_id = match_key(match)
+            # a match scraped again can have a new tournament title or year
+            old_key = self.partitions.get(match_id, key)
+            old = self.matches[old_key].get(match_id)
+            if old == rows and old_key == key:
+                continue
+            if old is not None:
+                del self.matches[old_key][match_id]
+                self._add(old_key, old, -1)
+                changed.add(old_key)
+            self.matches[key][match_id] = rows
+            self.partitions[match_id] = key
+            self._add(key, rows, 1)
+            self.tournament_names.setdefault(key, match.get("tournament"))
+            changed.add(key)
+
+        for key in changed:
+            if self.matches[key]:
+                self.boards[key] = _rank(self.players[key])
+            else:
+                # the last match moved to another partition
+                for partitions in (self.matches, self.players, self.boards,
+                                   self.tournament_names):
+                    partitions.pop(key, None)
+        for year in set(year for year, _ in changed):
+            self._refresh_season(year)
+        return changed
+
+    def _add(self, key, rows, sign):
+        players = self.players[key]
+        for row in rows:
+            player = (row[0], row[2])
+            totals = players.get(player)
+            if totals is None:
+                totals = players[player] = [row[1], row[2]] + [0] * len(TOTALS)
+            elif sign > 0:
+                # the latest spelling
+                totals[0] = row[1]
+            for i, value in enumerate(row[3:], 2):
+                totals[i] += sign * value
+            if not totals[2]:
+                del players[player]
+
+    def _refresh_season(self, year):
+        if not any(partition_year == year
+                   for partition_year, _ in self.matches):
+            self.boards.pop((year, None), None)
+            return
+        season = {}
+        for (partition_year, _), players in self.players.iteritems():
+            if partition_year != year:
+                continue
+            for player, totals in players.iteritems():
+                if player not in season:
+                    season[player] = list(totals)
+                else:
+                    season[player][2:] = [
+                        a + b for a, b in zip(season[player][2:], totals[2:])]
+        self.boards[(year, None)] = _rank(season)
+
+    def top(self, board, year, tournament=None, n=10):
+        """
+        The top ``n`` rows (at most BOARD_SIZE) of a board ("goals",
+        "suspensions" or "save_percentage") for a tournament or, without
+        one, the whole season.
+        """
+        key = (year, tournament.lower() if tournament else None)
+        rows = self.boards.get(key, {}).get(board)
+        if rows is None and board not in dict(BOARDS):
+            raise ValueError("No {0} board".format(board))
+        return StatsTable(COLUMNS, (rows or [])[:n])
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .reader import MatchFile
+
+    if os.path.exists(sys.argv[2]):
+        boards = Leaderboards.load(sys.argv[2])
+    else:
+        boards = Leaderboards()
+    changed = boards.update(MatchFile(sys.argv[1]))
+    boards.save(sys.argv[2])
+    print("Refreshed {0} partitions".format(len(changed)))
@@ -0,0 +1,310 @@
+# coding: utf-8
+"""
+Crawl performance metrics in the Prometheus text format.
+
+``CrawlMetricsMiddleware`` is a spider middleware (enabled with
+METRICS_ENABLED) that records:
+
+* a histogram of the time spent in each spider callback (``parse``,
+  ``parse_tournament``, ``parse_game``), from the callback being called
+  until its output is used up, without the time spent handling the output,
+* histograms of the time spent in the functions listed in
+  METRICS_TIMED_FUNCTIONS (by default ``_parse_date`` and
+  ``get_player_parser``),
+* the warnings logged by the spiders' parse functions, by the function that
+  logged them (e.g. ``_parse_date`` for dates that couldn't be parsed or
+  ``_find_teams``), also kept in the crawl stats as
+  ``parse_failures/<function>``,
+* the items, requests and responses so far and per second and the peak
+  memory use of the crawl.
+
+The metrics are written to METRICS_FILE every METRICS_INTERVAL seconds
+(e.g. for the node_exporter textfile collector) and summarized in the log
+when the crawl finishes.
+
+The timed functions are wrapped in the process running the crawl only, so
+they aren't timed in parse workers.
+"""
+import bisect
+import functools
+import logging
+import os
+import resource
+
+from collections import defaultdict
+from importlib import import_module
+from timeit import default_timer
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+# the logger the spider's parse functions log their failures to, the rest
+# of the package (e.g. the pipelines) isn't parsing
+PARSE_LOGGER = __name__.rsplit(".", 1)[0] + ".spiders"
+
+# in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_TIMED_FUNCTIONS = (
+    "handball.spiders.hsi._parse_date",
+    "handball.spiders.hsi.get_player_parser",
+)
+
+
+class Histogram(object):
+    """
+    Counts of observed values in buckets, as a Prometheus histogram.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """
+        (upper bound, number of values less than or equal to it) for each
+        bucket, ending with "+Inf".
+        """
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield bound, total
+
+
+def _labels(labels):
+    return u"{{{0}}}".format(u",".join(
+        u'{0}="{1}"'.format(key, value) for key, value in labels)) \
+        if labels else u""
+
+
+def format_metric(name, kind, help_text, samples):
+    """
+    The Prometheus text format lines for a metric. ``samples`` is a list of
+    (labels, value) for counters and gauges and of (labels, histogram) for
+    histograms, where labels is a list of (name, value).
+    """
+    lines = [u"# HELP {0} {1}".format(name, help_text),
+             u"# TYPE {0} {1}".format(name, kind)]
+    for labels, value in samples:
+        if kind != "histogram":
+            lines.append(u"{0}{1} {2}".format(name, _labels(labels), value))
+            continue
+        for bound, count in value.cumulative():
+            lines.append(u"{0}_bucket{1} {2}".format(
+                name, _labels(list(labels) + [("le", bound)]), count))
+        lines.append(u"{0}_sum{1} {2}".format(name, _labels(labels), value.sum))
+        lines.append(u"{0}_count{1} {2}".format(
+            name, _labels(labels), value.count))
+    return lines
+
+
+def max_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class FailureCounter(logging.Handler):
+    """
+    Count the warnings (and worse) logged by the spiders, by the function
+    that logged them.
+    """
+
+    def __init__(self, stats, spider):
+        logging.Handler.__init__(self, logging.WARNING)
+        self.stats = stats
+        self.spider = spider
+        self.counts = defaultdict(int)
+
+    def emit(self, record):
+        self.counts[record.funcName] += 1
+        self.stats.inc_value(
+            "parse_failures/{0}".format(record.funcName), spider=self.spider)
+
+
+def _timed(function, histogram):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(default_timer() - start)
+    return wrapper
+
+
+class CrawlMetricsMiddleware(object):
+    """
+    Record the crawl metrics and write them to METRICS_FILE.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+
+        self.stats = crawler.stats
+        self.path = settings.get("METRICS_FILE")
+        self.interval = settings.getfloat(
+            "METRICS_INTERVAL", settings.getfloat("LOGSTATS_INTERVAL"))
+        self.timed_functions = settings.getlist(
+            "METRICS_TIMED_FUNCTIONS", DEFAULT_TIMED_FUNCTIONS)
+
+        self.callbacks = defaultdict(Histogram)
+        self.functions = defaultdict(Histogram)
+        self._started = {}
+        self._patched = []
+        self.failures = None
+        self.task = None
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.start_time = self.last_time = default_timer()
+        self.last_counts = self._counts(spider)
+
+        for path in self.timed_functions:
+            module_name, name = path.rsplit(".", 1)
+            module = import_module(module_name)
+            function = getattr(module, name)
+            setattr(module, name, _timed(function, self.functions[name]))
+            self._patched.append((module, name, function))
+
+        self.failures = FailureCounter(self.stats, spider)
+        logging.getLogger(PARSE_LOGGER).addHandler(self.failures)
+
+        if self.path and self.interval:
+            self.task = task.LoopingCall(self.write, spider)
+            self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+        for module, name, function in self._patched:
+            setattr(module, name, function)
+        self._patched = []
+        logging.getLogger(PARSE_LOGGER).removeHandler(self.failures)
+
+        if self.path:
+            self.write(spider)
+        self.log_summary(spider)
+
+    def _callback_name(self, response, spider):
+        request = getattr(response, "request", None)
+        callback = request.callback if request else None
+        return getattr(callback, "__name__", "parse")
+
+    def process_spider_input(self, response, spider):
+        self._started[response] = default_timer()
+
+    def process_spider_output(self, response, result, spider):
+        # the time since the callback was called (including the wait for a
+        # parse worker) plus the time spent producing each output, but not
+        # the time spent handling it
+        elapsed = default_timer() - self._started.pop(response, default_timer())
+        iterator = iter(result)
+        while True:
+            start = default_timer()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += default_timer() - start
+            yield output
+        self.callbacks[self._callback_name(response, spider)].observe(elapsed)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._started.pop(response, None)
+
+    def _counts(self, spider):
+        return dict(
+            (name, self.stats.get_value(key, 0, spider=spider))
+            for name, key in (
+                ("items", "item_scraped_count"),
+                ("requests", "downloader/request_count"),
+                ("responses", "downloader/response_count")))
+
+    def metrics(self, spider):
+        """
+        The metrics in the Prometheus text format.
+        """
+        now = default_timer()
+        counts = self._counts(spider)
+        seconds = max(now - self.last_time, 1e-9)
+        rates = dict((name, (counts[name] - self.last_counts[name]) / seconds)
+                     for name in counts)
+        self.last_time, self.last_counts = now, counts
+
+        lines = []
+        lines += format_metric(
+            "handball_callback_seconds", "histogram",
+            "Time spent in the spider callbacks.",
+            [([("callback", name)], histogram)
+             for name, histogram in sorted(self.callbacks.items())])
+        lines += format_metric(
+            "handball_function_seconds", "histogram",
+            "Time spent in the timed parse functions.",
+            [([("function", name)], histogram)
+             for name, histogram in sorted(self.functions.items())])
+        lines += format_metric(
+            "handball_parse_failures_total", "counter",
+            "Warnings logged while parsing, by function.",
+            [([("function", name)], count)
+             for name, count in sorted(self.failures.counts.items())])
+        for name in sorted(counts):
+            lines += format_metric(
+                "handball_{0}_total".format(name), "counter",
+                "The number of {0} so far.".format(name),
+                [([], counts[name])])
+            lines += format_metric(
+                "handball_{0}_per_second".format(name), "gauge",
+                "The number of {0} per second since the last update.".format(
+                    name),
+                [([], rates[name])])
+        lines += format_metric(
+            "handball_max_rss_bytes", "gauge",
+            "The peak memory use of the crawl.", [([], max_rss_bytes())])
+        return u"\n".join(lines) + u"\n"
+
+    def write(self, spider):
+        with open(self.path + ".tmp", "w") as f:
+            f.write(self.metrics(spider).encode("utf-8"))
+        os.rename(self.path + ".tmp", self.path)
+
+    def log_summary(self, spider):
+        seconds = max(default_timer() - self.start_time, 1e-9)
+        lines = ["Crawl metrics:"]
+        for kind, histograms in (("callback", self.callbacks),
+                                 ("function", self.functions)):
+            for name, histogram in sorted(histograms.items()):
+                if histogram.count:
+                    lines.append(
+                        "  {0} {1}: {2} calls, {3:.2f} ms mean, {4:.1f} s "
+                        "total".format(
+                            kind, name, histogram.count,
+                            1000 * histogram.sum / histogram.count,
+                            histogram.sum))
+        for name, count in sorted(self.failures.counts.items()):
+            lines.append("  parse failures in {0}: {1}".format(name, count))
+        counts = self._counts(spider)
+        lines.append("  {0:.1f} items/sec, {1:.1f} requests/sec".format(
+            counts["items"] / seconds, counts["requests"] / seconds))
+        lines.append("  peak memory {0:.1f} MB".format(
+            max_rss_bytes() / 1024.0 / 1024.0))
+        logger.info("\n".join(lines), extra={"spider": spider})
@@ -0,0 +1,252 @@
+# coding: utf-8
+"""
+Schedule and throttle the hsi.is requests by page class (see
+``handball.utils.url_class``).
+
+``PageClassPriorityMiddleware`` is a spider middleware that gives requests a
+priority by the kind of page they're for, so tournament pages, each of which
+fans out to many game pages, are fetched first.
+
+``PageClassThrottleMiddleware`` is a downloader middleware that puts each
+page class in its own downloader slot and adjusts the slot's concurrency
+and download delay to how the server copes with that class of pages:
+
+* Once per round (as many responses as the current concurrency) the
+  concurrency goes up by one if the average latency is below
+  PAGECLASS_THROTTLE_TARGET_LATENCY and there were no errors, and down by
+  one if the latency is above it.
+* Errors (RETRY_HTTP_CODES, 429 and download exceptions) halve the
+  concurrency and double the download delay.
+
+The concurrency, latency, number of responses and errors of each class are
+kept in the crawl stats (``pageclass/<class>/...``) and the throughput of
+each class is logged every LOGSTATS_INTERVAL seconds.
+"""
+import logging
+
+from scrapy import signals
+from scrapy.core.downloader import Slot
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.job import job_dir
+from twisted.internet import task
+
+from .utils import url_class
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITIES = {
+    "tournament": 20,
+    "season": 10,
+    "game": 0,
+    "other": 0,
+}
+
+# game pages before tournament pages before seasons, so a tournament's games
+# are done before the next one is expanded (for crawls with a frontier on
+# disk, see handball.frontier)
+DEPTH_FIRST_PRIORITIES = {
+    "game": 20,
+    "tournament": 10,
+    "season": 0,
+    "other": 0,
+}
+
+# weight of the latest latency in the moving average
+LATENCY_WEIGHT = 0.2
+
+# the download delay after the first errors, it's halved again after rounds
+# without errors until it's a quarter of this and drops to DOWNLOAD_DELAY
+BACKOFF_DELAY = 1.0
+
+
+class PageClassPriorityMiddleware(object):
+    """
+    Set the priority of the requests the spider yields by page class (see
+    PAGECLASS_PRIORITIES). Requests that already have a priority are left
+    alone.
+
+    With PAGECLASS_DEPTH_FIRST (the default when JOBDIR is set) game pages
+    come first instead of tournament pages.
+    """
+
+    def __init__(self, priorities, depth_first=False):
+        self.priorities = dict(
+            DEPTH_FIRST_PRIORITIES if depth_first else DEFAULT_PRIORITIES)
+        self.priorities.update(priorities)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(settings.getdict("PAGECLASS_PRIORITIES"),
+                   settings.getbool("PAGECLASS_DEPTH_FIRST",
+                                    bool(job_dir(settings))))
+
+    def _prioritize(self, results):
+        for result in results:
+            if getattr(result, "priority", None) == 0:
+                priority = self.priorities[url_class(result.url)]
+                if priority:
+                    result = result.replace(priority=priority)
+            yield result
+
+    def process_spider_output(self, response, result, spider):
+        return self._prioritize(result)
+
+    def process_start_requests(self, start_requests, spider):
+        return self._prioritize(start_requests)
+
+
+class PageClass(object):
+    """
+    The throttling state of one page class.
+    """
+
+    def __init__(self, name, concurrency, delay):
+        self.name = name
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None
+        self.responses = 0
+        self.errors = 0
+        self.logged_responses = 0
+        # responses and errors in the current round
+        self.round_responses = 0
+        self.round_errors = 0
+
+
+class PageClassThrottleMiddleware(object):
+    """
+    Give each page class its own downloader slot with an adaptive
+    concurrency and delay (enabled with PAGECLASS_THROTTLE_ENABLED).
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("PAGECLASS_THROTTLE_ENABLED"):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.target_latency = settings.getfloat(
+            "PAGECLASS_THROTTLE_TARGET_LATENCY", 1.0)
+        self.start_concurrency = settings.getint(
+            "PAGECLASS_THROTTLE_START_CONCURRENCY", 1)
+        self.max_concurrency = settings.getint(
+            "PAGECLASS_THROTTLE_MAX_CONCURRENCY",
+            settings.getint("CONCURRENT_REQUESTS"))
+        self.min_delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.max_delay = settings.getfloat("PAGECLASS_THROTTLE_MAX_DELAY", 60.0)
+        self.randomize_delay = settings.getbool("RANDOMIZE_DOWNLOAD_DELAY")
+        self.error_codes = set(
+            int(code) for code in settings.getlist("RETRY_HTTP_CODES"))
+        self.error_codes.add(429)
+        self.interval = settings.getfloat("LOGSTATS_INTERVAL")
+        self.classes = {}
+        self.task = None
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        if self.interval:
+            self.task = task.LoopingCall(self.log, spider)
+            self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+
+    def page_class(self, name):
+        if name not in self.classes:
+            self.classes[name] = PageClass(
+                name, self.start_concurrency, self.min_delay)
+        return self.classes[name]
+
+    def process_request(self, request, spider):
+        page = self.page_class(url_class(request.url))
+        if "download_slot" not in request.meta:
+            request.meta["download_slot"] = "{0}/{1}".format(
+                urlparse_cached(request).hostname, page.name)
+
+        # the downloader drops idle slots, so (re)create the slot for the
+        # class with its current settings
+        slots = self.crawler.engine.downloader.slots
+        slot = slots.get(request.meta["download_slot"])
+        if slot is None:
+            slots[request.meta["download_slot"]] = Slot(
+                page.concurrency, page.delay, self.randomize_delay)
+        else:
+            slot.concurrency = page.concurrency
+            slot.delay = page.delay
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get("download_latency")
+        if latency is not None and "cached" not in response.flags:
+            self.record(request, latency, response.status in self.error_codes)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self.record(request, None, True)
+
+    def record(self, request, latency, error):
+        """
+        Record a response (or a failed download) for the class of the
+        request and adjust the class' concurrency and delay at the end of
+        a round.
+        """
+        page = self.page_class(url_class(request.url))
+        page.responses += 1
+        page.round_responses += 1
+        if error:
+            page.errors += 1
+            page.round_errors += 1
+        if latency is not None:
+            page.latency = latency if page.latency is None else \
+                (1 - LATENCY_WEIGHT) * page.latency + LATENCY_WEIGHT * latency
+
+        if page.round_responses >= page.concurrency:
+            if page.round_errors:
+                page.concurrency = max(1, page.concurrency // 2)
+                page.delay = min(self.max_delay,
+                                 max(2 * page.delay, BACKOFF_DELAY))
+            elif page.latency > self.target_latency:
+                page.concurrency = max(1, page.concurrency - 1)
+            else:
+                page.concurrency = min(
+                    self.max_concurrency, page.concurrency + 1)
+                page.delay = page.delay / 2 \
+                    if page.delay / 2 >= BACKOFF_DELAY / 4 else 0
+                page.delay = max(self.min_delay, page.delay)
+            page.round_responses = page.round_errors = 0
+
+        prefix = "pageclass/{0}/".format(page.name)
+        self.stats.set_value(prefix + "responses", page.responses)
+        self.stats.set_value(prefix + "errors", page.errors)
+        self.stats.set_value(prefix + "concurrency", page.concurrency)
+        self.stats.set_value(prefix + "delay", page.delay)
+        if page.latency is not None:
+            self.stats.set_value(prefix + "latency_ms",
+                                 int(page.latency * 1000))
+
+    def log(self, spider):
+        for name, page in sorted(self.classes.items()):
+            rate = (page.responses - page.logged_responses) * 60.0 / \
+                self.interval
+            page.logged_responses = page.responses
+            logger.info(
+                "%(name)s pages: %(rate)d pages/min, concurrency %(concurrency)d, "
+                "delay %(delay).2f s, latency %(latency)d ms, %(errors)d errors",
+                {
+                    "name": name,
+                    "rate": rate,
+                    "concurrency": page.concurrency,
+                    "delay": page.delay,
+                    "latency": (page.latency or 0) * 1000,
+                    "errors": page.errors,
+                },
+                extra={"spider": spider})
@@ -0,0 +1,199 @@
+# coding: utf-8
+"""
+Crawl the full history in parallel: split the seasons into shards, crawl
+each shard in its own scrapy process and merge the shard outputs into one
+JSON Lines file with every match once.
+
+    $ python -m handball.parallel --years 1994-2016 --shards 8 \\
+        --processes 4 --output history.jl
+
+Run it from the project directory (where scrapy.cfg is). The years are
+dealt out to the shards round robin so the old seasons, which have few
+games on the site, are spread over all of them. Each shard writes
+``<directory>/shard-NN.jl`` and its log to ``shard-NN.log``, and a
+``shard-NN.done`` marker when the crawl succeeded. Shards that are done are
+skipped when the driver is run again, so after a failure only the failed
+shards are crawled again. With HTTPCACHE_ENABLED set (``-s``) the
+shards share the HTTP cache (see ``handball.httpcache``).
+
+Matches are deduplicated by their game page url (see
+``handball.identity.match_key``) when merging, the first shard with a match
+wins.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from .identity import match_key
+from .reader import iter_matches
+from .utils import parse_years
+
+logger = logging.getLogger(__name__)
+
+SPIDER = "hsi-scraper"
+POLL_INTERVAL = 0.5
+
+
+def split_years(years, shards):
+    """
+    Deal the years out to at most ``shards`` shards, round robin.
+
+    >>> split_years([1994, 1995, 1996, 1997, 1998], 2)
+    [[1994, 1996, 1998], [1995, 1997]]
+    """
+    years = sorted(years)
+    shards = max(1, min(shards, len(years)))
+    return [years[i::shards] for i in xrange(shards)]
+
+
+class Shard(object):
+    """
+    The crawl of some of the seasons, in a scrapy process.
+    """
+
+    def __init__(self, number, years, directory, tournaments=None,
+                 settings=()):
+        self.number = number
+        self.years = years
+        self.tournaments = tournaments
+        self.settings = list(settings)
+        path = os.path.join(directory, "shard-{0:02d}".format(number))
+        self.output = path + ".jl"
+        self.log = path + ".log"
+        self.marker = path + ".done"
+        self.process = None
+
+    @property
+    def done(self):
+        return os.path.exists(self.marker)
+
+    def command(self):
+        command = [
+            sys.executable, "-m", "scrapy", "crawl", SPIDER,
+            "-a", "years={0}".format(",".join(str(y) for y in self.years)),
+            "-o", self.output, "-t", "jsonlines",
+            "-s", "LOG_FILE={0}".format(self.log),
+        ]
+        if self.tournaments:
+            command += ["-a", u"tournaments={0}".format(
+                self.tournaments).encode("utf-8")]
+        for setting in self.settings:
+            command += ["-s", setting]
+        return command
+
+    def start(self):
+        # scrapy appends to the feed file, start from scratch
+        if os.path.exists(self.output):
+            os.remove(self.output)
+        self.process = subprocess.Popen(self.command())
+
+    def poll(self):
+        """
+        The exit status of the crawl, or None while it's still running.
+        """
+        status = self.process.poll()
+        if status == 0 and not self.done:
+            open(self.marker, "w").close()
+        return status
+
+
+def crawl(shards, processes, poll_interval=POLL_INTERVAL):
+    """
+    Run the shards that aren't done yet, at most ``processes`` at a time.
+    Returns the shards that failed.
+    """
+    pending = [shard for shard in shards if not shard.done]
+    running = []
+    failed = []
+    while pending or running:
+        while pending and len(running) < processes:
+            shard = pending.pop(0)
+            logger.info("Crawling shard %d (%s)", shard.number,
+                        ", ".join(str(y) for y in shard.years))
+            shard.start()
+            running.append(shard)
+        time.sleep(poll_interval)
+        for shard in list(running):
+            status = shard.poll()
+            if status is None:
+                continue
+            running.remove(shard)
+            if status:
+                logger.error("Shard %d failed with status %d, see %s",
+                             shard.number, status, shard.log)
+                failed.append(shard)
+            else:
+                logger.info("Shard %d done", shard.number)
+    return failed
+
+
+def merge(paths, output):
+    """
+    Write the matches in the files at ``paths`` to ``output`` as JSON Lines,
+    each match once. Returns (matches read, matches written).
+    """
+    seen = set()
+    read = 0
+    with open(output + ".tmp", "wb") as f:
+        for path in paths:
+            # scrapy doesn't write a feed without items
+            if not os.path.exists(path):
+                continue
+            for match in iter_matches(path):
+                read += 1
+                key = match_key(match)
+                if key in seen:
+                    continue
+                seen.add(key)
+                f.write(json.dumps(match, ensure_ascii=False)
+                        .encode("utf-8") + b"\n")
+    os.rename(output + ".tmp", output)
+    return read, len(seen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--years", required=True,
+                        help="years and ranges of years, e.g. 1994-2016")
+    parser.add_argument("--tournaments",
+                        help="comma separated tournament titles")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--directory", default="shards",
+                        help="where the shard outputs are written")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("-s", "--set", dest="settings", action="append",
+                        default=[], metavar="NAME=VALUE",
+                        help="scrapy settings for the shard crawls")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s: %(message)s")
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+
+    tournaments = args.tournaments.decode("utf-8") \
+        if args.tournaments else None
+    shards = [
+        Shard(number, years, args.directory, tournaments, args.settings)
+        for number, years in enumerate(
+            split_years(parse_years(args.years), args.shards))]
+
+    failed = crawl(shards, args.processes)
+    if failed:
+        logger.error("%d of %d shards failed, run again to retry them",
+                     len(failed), len(shards))
+        return 1
+
+    read, written = merge([shard.output for shard in shards], args.output)
+    logger.info("Merged %d matches (%d duplicates) into %s",
+                written, read - written, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
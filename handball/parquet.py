@@ -0,0 +1,243 @@
+# coding: utf-8
+"""
+A Parquet dataset of the matches scraped by the hsi-scraper spider, for
+analysis with Arrow based tools (pyarrow, pandas, DuckDB, Spark).
+
+The dataset has two tables, each partitioned by year and tournament in the
+Hive layout so readers can skip the seasons they don't need:
+
+    <directory>/matches/year=2016/tournament=Olís deild karla/
+        part-00000.parquet
+    <directory>/player_lines/year=2016/tournament=Olís deild karla/
+        part-00000.parquet
+
+* **matches** - one row per match with the scores and the team names
+* **player_lines** - one row per player on a team sheet in a match with the
+  attempts, penalties and saves, and the match's ``key`` (see
+  ``handball.identity.match_key``) to join them on. Team officials are left
+  out.
+
+The string columns (names, teams, venues, scores) are dictionary encoded,
+the year and tournament are in the directory names only. Read it with:
+
+    import pyarrow.parquet as pq
+    pq.read_table("dataset/player_lines", columns=["name", "goals"],
+                  filters=[("year", "=", 2016)])
+
+The dataset is written during the crawl by ``ParquetExportPipeline`` or
+from a JSON file:
+
+    $ python -m handball.parquet output.json dataset
+
+Needs the pyarrow package.
+"""
+import os
+import sys
+
+from collections import defaultdict
+
+from .identity import match_key
+from .reader import MatchFile
+from .utils import SIDES, parse_datetime, team_name
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Hive's name for the partition of null values
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# the characters escaped in the partition directory names
+PARTITION_ESCAPES = (("/", "%2F"), ("=", "%3D"), ("\x00", "%00"))
+
+# (name, type), strings are dictionary encoded
+MATCH_COLUMNS = (
+    ("key", "string"),
+    ("url", "string"),
+    ("datetime", "timestamp"),
+    ("venue", "string"),
+    ("home", "string"),
+    ("away", "string"),
+    ("full_time", "string"),
+    ("half_time", "string"),
+)
+LINE_COLUMNS = (
+    ("key", "string"),
+    ("side", "string"),
+    ("team", "string"),
+    ("type", "string"),
+    ("name", "string"),
+    ("number", "string"),
+    ("goals", "int16"),
+    ("saved", "int16"),
+    ("missed", "int16"),
+    ("yellow", "bool"),
+    ("suspensions", "int16"),
+    ("red", "bool"),
+    ("saves_9m", "int16"),
+    ("saves_6m", "int16"),
+    ("saves_7m", "int16"),
+)
+TABLES = (
+    ("matches", MATCH_COLUMNS),
+    ("player_lines", LINE_COLUMNS),
+)
+
+
+def match_row(match):
+    """
+    The row of a match in the matches table, in MATCH_COLUMNS order.
+    """
+    return (
+        match_key(match),
+        match.get("url"),
+        parse_datetime(match.get("datetime")),
+        match.get("venue"),
+        team_name(match.get("home")),
+        team_name(match.get("away")),
+        match.get("full-time"),
+        match.get("half-time"),
+    )
+
+
+def line_rows(match):
+    """
+    The rows of the players in a match in the player_lines table, in
+    LINE_COLUMNS order.
+    """
+    key = match_key(match)
+    rows = []
+    for side in SIDES:
+        team = match.get(side)
+        if not hasattr(team, "get"):
+            continue
+        for player in team.get("roster", []):
+            if player.get("type") == "official" or not player.get("name"):
+                continue
+            attempts = player.get("attempts", {})
+            penalties = player.get("penalties", {})
+            saves = player.get("saves", {})
+            rows.append((
+                key, side, team.get("name"), player.get("type"),
+                player["name"], player.get("number"),
+                attempts.get("goals"),
+                attempts.get("saved"),
+                attempts.get("missed"),
+                penalties.get("yellow"),
+                penalties.get("suspensions"),
+                penalties.get("red"),
+                saves.get("9m"),
+                saves.get("6m"),
+                saves.get("7m"),
+            ))
+    return rows
+
+
+def partition_path(year, tournament):
+    """
+    The Hive style directory of a partition (UTF-8 bytes). The values are
+    written as they are, so readers that don't decode directory names get
+    the real tournament name, except for the characters that can't be in
+    a single directory name or would break the key=value format.
+    """
+    def value(value):
+        if value is None:
+            return NULL_PARTITION
+        value = u"{0}".format(value).encode("utf-8")
+        for char, escaped in PARTITION_ESCAPES:
+            value = value.replace(char, escaped)
+        return value
+
+    return os.path.join("year=" + value(year),
+                        "tournament=" + value(tournament))
+
+
+def _array(values, type_name):
+    if type_name == "string":
+        return pyarrow.array(values, type=pyarrow.string()).dictionary_encode()
+    return pyarrow.array(values, type={
+        "timestamp": pyarrow.timestamp("s"),
+        "int16": pyarrow.int16(),
+        "bool": pyarrow.bool_(),
+    }[type_name])
+
+
+def _table(columns, rows):
+    values = zip(*rows) if rows else [()] * len(columns)
+    return pyarrow.Table.from_arrays(
+        [_array(list(column), type_name)
+         for column, (_, type_name) in zip(values, columns)],
+        names=[name for name, _ in columns])
+
+
+class ParquetDataset(object):
+    """
+    Writes matches to a partitioned Parquet dataset.
+
+    The rows are buffered per partition and written, one file per table and
+    partition, when ``flush`` is called. Files from earlier runs are kept,
+    so a match written again is in the dataset twice with the same ``key``.
+    """
+
+    def __init__(self, directory, compression="snappy"):
+        if pyarrow is None:
+            raise ImportError("Writing Parquet needs pyarrow installed")
+        self.directory = directory
+        self.compression = compression
+        # (year, tournament) -> table name -> rows
+        self.partitions = defaultdict(lambda: defaultdict(list))
+        self.files = []
+
+    @classmethod
+    def from_matches(cls, directory, matches, batch_size=1000):
+        dataset = cls(directory)
+        for i, match in enumerate(matches, 1):
+            dataset.add_match(match)
+            if not i % batch_size:
+                dataset.flush()
+        dataset.flush()
+        return dataset
+
+    def add_match(self, match):
+        tables = self.partitions[(match.get("year"), match.get("tournament"))]
+        tables["matches"].append(match_row(match))
+        tables["player_lines"].extend(line_rows(match))
+
+    def __len__(self):
+        """
+        The number of matches waiting to be written.
+        """
+        return sum(len(tables["matches"])
+                   for tables in self.partitions.itervalues())
+
+    def flush(self):
+        partitions, self.partitions = self.partitions, defaultdict(
+            lambda: defaultdict(list))
+        for (year, tournament), tables in partitions.iteritems():
+            for name, columns in TABLES:
+                if not tables[name]:
+                    continue
+                self._write(os.path.join(
+                    self.directory, name, partition_path(year, tournament)),
+                    _table(columns, tables[name]))
+
+    def _write(self, directory, table):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        number = 0
+        while os.path.exists(os.path.join(
+                directory, "part-{0:05d}.parquet".format(number))):
+            number += 1
+        path = os.path.join(directory, "part-{0:05d}.parquet".format(number))
+        # readers skip files starting with an underscore
+        temporary = os.path.join(directory, "_" + os.path.basename(path))
+        pyarrow.parquet.write_table(table, temporary, use_dictionary=True,
+                                    compression=self.compression)
+        os.rename(temporary, path)
+        self.files.append(path)
+
+
+if __name__ == "__main__":
+    ParquetDataset.from_matches(sys.argv[2], MatchFile(sys.argv[1]))
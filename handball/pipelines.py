@@ -4,8 +4,368 @@
 #
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: http://doc.scrapy.org/en/latest/topics/item-pipeline.html
+import gzip
+import json
+import logging
+import os
+import re
+
+from collections import OrderedDict
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.serialize import ScrapyJSONEncoder
+
+from .database import MatchDatabase
+from .items import serialize
+from .parquet import NULL_PARTITION, ParquetDataset, pyarrow
+from .utils import ascii_fold
+from .validation import RetryQueue, check
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
 
 
 class HandballPipeline(object):
     def process_item(self, item, spider):
         return item
+
+
+class ValidationPipeline(object):
+    """
+    Check every item (see ``handball.validation``) and count the problems in
+    the crawl stats under ``validation/``. The items are passed on either
+    way.
+
+    Settings:
+        VALIDATION_RETRY_FILE: where to write the queue of the game pages
+            with problems, to fetch again with ``-a retry=<file>``
+    """
+
+    def __init__(self, stats, retry_file=None):
+        self.stats = stats
+        self.retry_file = retry_file
+        self.queue = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats,
+                   retry_file=crawler.settings.get("VALIDATION_RETRY_FILE"))
+
+    def open_spider(self, spider):
+        if self.retry_file:
+            self.queue = RetryQueue(self.retry_file)
+
+    def close_spider(self, spider):
+        if self.queue is not None:
+            self.queue.close()
+            logger.info("%(pages)d pages in the retry queue %(path)s",
+                        {"pages": len(self.queue), "path": self.retry_file},
+                        extra={"spider": spider})
+
+    def process_item(self, item, spider):
+        problems = check(item)
+        if not problems:
+            return item
+        self.stats.inc_value("validation/failed", spider=spider)
+        for problem in problems:
+            self.stats.inc_value("validation/" + problem, spider=spider)
+        logger.warning("%(problems)s in %(url)s", {
+            "problems": ", ".join(problems),
+            "url": item.get("url") or item.get("tournament"),
+        }, extra={"spider": spider})
+        if self.queue is not None and self.queue.add(item, problems):
+            self.stats.inc_value("validation/queued", spider=spider)
+        return item
+
+
+def _slug(value):
+    """
+    A file system friendly version of a partition value.
+    """
+    if value is None:
+        return NULL_PARTITION
+    return re.sub(r"[^\w.-]+", "_", ascii_fold(u"{0}".format(value))) \
+        .strip("_") or "unknown"
+
+
+class JsonLinesShard(object):
+    """
+    A single compressed JSON Lines file that is being written. It's written
+    to a temporary name and only renamed to its final name when closed.
+    """
+    extensions = {
+        "gzip": ".jsonl.gz",
+        "zstd": ".jsonl.zst",
+        "none": ".jsonl",
+    }
+
+    def __init__(self, path, compression):
+        self.path = path + self.extensions[compression]
+        self.items = 0
+        self.bytes = 0
+        self._file = open(self.path + ".inprogress", "wb")
+        if compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._file, mode="wb")
+        elif compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(
+                self._file)
+        else:
+            self._stream = self._file
+
+    def write(self, line):
+        self._stream.write(line)
+        self.items += 1
+        self.bytes += len(line)
+
+    def close(self):
+        if self._stream is not self._file:
+            self._stream.close()
+        if not self._file.closed:
+            self._file.close()
+        os.rename(self.path + ".inprogress", self.path)
+
+
+class JsonLinesExportPipeline(object):
+    """
+    Stream the items to compressed JSON Lines shards, partitioned by year and
+    tournament:
+
+        <EXPORT_JSONLINES_DIR>/year=2016/tournament=Olis_deild_karla/
+            part-00000.jsonl.gz
+
+    A missing year or tournament is written as __HIVE_DEFAULT_PARTITION__,
+    like in the Parquet export. A shard is rotated when it reaches
+    EXPORT_JSONLINES_MAX_BYTES of uncompressed data and at most
+    EXPORT_JSONLINES_MAX_OPEN_FILES shards are open at once (the least
+    recently used one is finished when another one needs to be opened).
+    Finished shards are listed in ``manifest.json``,
+    which is replaced atomically, so downstream jobs can pick them up while
+    the crawl is still running.
+
+    Settings:
+        EXPORT_JSONLINES_DIR: the directory to export to, the pipeline is
+            disabled if not set
+        EXPORT_JSONLINES_COMPRESSION: "gzip" (default), "zstd" (needs the
+            zstandard package) or "none"
+        EXPORT_JSONLINES_MAX_BYTES: the shard size limit (default 64MB)
+        EXPORT_JSONLINES_MAX_OPEN_FILES: (default 64)
+    """
+    manifest_name = "manifest.json"
+
+    def __init__(self, directory, compression="gzip",
+                 max_bytes=64 * 1024 * 1024, max_open_files=64):
+        if compression not in JsonLinesShard.extensions:
+            raise NotConfigured(
+                "Unknown compression {0}".format(compression))
+        if compression == "zstd" and zstandard is None:
+            raise NotConfigured("zstd compression needs zstandard installed")
+
+        self.directory = directory
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_open_files = max_open_files
+        self.encoder = ScrapyJSONEncoder()
+        self.shards = OrderedDict()
+        self.shard_counts = {}
+        self.manifest = {"complete": False, "shards": []}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        directory = settings.get("EXPORT_JSONLINES_DIR")
+        if not directory:
+            raise NotConfigured
+        return cls(
+            directory,
+            compression=settings.get("EXPORT_JSONLINES_COMPRESSION", "gzip"),
+            max_bytes=settings.getint(
+                "EXPORT_JSONLINES_MAX_BYTES", 64 * 1024 * 1024),
+            max_open_files=settings.getint(
+                "EXPORT_JSONLINES_MAX_OPEN_FILES", 64))
+
+    def open_spider(self, spider):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # keep the shards from earlier runs exporting to the same directory
+        path = os.path.join(self.directory, self.manifest_name)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.manifest["shards"] = json.load(f)["shards"]
+        self._write_manifest()
+
+    def close_spider(self, spider):
+        for partition in list(self.shards):
+            self._finish(partition)
+        self.manifest["complete"] = True
+        self._write_manifest()
+
+    def process_item(self, item, spider):
+        partition = (item.get("year"), item.get("tournament"))
+        shard = self.shards.pop(partition, None)
+        if shard is None:
+            shard = self._open(partition)
+        # keep the most recently used shard last
+        self.shards[partition] = shard
+
+        shard.write(self.encoder.encode(serialize(item)).encode("utf-8") + b"\n")
+        if shard.bytes >= self.max_bytes:
+            self._finish(partition)
+        return item
+
+    def _open(self, partition):
+        if len(self.shards) >= self.max_open_files:
+            self._finish(next(iter(self.shards)))
+
+        year, tournament = partition
+        directory = os.path.join(
+            self.directory,
+            u"year={0}".format(_slug(year)),
+            u"tournament={0}".format(_slug(tournament)))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # partitions can share a directory when their values slug the same,
+        # and shards that are still being written only have the temporary
+        # name
+        extension = JsonLinesShard.extensions[self.compression]
+        number = self.shard_counts.get(directory, 0)
+        path = os.path.join(directory, "part-{0:05d}".format(number))
+        while os.path.exists(path + extension) or \
+                os.path.exists(path + extension + ".inprogress"):
+            number += 1
+            path = os.path.join(directory, "part-{0:05d}".format(number))
+        self.shard_counts[directory] = number + 1
+        return JsonLinesShard(path, self.compression)
+
+    def _finish(self, partition):
+        shard = self.shards.pop(partition)
+        shard.close()
+        self.manifest["shards"].append({
+            "path": os.path.relpath(shard.path, self.directory),
+            "year": partition[0],
+            "tournament": partition[1],
+            "items": shard.items,
+            "bytes": shard.bytes,
+        })
+        self._write_manifest()
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, self.manifest_name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.rename(path + ".tmp", path)
+
+
+class SQLiteExportPipeline(object):
+    """
+    Write the items to a normalized SQLite database (see
+    ``handball.database``). Items are buffered and inserted in batches of
+    EXPORT_SQLITE_BATCH_SIZE, each in a single transaction, and matches are
+    replaced when they're scraped again so a re-crawl doesn't duplicate
+    them. If a batch fails its items are added one at a time, the ones that
+    still fail are logged, counted in the crawl stats
+    (``export_sqlite/failed``) and left out.
+
+    Settings:
+        EXPORT_SQLITE_PATH: the database file, the pipeline is disabled if
+            not set
+        EXPORT_SQLITE_BATCH_SIZE: (default 500)
+    """
+
+    def __init__(self, path, batch_size=500, stats=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.stats = stats
+        self.database = None
+        self.spider = None
+        self.batch = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get("EXPORT_SQLITE_PATH")
+        if not path:
+            raise NotConfigured
+        return cls(path,
+                   batch_size=settings.getint("EXPORT_SQLITE_BATCH_SIZE", 500),
+                   stats=crawler.stats)
+
+    def open_spider(self, spider):
+        self.spider = spider
+        self.database = MatchDatabase(self.path)
+
+    def close_spider(self, spider):
+        self.flush()
+        self.database.close()
+
+    def process_item(self, item, spider):
+        self.batch.append(item)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self):
+        batch, self.batch = self.batch, []
+        try:
+            self.database.add_matches(batch)
+        except Exception:
+            # find the items that fail, the rest of the batch is added
+            for item in batch:
+                try:
+                    self.database.add_matches([item])
+                except Exception:
+                    self._failed(item)
+
+    def _failed(self, item):
+        logger.exception("Couldn't add %(url)s to %(path)s", {
+            "url": item.get("url") or item.get("tournament"),
+            "path": self.path,
+        }, extra={"spider": self.spider})
+        if self.stats is not None:
+            self.stats.inc_value("export_sqlite/failed", spider=self.spider)
+
+
+class ParquetExportPipeline(object):
+    """
+    Write the items to a Parquet dataset partitioned by year and tournament
+    (see ``handball.parquet``). Items are buffered and written in batches of
+    EXPORT_PARQUET_BATCH_SIZE, each batch makes a file per table and
+    partition in it.
+
+    Settings:
+        EXPORT_PARQUET_DIR: the directory to export to, the pipeline is
+            disabled if not set
+        EXPORT_PARQUET_BATCH_SIZE: (default 5000)
+        EXPORT_PARQUET_COMPRESSION: "snappy" (default), "gzip", "zstd" or
+            "none"
+    """
+
+    def __init__(self, directory, batch_size=5000, compression="snappy"):
+        if pyarrow is None:
+            raise NotConfigured("Parquet export needs pyarrow installed")
+        self.dataset = ParquetDataset(directory, compression=compression)
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        directory = settings.get("EXPORT_PARQUET_DIR")
+        if not directory:
+            raise NotConfigured
+        return cls(
+            directory,
+            batch_size=settings.getint("EXPORT_PARQUET_BATCH_SIZE", 5000),
+            compression=settings.get("EXPORT_PARQUET_COMPRESSION", "snappy"))
+
+    def close_spider(self, spider):
+        self.dataset.flush()
+
+    def process_item(self, item, spider):
+        self.dataset.add_match(item)
+        if len(self.dataset) >= self.batch_size:
+            self.dataset.flush()
+        return item
@@ -0,0 +1,155 @@
+# coding: utf-8
+"""
+Read matches one at a time from the spider output without loading the whole
+file into memory.
+
+Both JSON arrays (``-o output.json -t json``) and JSON Lines (``-o
+output.jl``, optionally gzip compressed) are supported, as well as the
+directories written by ``JsonLinesExportPipeline``.
+
+Predicates (like the ones in ``handball.analyze``) can be pushed down to the
+reader. A predicate with a ``raw`` attribute gets to look at the raw JSON
+text of each match first and matches it rejects are never decoded. The
+predicates are then applied to the decoded match as usual.
+"""
+import codecs
+import gzip
+import json
+import os
+import re
+
+CHUNK_SIZE = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+MANIFEST = "manifest.json"
+
+# strings and braces, the only tokens that matter when looking for the end of
+# an object. A string that isn't terminated yet matches the second group.
+OBJECT_TOKEN_RE = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"|("[^"\\]*(?:\\.[^"\\]*)*\\?$)|[{}]')
+
+
+def _open(path):
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    stream = gzip.open(path, "rb") if compressed else open(path, "rb")
+    return codecs.getreader("utf-8")(stream)
+
+
+def _iter_array(stream, buf):
+    """
+    Yield the raw text of each object in the JSON array read from ``stream``
+    (``buf`` holds what has been read already, starting at the "[").
+    """
+    pos = 1
+    while True:
+        start = buf.find("{", pos)
+        if start == -1:
+            # only whitespace, commas or the closing bracket left
+            buf = stream.read(CHUNK_SIZE)
+            pos = 0
+            if not buf:
+                return
+            continue
+
+        depth = 0
+        end = None
+        for token in OBJECT_TOKEN_RE.finditer(buf, start):
+            if token.group(1) is not None:
+                break
+            value = token.group(0)
+            if value == "{":
+                depth += 1
+            elif value == "}":
+                depth -= 1
+                if depth == 0:
+                    end = token.end()
+                    break
+
+        if end is None:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("Unexpected end of JSON array")
+            buf = buf[start:] + chunk
+            pos = 0
+            continue
+
+        yield buf[start:end]
+        pos = end
+
+
+def iter_raw_matches(path):
+    """
+    Yield the raw JSON text of each match in the file (or export directory)
+    at ``path``.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, MANIFEST), "r") as f:
+            shards = json.load(f)["shards"]
+        for shard in shards:
+            for raw in iter_raw_matches(os.path.join(path, shard["path"])):
+                yield raw
+        return
+
+    stream = _open(path)
+    try:
+        buf = stream.read(CHUNK_SIZE)
+        if buf.lstrip().startswith("["):
+            for raw in _iter_array(stream, buf.lstrip()):
+                yield raw
+            return
+
+        # JSON Lines
+        for line in _iter_lines(stream, buf):
+            if line.strip():
+                yield line
+    finally:
+        stream.close()
+
+
+def _iter_lines(stream, buf):
+    while True:
+        lines = buf.split("\n")
+        for line in lines[:-1]:
+            yield line
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            yield lines[-1]
+            return
+        buf = lines[-1] + chunk
+
+
+def iter_matches(path, predicates=()):
+    """
+    Yield the matches in the file (or export directory) at ``path`` that
+    pass all the predicates.
+    """
+    raw_predicates = [
+        p.raw for p in predicates if getattr(p, "raw", None) is not None]
+    for raw in iter_raw_matches(path):
+        if not all(raw_predicate(raw) for raw_predicate in raw_predicates):
+            continue
+        match = json.loads(raw)
+        if all(predicate(match) for predicate in predicates):
+            yield match
+
+
+class MatchFile(object):
+    """
+    The matches in a file, read lazily every time they are iterated over.
+
+    Example:
+
+        matches = MatchFile("output.json")
+        count_goals(u"Halldór Rúnarsson", matches)
+        count_goals(u"Halldór Rúnarsson", matches.where(match_in_season(2015)))
+    """
+
+    def __init__(self, path, predicates=()):
+        self.path = path
+        self.predicates = tuple(predicates)
+
+    def where(self, *predicates):
+        return MatchFile(self.path, self.predicates + predicates)
+
+    def __iter__(self):
+        return iter_matches(self.path, self.predicates)
@@ -0,0 +1,229 @@
+# coding: utf-8
+"""
+A lightweight runner for the hsi-scraper spider, for frequent small
+refreshes (e.g. live scores on a match day) where Scrapy's start up and its
+middleware stack cost more than the crawl itself.
+
+The runner walks the same pages with the same callbacks as a Scrapy crawl
+(``HSISpider.parse``, ``parse_tournament`` and ``parse_game``, with the
+``hsi_profiles`` player parsers) and writes the same items, as JSON Lines.
+It downloads with a Twisted HTTP client over a pool of keep-alive
+connections, with at most ``--concurrency`` requests in flight. Only the
+current season is crawled unless ``--all-seasons`` is given:
+
+    $ python -m handball.runner -o live.jl -a "tournaments=Olís deild karla"
+
+Spider arguments are passed with ``-a`` like to ``scrapy crawl``, e.g. a
+state database to only fetch the games that changed or a retry queue (see
+``handball.validation``) to only fetch the pages in it. Requests go through
+``http_proxy`` if it's set. There's no HTTP cache, no throttling and no
+robots.txt handling, so keep the concurrency low against hsi.is.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import urlparse
+
+from collections import Counter
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings.default_settings import USER_AGENT
+from scrapy.utils.serialize import ScrapyJSONEncoder
+from twisted.internet import defer, reactor
+from twisted.internet.endpoints import TCP4ClientEndpoint
+from twisted.web.client import (
+    Agent, ContentDecoderAgent, GzipDecoder, HTTPConnectionPool, ProxyAgent,
+    RedirectAgent, readBody)
+from twisted.web.http_headers import Headers
+
+from .items import serialize
+from .spiders.hsi import HSISpider
+from .utils import canonical_url, url_class
+
+logger = logging.getLogger(__name__)
+
+
+def _agent(pool):
+    proxy = os.environ.get("http_proxy")
+    if proxy:
+        proxy = urlparse.urlparse(proxy)
+        agent = ProxyAgent(TCP4ClientEndpoint(
+            reactor, proxy.hostname, proxy.port or 80), reactor, pool=pool)
+    else:
+        agent = Agent(reactor, pool=pool)
+    return ContentDecoderAgent(RedirectAgent(agent), [(b"gzip", GzipDecoder)])
+
+
+class Runner(object):
+    """
+    Crawl with ``spider``'s callbacks, passing the items to ``output``.
+
+    Requests for the same page (by canonical url) are only made once. A
+    download that fails, or gets a server error, is retried ``retries``
+    times.
+    """
+
+    def __init__(self, spider, output, concurrency=8, follow_seasons=False,
+                 retries=2, timeout=30):
+        self.spider = spider
+        self.output = output
+        self.follow_seasons = follow_seasons
+        self.retries = retries
+        self.timeout = timeout
+
+        self.pool = HTTPConnectionPool(reactor, persistent=True)
+        self.pool.maxPersistentPerHost = concurrency
+        self.agent = _agent(self.pool)
+        self.semaphore = defer.DeferredSemaphore(concurrency)
+        self.headers = Headers({b"User-Agent": [USER_AGENT]})
+
+        self.seen = set()
+        self.active = 0
+        self.finished = None
+        self.stats = Counter()
+
+    def crawl(self):
+        """
+        Crawl from the spider's start requests (e.g. the pages in a retry
+        queue). Returns a Deferred that fires with the stats when every
+        request is done.
+        """
+        self.finished = defer.Deferred()
+        self.stats["start_time"] = time.time()
+        for request in self.spider.start_requests():
+            self.schedule(request, follow=True)
+        if not self.active:
+            self._done()
+        return self.finished
+
+    def schedule(self, request, follow=False):
+        if not follow and not self.follow_seasons and \
+                url_class(request.url) == "season":
+            self.stats["skipped/season"] += 1
+            return
+        fingerprint = canonical_url(request.url)
+        if fingerprint in self.seen:
+            self.stats["dupefilter/filtered"] += 1
+            return
+        self.seen.add(fingerprint)
+        self.active += 1
+        self._request(request, self.retries)
+
+    def _request(self, request, retries):
+        d = self.semaphore.run(self._fetch, request)
+        d.addCallbacks(self._parse, self._failed,
+                       callbackArgs=(request, retries),
+                       errbackArgs=(request, retries))
+        d.addErrback(self._parse_failed, request)
+        d.addBoth(self._finish)
+
+    def _fetch(self, request):
+        self.stats["request_count"] += 1
+        d = self.agent.request(b"GET", request.url, self.headers)
+        d.addCallback(lambda response: readBody(response).addCallback(
+            lambda body: (response, body)))
+        d.addTimeout(self.timeout, reactor)
+        return d
+
+    def _parse(self, result, request, retries):
+        response, body = result
+        self.stats["response_status_count/{0}".format(response.code)] += 1
+        if response.code >= 500 and retries:
+            self.stats["retry_count"] += 1
+            self.active += 1
+            self._request(request, retries - 1)
+            return
+        if response.code != 200:
+            logger.warning("Got %d for %s", response.code, request.url)
+            return
+
+        response = HtmlResponse(
+            url=request.url, status=response.code, body=body,
+            headers=dict(response.headers.getAllRawHeaders()),
+            request=request)
+        callback = request.callback or self.spider.parse
+        # parse_workers makes the callbacks return Deferreds
+        return defer.maybeDeferred(callback, response).addCallback(
+            self._handle_output)
+
+    def _handle_output(self, result):
+        for output in result or ():
+            if isinstance(output, Request):
+                self.schedule(output)
+            else:
+                self.stats["item_scraped_count"] += 1
+                self.output(output)
+
+    def _failed(self, failure, request, retries):
+        if retries:
+            self.stats["retry_count"] += 1
+            self.active += 1
+            self._request(request, retries - 1)
+            return
+        self.stats["errors"] += 1
+        logger.error("Failed %s: %s", request.url, failure.getErrorMessage())
+
+    def _parse_failed(self, failure, request):
+        self.stats["spider_exceptions"] += 1
+        logger.error("Parsing %s failed:\n%s", request.url,
+                     failure.getTraceback())
+
+    def _finish(self, _):
+        self.active -= 1
+        if not self.active:
+            self._done()
+
+    def _done(self):
+        self.stats["finish_time"] = time.time()
+        self.spider.closed("finished")
+        self.pool.closeCachedConnections().addBoth(
+            lambda _: self.finished.callback(self.stats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-o", "--output", default="-",
+                        help="the JSON Lines file (default stdout)")
+    parser.add_argument("-a", dest="arguments", action="append", default=[],
+                        metavar="NAME=VALUE", help="a spider argument")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--all-seasons", action="store_true",
+                        help="follow the links to past seasons")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    spider = HSISpider(**dict(argument.partition("=")[::2]
+                              for argument in args.arguments))
+    stream = sys.stdout if args.output == "-" else open(args.output, "a")
+    encoder = ScrapyJSONEncoder()
+
+    def output(item):
+        stream.write(encoder.encode(serialize(item)).encode("utf-8") + b"\n")
+
+    runner = Runner(spider, output, concurrency=args.concurrency,
+                    follow_seasons=args.all_seasons)
+    results = {}
+
+    def finished(stats):
+        results.update(stats)
+        reactor.stop()
+
+    reactor.callWhenRunning(lambda: runner.crawl().addCallback(finished))
+    reactor.run()
+    stream.flush()
+
+    logger.info("%d requests, %d items in %.2f seconds",
+                results.get("request_count", 0),
+                results.get("item_scraped_count", 0),
+                results.get("finish_time", 0) - results.get("start_time", 0))
+    logger.info("Stats: %s", json.dumps(results, sort_keys=True))
+    return 1 if results.get("errors") or \
+        results.get("spider_exceptions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
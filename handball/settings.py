@@ -32,6 +32,17 @@ ROBOTSTXT_OBEY = True
 # CONCURRENT_REQUESTS_PER_DOMAIN = 16
 # CONCURRENT_REQUESTS_PER_IP = 16
 
+# With JOBDIR set, keep the scheduled and seen requests in an SQLite database
+# in JOBDIR that is committed every FRONTIER_CHECKPOINT_INTERVAL seconds, so
+# a killed crawl can be resumed (see handball/frontier.py)
+SCHEDULER = 'handball.frontier.FrontierScheduler'
+# FRONTIER_WINDOW = 1000
+# FRONTIER_CHECKPOINT_INTERVAL = 30
+
+# Filter duplicate requests by their canonical url (see
+# handball/dupefilters.py), the fingerprints are kept in JOBDIR if set
+DUPEFILTER_CLASS = 'handball.dupefilters.CanonicalDupeFilter'
+
 # Disable cookies (enabled by default)
 # COOKIES_ENABLED = False
 
@@ -46,15 +57,44 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable spider middlewares
 # See http://scrapy.readthedocs.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#     'handball.middlewares.MyCustomSpiderMiddleware': 543,
+SPIDER_MIDDLEWARES = {
+    'handball.frontier.FrontierMiddleware': 50,
+    'handball.middlewares.PageClassPriorityMiddleware': 543,
+    'handball.metrics.CrawlMetricsMiddleware': 990,
+}
+# Fetch tournament pages (which fan out to the game pages) first, or game
+# pages first with PAGECLASS_DEPTH_FIRST (the default when JOBDIR is set)
+# PAGECLASS_DEPTH_FIRST = False
+# PAGECLASS_PRIORITIES = {
+#     'tournament': 20,
+#     'season': 10,
+#     'game': 0,
+#     'other': 0,
 # }
 
+# Time the callbacks and parse functions, count the parse failures and write
+# them with the crawl rates and peak memory use in the Prometheus text format
+# (see handball/metrics.py)
+# METRICS_ENABLED = True
+# METRICS_FILE = 'metrics.prom'
+# METRICS_INTERVAL = 15
+# METRICS_TIMED_FUNCTIONS = [
+#     'handball.spiders.hsi._parse_date',
+#     'handball.spiders.hsi.get_player_parser',
+# ]
+
 # Enable or disable downloader middlewares
 # See http://scrapy.readthedocs.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#     'handball.middlewares.MyCustomDownloaderMiddleware': 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    'handball.middlewares.PageClassThrottleMiddleware': 543,
+}
+# Adjust the concurrency and delay of season, tournament and game pages
+# separately to the latency and errors of each
+PAGECLASS_THROTTLE_ENABLED = True
+# PAGECLASS_THROTTLE_TARGET_LATENCY = 1.0
+# PAGECLASS_THROTTLE_START_CONCURRENCY = 1
+# PAGECLASS_THROTTLE_MAX_CONCURRENCY = 16
+# PAGECLASS_THROTTLE_MAX_DELAY = 60
 
 # Enable or disable extensions
 # See http://scrapy.readthedocs.org/en/latest/topics/extensions.html
@@ -64,9 +104,34 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See http://scrapy.readthedocs.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#     'handball.pipelines.SomePipeline': 300,
-# }
+ITEM_PIPELINES = {
+    'handball.pipelines.ValidationPipeline': 300,
+    'handball.pipelines.JsonLinesExportPipeline': 800,
+    'handball.pipelines.SQLiteExportPipeline': 810,
+    'handball.pipelines.ParquetExportPipeline': 820,
+}
+
+# Write the game pages that fail validation to a retry queue, fetch them
+# again with -a retry=retry.jl
+# VALIDATION_RETRY_FILE = 'retry.jl'
+
+# Stream the items to compressed JSON Lines shards partitioned by year and
+# tournament (disabled unless a directory is set)
+# EXPORT_JSONLINES_DIR = 'export'
+# EXPORT_JSONLINES_COMPRESSION = 'gzip'
+# EXPORT_JSONLINES_MAX_BYTES = 64 * 1024 * 1024
+# EXPORT_JSONLINES_MAX_OPEN_FILES = 64
+
+# Write the items to a normalized SQLite database (disabled unless a path is
+# set)
+# EXPORT_SQLITE_PATH = 'output.sqlite'
+# EXPORT_SQLITE_BATCH_SIZE = 500
+
+# Write the items to a Parquet dataset partitioned by year and tournament
+# (disabled unless a directory is set, needs pyarrow)
+# EXPORT_PARQUET_DIR = 'dataset'
+# EXPORT_PARQUET_BATCH_SIZE = 5000
+# EXPORT_PARQUET_COMPRESSION = 'snappy'
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See http://doc.scrapy.org/en/latest/topics/autothrottle.html
@@ -85,6 +150,17 @@ ROBOTSTXT_OBEY = True
 # See http://scrapy.readthedocs.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
 # HTTPCACHE_ENABLED = True
 # HTTPCACHE_EXPIRATION_SECS = 0
-# HTTPCACHE_DIR = 'httpcache'
-# HTTPCACHE_IGNORE_HTTP_CODES = []
-# HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_IGNORE_HTTP_CODES = [500, 502, 503, 504]
+HTTPCACHE_STORAGE = 'handball.httpcache.ContentAddressedCacheStorage'
+# How long pages of each class are cached (pages from past seasons never
+# expire), see handball.httpcache.url_class
+HTTPCACHE_EXPIRATION_SECS_BY_CLASS = {
+    'season': 60 * 60,
+    'tournament': 6 * 60 * 60,
+    'game': 6 * 60 * 60,
+    'other': 60 * 60,
+}
+# Never expire anything, add HTTPCACHE_IGNORE_MISSING = True to crawl
+# without touching the network at all
+# HTTPCACHE_OFFLINE = True
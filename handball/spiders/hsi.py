@@ -1,6 +1,7 @@
 # coding: utf8
 import locale
 import logging
+import re
 import threading
 
 import scrapy
@@ -8,10 +9,17 @@ import scrapy
 from contextlib import contextmanager
 from datetime import datetime
 
+from ..items import Match, TeamSheet
+from ..state import CrawlState, digest
+from ..utils import parse_datetime, parse_years
+from ..validation import RetryQueue
+from ..workers import ParseWorkerPool
 from .hsi_profiles import get_player_parser, parse_basic, UnknownPlayerType
 
 logger = logging.getLogger(__name__)
 
+SCORE_RE = re.compile(r"\d+\s*-\s*\d+")
+
 
 LOCALE_LOCK = threading.Lock()
 
@@ -38,6 +46,36 @@ def clean_tag_text(text):
         .replace("&nb", "").strip()
 
 
+def _cell_text(el):
+    """
+    The direct text nodes of an lxml element joined with a space, the same
+    as " ".join(el.xpath("text()").extract()) but without the XPath
+    evaluation.
+    """
+    texts = [el.text] if el.text else []
+    texts.extend(child.tail for child in el if child.tail)
+    return clean_tag_text(u" ".join(texts))
+
+
+def roster_rows(team_link):
+    """
+    Walk the rows following the row with the team link (an lxml element) in
+    the roster table once and yield a tuple (is_header, fields) for each of
+    them. Header rows (with <th> cells) have is_header set to True.
+
+    This yields the same rows as the XPath
+    "ancestor::tr/following-sibling::tr" on the team link.
+    """
+    for ancestor in team_link.iterancestors("tr"):
+        for row in ancestor.itersiblings("tr"):
+            headers = [_cell_text(cell) for cell in row if cell.tag == "th"]
+            if headers:
+                yield True, headers
+            else:
+                yield False, [
+                    _cell_text(cell) for cell in row if cell.tag == "td"]
+
+
 def _text(el):
     text = el.xpath("text()").extract_first()
     if text:
@@ -46,6 +84,24 @@ def _text(el):
     return ""
 
 
+# Abbreviations used by the is_IS locale, which is what the HSÍ pages use
+WEEKDAYS = (u"mán", u"þri", u"mið", u"fim", u"fös", u"lau", u"sun")
+MONTHS = (u"jan", u"feb", u"mar", u"apr", u"maí", u"jún",
+          u"júl", u"ágú", u"sep", u"okt", u"nóv", u"des")
+MONTH_NUMBERS = dict((month, i + 1) for i, month in enumerate(MONTHS))
+
+# The same as the "%a. %d.%b.%Y %H.%M" format strptime uses in the is_IS
+# locale
+DATE_RE = re.compile(
+    u"^(?:{weekdays})\\.\\s+(3[01]|[12]\\d|0[1-9]|[1-9]| [1-9])\\."
+    u"({months})\\.(\\d{{4}})\\s+(2[0-3]|[0-1]\\d|\\d)\\.([0-5]\\d|\\d)$".format(
+        weekdays="|".join(WEEKDAYS), months="|".join(MONTHS)),
+    re.UNICODE)
+
+DATE_CACHE_SIZE = 10000
+_date_cache = {}
+
+
 def _parse_date(date_string):
     """
     Accepts the datetime string representation used on the HSÍ result pages
@@ -66,6 +122,39 @@ def _parse_date(date_string):
 
     If parsing doesn't work either we return the string as that's better than
     nothing.
+
+    The Icelandic weekday and month names are built in so no locale is
+    needed, and as the same dates show up over and over the results are
+    cached.
+    """
+    try:
+        return _date_cache[date_string]
+    except KeyError:
+        pass
+
+    parsed = date_string
+    match = DATE_RE.match(date_string.lower())
+    if match:
+        day, month, year, hour, minute = match.groups()
+        try:
+            parsed = datetime(int(year), MONTH_NUMBERS[month], int(day),
+                              int(hour), int(minute))
+        except ValueError, e:
+            logger.warn(e)
+    else:
+        logger.warn(u"Unable to parse date \"{0}\"".format(date_string))
+
+    if len(_date_cache) >= DATE_CACHE_SIZE:
+        _date_cache.clear()
+    _date_cache[date_string] = parsed
+    return parsed
+
+
+def _parse_date_strptime(date_string):
+    """
+    The locale based implementation of ``_parse_date``. Needs the is_IS
+    locale to be installed and is only kept around to check the results of
+    ``_parse_date`` against.
     """
     fixed_date_string = date_string.lower().encode('utf-8')
     with use_locale("is_IS.UTF-8"):
@@ -76,9 +165,133 @@ def _parse_date(date_string):
     return date_string
 
 
+def tournament_games(response):
+    """
+    The games on a tournament page and a digest of the game rows (to tell
+    whether the page changed). Each game is a dict with the tournament,
+    season, date, venue, teams, scores and the url of the game page, if the
+    game has one.
+    """
+    title_selector = response.xpath("//a[@class = 'timabil']")
+    title = _text(title_selector.xpath("parent::td"))
+    year = int(_text(title_selector))
+
+    game_rows = response.xpath(
+        "//th[text() = 'Dagur']/../following-sibling::tr[count(td) = 6]")
+    page_digest = digest(game_selector.extract() for game_selector in game_rows)
+
+    games = []
+    for game_selector in game_rows:
+        date, time, venue, teams, ft_el, ht_el = game_selector.xpath("td")
+
+        game_details_selector = teams.xpath("a")
+        if game_details_selector:
+            game_url = response.urljoin(
+                game_details_selector.xpath("@href").extract_first())
+            game_teams = _text(game_details_selector)
+        else:
+            game_url = None
+            game_teams = _text(teams)
+
+        home, away = _find_teams(game_teams, response.url)
+
+        games.append({
+            "tournament": title,
+            "year": year,
+            "datetime": _parse_date(" ".join((_text(date), _text(time)))),
+            "venue": _text(venue),
+            "home": home,
+            "away": away,
+            "full-time": _text(ft_el),
+            "half-time": _text(ht_el),
+            "url": game_url,
+        })
+    return page_digest, games
+
+
+def game_item(response):
+    """
+    The match on a game page: the game details from the tournament page (in
+    the response meta) with the attendance and referees and the rosters
+    for both teams and the players performance.
+    """
+    meta = [
+        (key.strip(), value.strip()) for key, value in [
+            meta_str.split(":") for meta_str in response.xpath(
+                u"//p[contains(., 'Áhorfendur')]/*/text()").extract()]]
+
+    team_tags = response.xpath("//td[@class = 'haus']/a")
+    teams = []
+    for team in team_tags:
+        team_name = _text(team)
+        team_roster = []
+        parser = parse_basic("unknown")
+        for is_header, fields in roster_rows(team.root):
+            if is_header:
+                parser = get_player_parser(tuple(fields))
+            else:
+                player = parser(fields)
+
+                # special case for the "total number of goals/penalties"
+                if player.get("name", "") != "Samtals":
+                    team_roster.append(player)
+
+        teams.append(TeamSheet(name=team_name, roster=team_roster))
+
+    return Match(response.meta, meta=meta, home=teams[0], away=teams[1])
+
+
+def _find_teams(game_teams, url):
+    """
+    Extract team names from "[home team] - [away team]". Keep in mind that
+    some teams might have a hyphen in their name. Also handle the case
+    where either the home team or away team is missing (e.g.
+    "- [away team]" or "[home team] -")
+    """
+    teams = [team.strip() for team in game_teams.split(" - ")]
+    if len(teams) == 2:
+        return teams
+
+    if game_teams[0] == "-":
+        return "", game_teams[1:].strip()
+    if game_teams[-1] == "-":
+        return game_teams[:-1].strip(), ""
+
+    logger.warn(
+        u"Couldn't extract home/away teams from game description \"{0}\" at {1}".format(
+            game_teams, url))
+    return "", ""
+
+
 class HSISpider(scrapy.Spider):
     """
     Scrape all match data from hsi.is
+
+    Pass a path to a state database to only crawl what changed since the
+    last run:
+
+        scrapy crawl hsi-scraper -a state=crawl-state.db
+
+    Past seasons and tournaments that have been crawled completely are then
+    skipped, as are finalized games and unplayed games on tournament pages
+    that haven't changed.
+
+    To parse the tournament and game pages in a pool of worker processes,
+    leaving the reactor free for downloading, pass the number of workers:
+
+        scrapy crawl hsi-scraper -a parse_workers=4
+
+    To crawl some of the seasons or tournaments only, pass the years (a
+    comma separated list of years and ranges) and/or the tournament titles
+    (comma separated, case insensitive):
+
+        scrapy crawl hsi-scraper -a years=1994-1999,2004
+        scrapy crawl hsi-scraper -a "tournaments=Olís deild karla"
+
+    To only fetch the game pages in a retry queue written by
+    ``ValidationPipeline`` (see ``handball.validation``):
+
+        scrapy crawl hsi-scraper -a retry=retry.jl
     """
     name = "hsi-scraper"
     allowed_domains = ["hsi.is"]
@@ -86,6 +299,58 @@ class HSISpider(scrapy.Spider):
         "http://hsi.is/motamal/",
     ]
 
+    def __init__(self, state=None, parse_workers=None, years=None,
+                 tournaments=None, retry=None, *args, **kwargs):
+        super(HSISpider, self).__init__(*args, **kwargs)
+        self.crawl_state = CrawlState(state) if state else None
+        self.workers = ParseWorkerPool(int(parse_workers)) \
+            if parse_workers else None
+        self.years = parse_years(years) if years else None
+        if isinstance(tournaments, bytes):
+            tournaments = tournaments.decode("utf-8")
+        self.tournaments = set(
+            title.strip().lower() for title in tournaments.split(",")
+            if title.strip()) if tournaments else None
+        self.current_year = None
+        # read now, the crawl replaces the queue when it's done
+        self.retry = list(RetryQueue.read(retry)) if retry else None
+
+    def start_requests(self):
+        if self.retry is None:
+            for request in super(HSISpider, self).start_requests():
+                yield request
+            return
+        for url, meta in self.retry:
+            # the queued date is either a datetime or the text that didn't
+            # parse, which a fixed parser gets another go at
+            text = meta.get("datetime")
+            meta["datetime"] = parse_datetime(text)
+            if meta["datetime"] is None and text:
+                meta["datetime"] = _parse_date(text)
+            yield scrapy.Request(url, callback=self.parse_game, meta=meta,
+                                 dont_filter=True)
+
+    def closed(self, reason):
+        if self.crawl_state:
+            self.crawl_state.close()
+        if self.workers:
+            self.workers.close()
+
+    def _inc_stat(self, key):
+        crawler = getattr(self, "crawler", None)
+        if crawler:
+            crawler.stats.inc_value(key, spider=self)
+
+    def _wanted_year(self, year):
+        return self.years is None or year in self.years
+
+    def _wanted_tournament(self, title):
+        return self.tournaments is None or title.lower() in self.tournaments
+
+    def _is_past(self, year):
+        return None not in (year, self.current_year) and \
+            year < self.current_year
+
     def parse(self, response):
         """
         Parse the response and find all the tournaments that we can parse as
@@ -117,10 +382,33 @@ class HSISpider(scrapy.Spider):
                     sel.xpath("@href").extract_first(),
                 ) for sel in tournament_selector]
 
+            self.current_year = max(
+                [year, self.current_year] + [y for y, _ in other_seasons])
+
             for y, url in other_seasons:
+                if not self._wanted_year(y):
+                    continue
+                if self.crawl_state:
+                    if self.crawl_state.is_complete(response.urljoin(url)):
+                        self._inc_stat("incremental/skipped_seasons")
+                        continue
+                    self.crawl_state.record_page(
+                        response.urljoin(url), past=self._is_past(y))
                 yield scrapy.Request(response.urljoin(url))
 
+            if not self._wanted_year(year):
+                tournaments = []
+
             for title, url in tournaments:
+                if not self._wanted_tournament(title):
+                    continue
+                if self.crawl_state:
+                    if self.crawl_state.is_complete(response.urljoin(url)):
+                        self._inc_stat("incremental/skipped_tournaments")
+                        continue
+                    self.crawl_state.record_page(
+                        response.urljoin(url), parent=response.url,
+                        past=self._is_past(year))
                 yield scrapy.Request(
                     response.urljoin(url),
                     callback=self.parse_tournament,
@@ -131,106 +419,60 @@ class HSISpider(scrapy.Spider):
                     })
 
     def parse_tournament(self, response):
-        title_selector = response.xpath("//a[@class = 'timabil']")
-        title = _text(title_selector.xpath("parent::td"))
-        year = int(_text(title_selector))
-
-        game_rows = response.xpath(
-            "//th[text() = 'Dagur']/../following-sibling::tr[count(td) = 6]")
-        for game_selector in game_rows:
-            date, time, venue, teams, ft_el, ht_el = game_selector.xpath("td")
-            venue_name = _text(venue)
-            full_time = _text(ft_el)
-            half_time = _text(ht_el)
-
-            parsed_date = _parse_date(" ".join((_text(date), _text(time))))
-
-            game_details_selector = teams.xpath("a")
-            if game_details_selector:
-                game_url = response.urljoin(
-                    game_details_selector.xpath("@href").extract_first())
-                game_teams = _text(game_details_selector)
-            else:
-                game_url = None
-                game_teams = _text(teams)
-
-            home, away = self._find_teams(game_teams, response)
-
-            game_data = {
-                "tournament": title,
-                "year": year,
-                "datetime": parsed_date,
-                "venue": venue_name,
-                "home": home,
-                "away": away,
-                "full-time": full_time,
-                "half-time": half_time,
-                "url": game_url,
-            }
+        if self.workers:
+            return self.workers.submit(tournament_games, response) \
+                .addCallback(lambda result: list(
+                    self._follow_games(response, *result)))
+        return self._follow_games(response, *tournament_games(response))
+
+    def _follow_games(self, response, page_digest, games):
+        page_changed = True
+        if self.crawl_state:
+            page_changed = \
+                self.crawl_state.page_digest(response.url) != page_digest
+
+        for game_data in games:
+            game_url = game_data["url"]
+
+            # nothing new on the page so games without a game page have
+            # already been yielded and an unplayed game won't have a roster
+            # until its score shows up here
+            if not page_changed and not (
+                    game_url and SCORE_RE.search(game_data["full-time"])):
+                self._inc_stat("incremental/skipped_games")
+                continue
 
             if game_url:
+                if self.crawl_state:
+                    if self.crawl_state.is_finalized(game_url):
+                        self._inc_stat("incremental/skipped_games")
+                        continue
+                    self.crawl_state.record_game(game_url, response.url)
                 yield scrapy.Request(
                     game_url,
                     callback=self.parse_game,
                     meta=game_data)
             else:
-                yield game_data
+                yield Match(game_data)
+
+        if self.crawl_state:
+            self.crawl_state.update_digest(response.url, page_digest)
+            self.crawl_state.complete_tournament(response.url)
 
     def parse_game(self, response):
         """
         Parse the single game page that contains the rosters for both teams and
         the players performance.
         """
-        meta = [
-            (key.strip(), value.strip()) for key, value in [
-                meta_str.split(":") for meta_str in response.xpath(
-                    u"//p[contains(., 'Áhorfendur')]/*/text()").extract()]]
-
-        team_tags = response.xpath("//td[@class = 'haus']/a")
-        teams = []
-        for team in team_tags:
-            team_name = _text(team)
-            rows = team.xpath("ancestor::tr/following-sibling::tr")
-            team_roster = []
-            parser = parse_basic("unknown")
-            for row in rows:
-                if row.xpath("th"):
-                    fields = tuple([clean_tag_text(" ".join(f)) for f in (
-                        e.xpath("text()").extract() for e in row.xpath("th"))])
-
-                    parser = get_player_parser(fields)
-                else:
-                    player = parser([clean_tag_text(" ".join(s)) for s in (
-                        e.xpath("text()").extract() for e in row.xpath("td"))])
-
-                    # special case for the "total number of goals/penalties"
-                    if player.get("name", "") != "Samtals":
-                        team_roster.append(player)
-
-            teams.append({
-                "name": team_name,
-                "roster": team_roster
-            })
-
-        yield dict(response.meta, meta=meta, home=teams[0], away=teams[1])
-
-    def _find_teams(self, game_teams, response):
-        """
-        Extract team names from "[home team] - [away team]". Keep in mind that
-        some teams might have a hyphen in their name. Also handle the case
-        where either the home team or away team is missing (e.g.
-        "- [away team]" or "[home team] -")
-        """
-        teams = [team.strip() for team in game_teams.split(" - ")]
-        if len(teams) == 2:
-            return teams
-
-        if game_teams[0] == "-":
-            return "", game_teams[1:].strip()
-        if game_teams[-1] == "-":
-            return game_teams[:-1].strip(), ""
-
-        logger.warn(
-            u"Couldn't extract home/away teams from game description \"{0}\" at {1}".format(
-                game_teams, response.url))
-        return "", ""
+        if self.workers:
+            return self.workers.submit(game_item, response) \
+                .addCallback(self._finish_game, response)
+        return self._finish_game(game_item(response), response)
+
+    def _finish_game(self, item, response):
+        if self.crawl_state and (
+                SCORE_RE.search(response.meta.get("full-time", "")) or
+                self._is_past(response.meta.get("year"))):
+            self.crawl_state.finalize_game(
+                response.meta.get("url", response.url))
+        return [item]
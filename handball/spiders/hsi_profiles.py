@@ -1,6 +1,7 @@
 # coding: utf-8
 import logging
 
+from ..items import PlayerLine
 from ..utils import ignore_exception, just
 
 logger = logging.getLogger(__name__)
@@ -11,71 +12,65 @@ class UnknownPlayerType(Exception):
     pass
 
 
+def normalize_header(header):
+    """
+    Lowercase the header fields and collapse the whitespace in them so small
+    differences in the markup don't matter when looking up a parser.
+    """
+    return tuple(u" ".join(field.split()).lower() for field in header)
+
+
 def get_player_parser(header):
     """
     Get a function that parses the data tuple into a common format based on the
     table header that preceeds the player line.
+
+    Headers we haven't seen before get a parser generated from the column
+    labels we know (see ``parse_by_columns``) which is then cached.
     """
+    key = normalize_header(header)
     try:
-        return filter(lambda x: x[0] == header, PLAYER_PROFILES)[0][1]
-    except IndexError:
+        return PLAYER_PARSERS[key]
+    except KeyError:
+        pass
+
+    if len(key) < 2:
         raise UnknownPlayerType("Unknown player profile {0}".format(header))
 
+    logger.warn(u"Unknown player profile {0}, parsing by column".format(
+        header))
+    return PLAYER_PARSERS.setdefault(key, parse_by_columns(key))
+
 
 def parse_goalkeeper((num, name, goals, _, yellow, susp, red, s6m, s9m, s7m)):
     """
     """
-    return {
-        "type": "goalkeeper",
-        "name": name,
-        "number": num,
-        "saves": {
-            "9m": try_int(s9m),
-            "6m": try_int(s6m),
-            "7m": try_int(s7m),
-        },
-        "penalties": {
-            "yellow": yellow == "G",
-            "suspensions": try_int(susp),
-            "red": red == "R",
-        },
-        "attempts": {
-            "goals": try_int(goals),
-            "saved": 0,
-            "missed": 0,
-        }
-    }
+    player = PlayerLine("goalkeeper", name, num, stats=True, saves=True)
+    player.saves_9m = try_int(s9m)
+    player.saves_6m = try_int(s6m)
+    player.saves_7m = try_int(s7m)
+    player.yellow = yellow == "G"
+    player.suspensions = try_int(susp)
+    player.red = red == "R"
+    player.goals = try_int(goals)
+    return player
 
 
 def parse_outfielder(data):
     num, name, shots, _, yellow, susp, red, skr, tb, rud, _ = just(11, data)
+    player = PlayerLine("outfielder", name, num, stats=True)
     if shots:
-        goals, saved, missed, _ = just(4, (try_int(n) for n in shots.split("/")))
-    else:
-        goals, saved, missed = (0, 0, 0)
-    return {
-        "type": "outfielder",
-        "name": name,
-        "number": num,
-        "penalties": {
-            "yellow": yellow == "G",
-            "suspensions": try_int(susp),
-            "red": red == "R",
-        },
-        "attempts": {
-            "goals": goals,
-            "saved": saved,
-            "missed": missed,
-        }
-    }
+        player.goals, player.saved, player.missed, _ = just(
+            4, (try_int(n) for n in shots.split("/")))
+    player.yellow = yellow == "G"
+    player.suspensions = try_int(susp)
+    player.red = red == "R"
+    return player
 
 
 def parse_basic(player_type):
     def parser(data):
-        return {
-            "type": player_type,
-            "name": data[1],
-        }
+        return PlayerLine(player_type, data[1])
     return parser
 
 
@@ -87,28 +82,78 @@ def parse_old_style(player_type):
         if red == "1":
             logger.info("Weird value for 'R': '1' - {0}".format(data))
 
-        player_data = {
-            "type": player_type,
-            "name": name,
-            "number": num,
-            "penalties": {
-                "yellow": yellow == "G",
-                "suspensions": try_int(susp),
-                "red": red == "R",
-            },
-            "attempts": {
-                "goals": try_int(goals),
-                "saved": 0,
-                "missed": 0,
-            }
-        }
-        if player_type == "goalkeeper":
-            player_data["saves"] = {
-                "9m": 0,
-                "6m": 0,
-                "7m": 0,
-            }
-        return player_data
+        player = PlayerLine(player_type, name, num, stats=True,
+                            saves=player_type == "goalkeeper")
+        player.yellow = yellow == "G"
+        player.suspensions = try_int(susp)
+        player.red = red == "R"
+        player.goals = try_int(goals)
+        return player
+    return parser
+
+
+def _set_goals(player, value):
+    player.goals = try_int(value)
+
+
+def _set_shots(player, value):
+    if value:
+        player.goals, player.saved, player.missed, _ = just(
+            4, (try_int(n) for n in value.split("/")))
+
+
+def _set_penalty(name, parse):
+    def setter(player, value):
+        setattr(player, name, parse(value))
+    return setter
+
+
+def _set_saves(distance):
+    def setter(player, value):
+        player.set_saves(distance, try_int(value))
+    return setter
+
+
+# What to do with the value of each known column, keyed on the normalized
+# column label. Columns not listed here are ignored.
+COLUMN_PARSERS = {
+    u"m": _set_goals,
+    u"skot m/v/f": _set_shots,
+    u"g": _set_penalty("yellow", lambda value: value == "G"),
+    u"2m": _set_penalty("suspensions", try_int),
+    u"r": _set_penalty("red", lambda value: value == "R"),
+    u"6m m/v": _set_saves("6m"),
+    u"9m m/v": _set_saves("9m"),
+    u"v\xedti m/v": _set_saves("7m"),
+}
+
+PLAYER_TYPES = {
+    u"markver\xf0ir": "goalkeeper",
+    u"\xfatileikmenn": "outfielder",
+    u"starfsmenn": "official",
+}
+
+
+def parse_by_columns(header):
+    """
+    Generate a parser for an unknown table layout from the normalized header.
+    The second column names the player type and the rest are mapped one by
+    one using ``COLUMN_PARSERS``.
+    """
+    player_type = PLAYER_TYPES.get(header[1], "unknown")
+    columns = [
+        (i, COLUMN_PARSERS[label]) for i, label in enumerate(header)
+        if i > 1 and label in COLUMN_PARSERS]
+    if not columns:
+        return parse_basic(player_type)
+
+    def parser(data):
+        player = PlayerLine(player_type, data[1], data[0], stats=True,
+                            saves=player_type == "goalkeeper")
+        for i, column_parser in columns:
+            if i < len(data):
+                column_parser(player, data[i])
+        return player
     return parser
 
 
@@ -146,3 +191,6 @@ PLAYER_PROFILES = (
     ((u'', u'\xdatileikmenn', u'M', u'G', u'2m', u'R'),
         parse_old_style("outfielder")),
 )
+
+PLAYER_PARSERS = dict(
+    (normalize_header(header), parser) for header, parser in PLAYER_PROFILES)
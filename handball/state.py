@@ -0,0 +1,157 @@
+# coding: utf-8
+"""
+Crawl state for incremental runs of the hsi-scraper spider.
+
+The state is a small SQLite database that remembers which season and
+tournament pages have been seen (with a digest of the game table on the
+tournament pages) and which game pages are finalized. Pages from past seasons
+never change so once a tournament has all its games finalized it is marked
+complete, and once a season has all its tournaments complete the season page
+is marked complete as well. Complete pages are never requested again.
+
+The state is committed whenever a tournament page or a game is done with,
+so a crawl that is killed keeps what it had finished.
+"""
+import hashlib
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    parent TEXT,
+    past INTEGER NOT NULL DEFAULT 0,
+    digest TEXT,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pages_parent ON pages (parent);
+
+CREATE TABLE IF NOT EXISTS games (
+    url TEXT PRIMARY KEY,
+    tournament TEXT,
+    finalized INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS games_tournament ON games (tournament);
+"""
+
+
+def digest(values):
+    """
+    A stable digest of a sequence of unicode values.
+    """
+    sha = hashlib.sha1()
+    for value in values:
+        sha.update(u"{0}\x00".format(value).encode("utf-8"))
+    return sha.hexdigest()
+
+
+class CrawlState(object):
+    """
+    Remembers which pages need not be fetched again.
+
+    Params:
+        path (str): the path to the SQLite database, created if missing
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def is_complete(self, url):
+        """
+        Has the season or tournament page at ``url`` nothing left to crawl?
+        """
+        row = self.db.execute(
+            "SELECT complete FROM pages WHERE url = ?", (url,)).fetchone()
+        return bool(row and row[0])
+
+    def record_page(self, url, parent=None, past=False):
+        """
+        Remember a season or tournament page. ``parent`` is the season page
+        a tournament was found on and ``past`` tells if the page belongs to
+        a past season (and can therefore be completed).
+        """
+        self.db.execute(
+            "INSERT OR IGNORE INTO pages (url) VALUES (?)", (url,))
+        self.db.execute(
+            "UPDATE pages SET parent = COALESCE(?, parent), past = ? "
+            "WHERE url = ?", (parent, int(past), url))
+
+    def page_digest(self, url):
+        """
+        The digest of the game table stored for the tournament page at
+        ``url`` or None if it hasn't been crawled before.
+        """
+        row = self.db.execute(
+            "SELECT digest FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def update_digest(self, url, page_digest):
+        """
+        Store the digest of the game table on the tournament page at
+        ``url``. Done after all the games on the page have been handled.
+        """
+        self.db.execute(
+            "INSERT OR IGNORE INTO pages (url) VALUES (?)", (url,))
+        self.db.execute(
+            "UPDATE pages SET digest = ? WHERE url = ?", (page_digest, url))
+
+    def is_finalized(self, url):
+        row = self.db.execute(
+            "SELECT finalized FROM games WHERE url = ?", (url,)).fetchone()
+        return bool(row and row[0])
+
+    def record_game(self, url, tournament):
+        """
+        Remember that the game at ``url`` belongs to ``tournament``.
+        """
+        self.db.execute(
+            "INSERT OR IGNORE INTO games (url, tournament) VALUES (?, ?)",
+            (url, tournament))
+
+    def finalize_game(self, url):
+        """
+        Mark the game at ``url`` as finalized and complete its tournament
+        (and season) if nothing is left to crawl there.
+        """
+        self.db.execute(
+            "INSERT OR IGNORE INTO games (url) VALUES (?)", (url,))
+        self.db.execute(
+            "UPDATE games SET finalized = 1 WHERE url = ?", (url,))
+        row = self.db.execute(
+            "SELECT tournament FROM games WHERE url = ?", (url,)).fetchone()
+        if row[0]:
+            self.complete_tournament(row[0])
+        self.db.commit()
+
+    def complete_tournament(self, url):
+        """
+        Mark the tournament page at ``url`` as complete if it's from a past
+        season, its game table has been seen and all of its games are
+        finalized.
+        """
+        self.db.execute(
+            "UPDATE pages SET complete = 1 "
+            "WHERE url = ? AND past = 1 AND digest IS NOT NULL "
+            "AND NOT EXISTS (SELECT 1 FROM games "
+            "                WHERE tournament = pages.url AND finalized = 0)",
+            (url,))
+        row = self.db.execute(
+            "SELECT parent FROM pages WHERE url = ?", (url,)).fetchone()
+        if row and row[0]:
+            self._complete_season(row[0])
+        self.db.commit()
+
+    def _complete_season(self, url):
+        self.db.execute(
+            "UPDATE pages SET complete = 1 "
+            "WHERE url = ? AND past = 1 "
+            "AND EXISTS (SELECT 1 FROM pages WHERE parent = ?) "
+            "AND NOT EXISTS (SELECT 1 FROM pages AS t "
+            "                WHERE t.parent = pages.url AND t.complete = 0)",
+            (url, url))
@@ -0,0 +1,187 @@
+# coding: utf-8
+"""
+Aggregate player statistics over all matches in a single pass.
+
+Instead of one ``count_goals`` scan per player, ``aggregate`` computes the
+totals for every group (player, team, season...) at once and returns them as
+a ``StatsTable``:
+
+    players = aggregate(data, by=("player",))
+    players.top("goals", 3)
+
+``aggregate_all`` computes several groupings in the same pass. The matches
+are loaded into a ``MatchStore`` (unless they already are one) and the
+group-by runs over its columns, vectorized with NumPy when it's installed.
+"""
+from collections import defaultdict, namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .store import MatchStore
+
+# The totals computed for each group. "appearances" is the number of matches
+# the players in the group were on the roster for.
+STATS = (
+    "appearances",
+    "goals",
+    "saved",
+    "missed",
+    "suspensions",
+    "yellow",
+    "red",
+    "saves_6m",
+    "saves_9m",
+    "saves_7m",
+)
+
+KEYS = ("player", "team", "year", "tournament")
+
+
+class StatsTable(object):
+    """
+    The result of an aggregation, one row (a namedtuple with the group keys
+    followed by ``STATS``) per group.
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = tuple(columns)
+        self.Row = namedtuple("Row", self.columns)
+        self.rows = [self.Row(*row) for row in rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def sort(self, column, reverse=True):
+        """
+        A new table sorted on ``column`` (descending by default).
+        """
+        return StatsTable(self.columns, sorted(
+            self.rows, key=lambda row: getattr(row, column), reverse=reverse))
+
+    def top(self, column, n=10):
+        """
+        The ``n`` rows with the highest value in ``column``.
+        """
+        return StatsTable(self.columns, self.sort(column).rows[:n])
+
+    def as_dicts(self):
+        return [row._asdict() for row in self.rows]
+
+
+def aggregate(matches, by=("player",)):
+    """
+    Total the player statistics in ``matches`` (a ``MatchStore`` or any
+    iterable of match dicts) for each group of the keys in ``by``. Player
+    and tournament names are grouped case insensitively.
+    """
+    return aggregate_all(matches, (tuple(by),))[tuple(by)]
+
+
+def aggregate_all(matches, groupings=(("player",), ("team",), ("year",))):
+    """
+    Like ``aggregate`` but for a number of groupings at once. Returns a dict
+    with a ``StatsTable`` for each grouping.
+    """
+    store = matches if isinstance(matches, MatchStore) \
+        else MatchStore.from_matches(matches)
+    for grouping in groupings:
+        for key in grouping:
+            if key not in KEYS:
+                raise ValueError("Can't group by {0}".format(key))
+
+    keys, labels = _key_columns(store)
+    stats = _stat_columns(store)
+    group_by = _group_by_numpy if numpy is not None else _group_by
+    return dict(
+        (tuple(grouping), StatsTable(
+            tuple(grouping) + STATS,
+            group_by([keys[key] for key in grouping],
+                     [labels[key] for key in grouping],
+                     store.columns["players"]["match"], stats)))
+        for grouping in groupings)
+
+
+def _take(values, indexes):
+    """
+    values[i] for each i in indexes.
+    """
+    if numpy is not None:
+        return numpy.asarray(values)[numpy.asarray(indexes, dtype=int)]
+    return [values[i] for i in indexes]
+
+
+def _key_columns(store):
+    """
+    An integer column per key with one value per player row, and a function
+    per key that turns those values into what's shown in the table.
+    """
+    players = store.columns["players"]
+    matches = store.columns["matches"]
+
+    # case insensitive names share the id of the first spelling seen and
+    # missing strings (-1) stay missing
+    first_spelling = {}
+    folded = [first_spelling.setdefault(store._lower(i), i)
+              for i in xrange(len(store.strings))] + [-1]
+
+    keys = {
+        "player": _take(folded, players["name"]),
+        "team": _take(store.columns["teams"]["name"], players["team"]),
+        "year": _take(matches["year"], players["match"]),
+        "tournament": _take(
+            folded, _take(matches["tournament"], players["match"])),
+    }
+    labels = {
+        "player": store._string,
+        "team": store._string,
+        "year": lambda year: year,
+        "tournament": store._string,
+    }
+    return keys, labels
+
+
+def _stat_columns(store):
+    players = store.columns["players"]
+    return [players[stat] for stat in STATS[1:]]
+
+
+def _group_by(keys, labels, matches, stats):
+    totals = defaultdict(lambda: [0] * len(stats))
+    appearances = defaultdict(set)
+    for row in xrange(len(matches)):
+        group = tuple(key[row] for key in keys)
+        appearances[group].add(matches[row])
+        total = totals[group]
+        for i, column in enumerate(stats):
+            total[i] += column[row]
+    return [
+        tuple(label(value) for label, value in zip(labels, group)) +
+        (len(appearances[group]),) + tuple(total)
+        for group, total in totals.iteritems()]
+
+
+def _group_by_numpy(keys, labels, matches, stats):
+    if not len(matches):
+        return []
+    groups, inverse = numpy.unique(
+        numpy.column_stack([numpy.asarray(key) for key in keys]),
+        axis=0, return_inverse=True)
+    # a player can be on the roster twice in a match (e.g. as a player and
+    # an official) so appearances count distinct matches
+    played = numpy.unique(
+        numpy.column_stack((inverse, numpy.asarray(matches))), axis=0)
+    totals = [numpy.bincount(played[:, 0], minlength=len(groups))]
+    totals.extend(
+        numpy.bincount(inverse, weights=numpy.asarray(column),
+                       minlength=len(groups)).astype(int)
+        for column in stats)
+    return [
+        tuple(label(int(value)) for label, value in zip(labels, group)) +
+        tuple(int(total[i]) for total in totals)
+        for i, group in enumerate(groups)]
@@ -0,0 +1,358 @@
+# coding: utf-8
+"""
+A columnar, indexed store for the matches scraped by the hsi-scraper spider.
+
+The spider output is a list of nested match dicts. Answering a question like
+"how many goals has this player scored" on that structure means walking every
+roster of every match. The store flattens the matches into three tables that
+are kept as typed columns (``array.array``):
+
+* **matches** - one row per match
+* **teams** - one row per team in a match (home first, then away)
+* **players** - one row per roster entry in a match
+
+All strings (names, tournaments, venues...) are interned in a single string
+table and the columns only hold their ids. On top of the columns we keep
+indexes on the lowercased player name, the lowercased tournament title and
+the year so the common lookups are dict probes instead of full scans.
+
+Build a store from the spider output and save it:
+
+    $ python -m handball.store output.json output.store
+
+It can then be loaded with ``MatchStore.load("output.store")`` or passed to
+``python -m handball.analyze``.
+"""
+import array
+import bisect
+import json
+import os
+import sys
+
+from collections import defaultdict
+from datetime import datetime
+
+from .utils import DATETIME_FORMAT, SIDES
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+
+# (table, column, array typecode). String columns are ids into the string
+# table where -1 means a missing value.
+SCHEMA = (
+    ("matches", "tournament", "i"),
+    ("matches", "year", "i"),
+    ("matches", "datetime", "i"),
+    ("matches", "venue", "i"),
+    ("matches", "full_time", "i"),
+    ("matches", "half_time", "i"),
+    ("matches", "url", "i"),
+    ("teams", "match", "i"),
+    ("teams", "side", "b"),
+    ("teams", "name", "i"),
+    ("players", "match", "i"),
+    ("players", "team", "i"),
+    ("players", "name", "i"),
+    ("players", "number", "i"),
+    ("players", "type", "i"),
+    ("players", "goals", "h"),
+    ("players", "saved", "h"),
+    ("players", "missed", "h"),
+    ("players", "yellow", "b"),
+    ("players", "suspensions", "h"),
+    ("players", "red", "b"),
+    ("players", "saves_6m", "h"),
+    ("players", "saves_9m", "h"),
+    ("players", "saves_7m", "h"),
+)
+
+
+def _column_file(table, column):
+    return "{0}.{1}.bin".format(table, column)
+
+
+class MatchStore(object):
+    """
+    Typed columns for matches, team rows and player rows with indexes on
+    player name, tournament and year.
+
+    Use ``MatchStore.from_matches`` to build a store from the spider output
+    and ``save``/``load`` to persist it.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self.columns = dict(
+            (table, {}) for table, _, _ in SCHEMA)
+        for table, column, typecode in SCHEMA:
+            self.columns[table][column] = array.array(typecode)
+        self._reset_indexes()
+
+    @classmethod
+    def from_matches(cls, matches):
+        """
+        Build a store from an iterable of match dicts as yielded by the
+        spider (or loaded from its JSON output).
+        """
+        store = cls()
+        for match in matches:
+            store.add_match(match)
+        return store
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a store previously written with ``save``.
+        """
+        with open(os.path.join(path, META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta["version"] != STORE_VERSION:
+            raise ValueError("Unsupported store version {0}".format(
+                meta["version"]))
+
+        store = cls()
+        store.strings = meta["strings"]
+        store._string_ids = dict(
+            (s, i) for i, s in enumerate(store.strings))
+        swap = meta["byteorder"] != sys.byteorder
+        for table, column, _ in SCHEMA:
+            values = store.columns[table][column]
+            with open(os.path.join(path, _column_file(table, column)),
+                      "rb") as f:
+                values.fromfile(f, meta["rows"][table])
+            if swap:
+                values.byteswap()
+        store._build_indexes()
+        return store
+
+    def save(self, path):
+        """
+        Write the store to the directory ``path``, one file per column and a
+        json file with the string table and row counts.
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for table, column, _ in SCHEMA:
+            with open(os.path.join(path, _column_file(table, column)),
+                      "wb") as f:
+                self.columns[table][column].tofile(f)
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "byteorder": sys.byteorder,
+                "rows": dict(
+                    (table, len(self.columns[table][column]))
+                    for table, column, _ in SCHEMA),
+                "strings": self.strings,
+            }, f)
+
+    def _intern(self, value):
+        if value is None:
+            return -1
+        if isinstance(value, datetime):
+            value = value.strftime(DATETIME_FORMAT)
+        try:
+            return self._string_ids[value]
+        except KeyError:
+            self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+            return len(self.strings) - 1
+
+    def _string(self, string_id):
+        return self.strings[string_id] if string_id >= 0 else None
+
+    def add_match(self, match):
+        """
+        Append a single match dict to the store and update the indexes.
+        """
+        matches = self.columns["matches"]
+        teams = self.columns["teams"]
+        players = self.columns["players"]
+
+        match_id = len(matches["year"])
+        matches["tournament"].append(self._intern(match.get("tournament")))
+        matches["year"].append(match.get("year") or 0)
+        matches["datetime"].append(self._intern(match.get("datetime")))
+        matches["venue"].append(self._intern(match.get("venue")))
+        matches["full_time"].append(self._intern(match.get("full-time")))
+        matches["half_time"].append(self._intern(match.get("half-time")))
+        matches["url"].append(self._intern(match.get("url")))
+        self._index_match(match_id)
+
+        for side, key in enumerate(SIDES):
+            team = match.get(key)
+            team_id = len(teams["match"])
+            teams["match"].append(match_id)
+            teams["side"].append(side)
+
+            # matches without a game page only have the team name
+            if not hasattr(team, "get"):
+                teams["name"].append(self._intern(team))
+                continue
+
+            teams["name"].append(self._intern(team.get("name")))
+            for player in team.get("roster", []):
+                attempts = player.get("attempts", {})
+                penalties = player.get("penalties", {})
+                saves = player.get("saves", {})
+
+                player_id = len(players["match"])
+                players["match"].append(match_id)
+                players["team"].append(team_id)
+                players["name"].append(self._intern(player.get("name")))
+                players["number"].append(self._intern(player.get("number")))
+                players["type"].append(self._intern(player.get("type")))
+                players["goals"].append(attempts.get("goals", 0))
+                players["saved"].append(attempts.get("saved", 0))
+                players["missed"].append(attempts.get("missed", 0))
+                players["yellow"].append(bool(penalties.get("yellow")))
+                players["suspensions"].append(
+                    penalties.get("suspensions", 0))
+                players["red"].append(bool(penalties.get("red")))
+                players["saves_6m"].append(saves.get("6m", 0))
+                players["saves_9m"].append(saves.get("9m", 0))
+                players["saves_7m"].append(saves.get("7m", 0))
+                self._index_player(player_id)
+
+    def _reset_indexes(self):
+        self.player_index = defaultdict(lambda: array.array("i"))
+        self.tournament_index = defaultdict(lambda: array.array("i"))
+        self.year_index = defaultdict(lambda: array.array("i"))
+        self._lowercase = {}
+
+    def _lower(self, string_id):
+        try:
+            return self._lowercase[string_id]
+        except KeyError:
+            value = self._string(string_id)
+            value = value.lower() if value is not None else u""
+            self._lowercase[string_id] = value
+            return value
+
+    def _index_match(self, match_id):
+        matches = self.columns["matches"]
+        self.tournament_index[
+            self._lower(matches["tournament"][match_id])].append(match_id)
+        self.year_index[matches["year"][match_id]].append(match_id)
+
+    def _index_player(self, player_id):
+        self.player_index[
+            self._lower(self.columns["players"]["name"][player_id])].append(
+                player_id)
+
+    def _build_indexes(self):
+        self._reset_indexes()
+        for match_id in xrange(len(self)):
+            self._index_match(match_id)
+        for player_id in xrange(len(self.columns["players"]["name"])):
+            self._index_player(player_id)
+
+    def __len__(self):
+        return len(self.columns["matches"]["year"])
+
+    def __iter__(self):
+        for match_id in xrange(len(self)):
+            yield self.match(match_id)
+
+    def player_rows(self, name):
+        """
+        Row ids in the players table for the player with the given name
+        (case insensitive).
+        """
+        return self.player_index.get(name.lower(), ())
+
+    def matches_with_player(self, name):
+        """
+        Sorted ids of the matches the player appeared in.
+        """
+        match_column = self.columns["players"]["match"]
+        return sorted(set(match_column[i] for i in self.player_rows(name)))
+
+    def matches_in_season(self, year):
+        return list(self.year_index.get(year, ()))
+
+    def matches_in_tournament(self, tournament_name):
+        return list(self.tournament_index.get(tournament_name.lower(), ()))
+
+    def count_goals(self, name):
+        goals = self.columns["players"]["goals"]
+        return sum(goals[i] for i in self.player_rows(name))
+
+    def count_appearances(self, name):
+        return len(self.matches_with_player(name))
+
+    def match(self, match_id):
+        """
+        Rebuild the match dict, in the same shape as the spider output, for
+        the match with the given id.
+        """
+        matches = self.columns["matches"]
+        teams = self.columns["teams"]
+        data = {
+            "tournament": self._string(matches["tournament"][match_id]),
+            "year": matches["year"][match_id],
+            "datetime": self._string(matches["datetime"][match_id]),
+            "venue": self._string(matches["venue"][match_id]),
+            "full-time": self._string(matches["full_time"][match_id]),
+            "half-time": self._string(matches["half_time"][match_id]),
+            "url": self._string(matches["url"][match_id]),
+        }
+
+        # every match has exactly two team rows, home and away
+        team_id = 2 * match_id
+        rosters = self._rosters(match_id)
+        for side, key in enumerate(SIDES):
+            name = self._string(teams["name"][team_id + side])
+            if team_id + side in rosters:
+                data[key] = {
+                    "name": name,
+                    "roster": rosters[team_id + side],
+                }
+            else:
+                data[key] = name
+        return data
+
+    def _rosters(self, match_id):
+        players = self.columns["players"]
+        rosters = {}
+        # player rows are appended in match order so we can binary search
+        # for the first row of the match
+        start = bisect.bisect_left(players["match"], match_id)
+        for i in xrange(start, len(players["match"])):
+            if players["match"][i] != match_id:
+                break
+            rosters.setdefault(players["team"][i], []).append(
+                self._player(i))
+        return rosters
+
+    def _player(self, i):
+        players = self.columns["players"]
+        player = {
+            "type": self._string(players["type"][i]),
+            "name": self._string(players["name"][i]),
+        }
+        if players["number"][i] >= 0:
+            player["number"] = self._string(players["number"][i])
+            player["penalties"] = {
+                "yellow": bool(players["yellow"][i]),
+                "suspensions": players["suspensions"][i],
+                "red": bool(players["red"][i]),
+            }
+            player["attempts"] = {
+                "goals": players["goals"][i],
+                "saved": players["saved"][i],
+                "missed": players["missed"][i],
+            }
+        if player["type"] == "goalkeeper":
+            player["saves"] = {
+                "9m": players["saves_9m"][i],
+                "6m": players["saves_6m"][i],
+                "7m": players["saves_7m"][i],
+            }
+        return player
+
+
+if __name__ == "__main__":
+    MatchStore.from_matches(json.load(open(sys.argv[1], "r"))).save(
+        sys.argv[2])
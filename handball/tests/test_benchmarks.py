@@ -0,0 +1,108 @@
+# coding: utf-8
+import unittest
+
+from datetime import datetime, timedelta
+
+from scrapy.http import Request
+
+from ..benchmarks.crawl import parse_settings, summarize
+from ..benchmarks.site import SyntheticSite
+from ..benchmarks.suite import (Season, benchmarks, compare, load_pages,
+                                make_response)
+from ..spiders.hsi import HSISpider
+from ..validation import check
+
+
+class SuiteTest(unittest.TestCase):
+
+    def test_season(self):
+        season = Season(load_pages(), tournaments=2, games=10)
+        self.assertEquals(len(season.tournaments), 2)
+        self.assertEquals(len(season.games), 10)
+        self.assertEquals(len(set(url for url, _, _ in season.games)), 10)
+        self.assertTrue(all(meta.get("tournament")
+                            for _, _, meta in season.games))
+
+        results = dict((name, (function(), count))
+                       for name, function, count, _ in benchmarks(season))
+        games, count = results["parse_game"]
+        self.assertEquals(len(games), count)
+        self.assertEquals(games[0]["url"], season.games[0][0])
+
+    def test_compare(self):
+        baseline = {"calibration": 100.0, "benchmarks": {
+            "parse": {"rate": 100.0}, "parse_game": {"rate": 300.0}}}
+        results = {"parse": {"rate": 40.0}, "parse_game": {"rate": 100.0},
+                   "new": {"rate": 1.0}}
+        # this machine is half as fast
+        self.assertEquals(compare(results, 50.0, baseline, 0.25), ["parse_game"])
+        self.assertEquals(compare(results, 100.0, baseline, 0.25),
+                          ["parse", "parse_game"])
+
+
+class SiteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.site = SyntheticSite(load_pages(), seasons=2, tournaments=80,
+                                  games=100)
+        self.spider = HSISpider()
+
+    def get(self, url, meta=None):
+        body = self.site.page(url[len("http://hsi.is"):])
+        return make_response(url, body, meta)
+
+    def test_seasons(self):
+        requests = list(self.spider.parse(self.get("http://hsi.is/motamal/")))
+        self.assertEquals(requests[0].url, "http://hsi.is/motamal/HSI2015.HTM")
+        tournaments = requests[1:]
+        self.assertEquals(len(tournaments), 80)
+        self.assertEquals(len(set(request.url for request in tournaments)), 80)
+        self.assertEquals(tournaments[0].meta["year"], 2016)
+
+        requests = list(self.spider.parse(self.get(requests[0].url)))
+        self.assertEquals(requests[0].url, "http://hsi.is/motamal/HSI2016.HTM")
+        self.assertEquals(requests[-1].meta["year"], 2015)
+        self.assertEquals(self.site.page("/motamal/HSI2014.HTM"), None)
+
+    def test_tournament_and_games(self):
+        games = list(self.spider.parse_tournament(self.get(
+            "http://hsi.is/motamal/mot_0002015079.htm")))
+        self.assertEquals(len(games), 100)
+        self.assertEquals(len(set(game.url for game in games)), 100)
+        self.assertTrue(all(isinstance(game, Request) for game in games))
+        self.assertEquals(games[0].meta["year"], 2015)
+        self.assertEquals(games[0].meta["datetime"].year, 2014)
+
+        match, = self.spider.parse_game(self.get(games[-1].url,
+                                                 games[-1].meta))
+        self.assertEquals(match["url"], games[-1].url)
+        self.assertEquals(self.site.page("/motamal/mot_0002015080.htm"), None)
+        self.assertEquals(
+            self.site.page("/motamal/0002015079_00000100.htm"), None)
+        self.assertEquals(len(self.site), 2 * (1 + 80 * 101))
+
+    def test_scores_match_rosters(self):
+        games = list(self.spider.parse_tournament(self.get(
+            "http://hsi.is/motamal/mot_0002016003.htm")))
+        for game in games[:10]:
+            match, = self.spider.parse_game(self.get(game.url, game.meta))
+            self.assertEquals(check(match), [])
+
+
+class CrawlTest(unittest.TestCase):
+
+    def test_summarize(self):
+        start = datetime(2016, 4, 1, 20)
+        results = summarize({
+            "start_time": start,
+            "finish_time": start + timedelta(seconds=10),
+            "downloader/request_count": 500,
+            "item_scraped_count": 450,
+        }, 5.0, 102400)
+        self.assertEquals(results["requests_per_second"], 50)
+        self.assertEquals(results["items_per_second"], 45)
+        self.assertEquals(results["cpu_utilization"], 0.5)
+        self.assertEquals(results["peak_rss_mb"], 100)
+        self.assertEquals(results["errors"], 0)
+        self.assertEquals(parse_settings(["CONCURRENT_REQUESTS=32"]),
+                          {"CONCURRENT_REQUESTS": "32"})
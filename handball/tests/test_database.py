@@ -0,0 +1,146 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from .. import database
+from ..analyze import count_appearances, count_goals
+from ..database import MatchDatabase, is_database
+from ..pipelines import SQLiteExportPipeline
+from ..spiders.hsi import HSISpider
+from .utils import parse_games
+
+
+class MatchDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "output.sqlite")
+        self.matches = parse_games(unplayed=True)
+        self.database = MatchDatabase.from_matches(
+            self.path, self.matches, batch_size=2)
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.directory)
+
+    def test_player_queries_match_scan(self):
+        self.assertTrue(is_database(self.path))
+        for name in (u"Sigurður Aðalsteinn Þorgeirsson",
+                     u"sigurður aðalsteinn þorgeirsson",
+                     u"Bjarki Pétursson",
+                     u"Nobody"):
+            self.assertEquals(count_goals(name, self.database),
+                              count_goals(name, self.matches))
+            self.assertEquals(count_appearances(name, self.database),
+                              count_appearances(name, self.matches))
+
+    def test_season_and_tournament(self):
+        self.assertEquals(len(self.database.matches_in_season(2016)), 2)
+        self.assertEquals(
+            len(self.database.matches_in_tournament(u"olís deild karla")), 5)
+
+    def test_normalized(self):
+        connection = self.database.connection
+        self.assertEquals(connection.execute(
+            "SELECT COUNT(*) FROM tournaments").fetchone()[0], 1)
+        home, away = connection.execute(
+            "SELECT home.name, away.name FROM matches "
+            "JOIN teams AS home ON home.id = matches.home_id "
+            "JOIN teams AS away ON away.id = matches.away_id "
+            "WHERE matches.url IS NULL").fetchone()
+        self.assertEquals((home, away), (u"ÍH", u"Þróttur"))
+        officials = connection.execute(
+            "SELECT COUNT(*) FROM officials").fetchone()[0]
+        players = connection.execute(
+            "SELECT COUNT(*) FROM player_lines").fetchone()[0]
+        self.assertTrue(officials)
+        self.assertEquals(
+            officials + players,
+            sum(len(match[side]["roster"]) for match in self.matches[:-1]
+                for side in ("home", "away")
+                if hasattr(match[side], "get")))
+
+    def test_recrawl_replaces_matches(self):
+        name = u"Sigurður Aðalsteinn Þorgeirsson"
+        goals = self.database.count_goals(name)
+        lines = self.database.connection.execute(
+            "SELECT COUNT(*) FROM roster_lines").fetchone()[0]
+        self.database.add_matches(parse_games(unplayed=True))
+        self.assertEquals(len(self.database), len(self.matches))
+        self.assertEquals(self.database.count_goals(name), goals)
+        self.assertEquals(self.database.connection.execute(
+            "SELECT COUNT(*) FROM roster_lines").fetchone()[0], lines)
+
+    def test_recrawl_without_upsert(self):
+        ids = self.database.connection.execute(
+            "SELECT key, id FROM matches").fetchall()
+        lines = self.database.connection.execute(
+            "SELECT COUNT(*) FROM roster_lines").fetchone()[0]
+        database.UPSERT_SUPPORTED = False
+        try:
+            self.database.add_matches(parse_games(unplayed=True))
+        finally:
+            database.UPSERT_SUPPORTED = True
+        self.assertEquals(self.database.connection.execute(
+            "SELECT key, id FROM matches").fetchall(), ids)
+        self.assertEquals(self.database.connection.execute(
+            "SELECT COUNT(*) FROM roster_lines").fetchone()[0], lines)
+
+
+class SQLiteExportPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "output.sqlite")
+        self.spider = HSISpider()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_disabled_without_path(self):
+        self.assertRaises(NotConfigured, SQLiteExportPipeline.from_crawler,
+                          get_crawler(HSISpider))
+
+    def test_batches(self):
+        pipeline = SQLiteExportPipeline.from_crawler(get_crawler(
+            HSISpider, {"EXPORT_SQLITE_PATH": self.path,
+                        "EXPORT_SQLITE_BATCH_SIZE": 3}))
+        pipeline.open_spider(self.spider)
+        for match in parse_games(unplayed=True):
+            pipeline.process_item(match, self.spider)
+        self.assertEquals(len(pipeline.database), 3)
+        self.assertEquals(len(pipeline.batch), 2)
+        pipeline.close_spider(self.spider)
+
+        database = MatchDatabase(self.path)
+        self.assertEquals(len(database), 5)
+        database.close()
+
+    def test_failed_items_are_left_out(self):
+        crawler = get_crawler(HSISpider, {"EXPORT_SQLITE_PATH": self.path,
+                                          "EXPORT_SQLITE_BATCH_SIZE": 3})
+        pipeline = SQLiteExportPipeline.from_crawler(crawler)
+        pipeline.open_spider(self.spider)
+        matches = parse_games(unplayed=True)
+        # a value SQLite can't store fails the transaction
+        broken = dict(matches[2], url=u"http://hsi.is/broken.htm",
+                      year=object())
+        for match in (matches[0], broken, matches[1]):
+            self.assertTrue(pipeline.process_item(match, self.spider)
+                            is match)
+        self.assertEquals(len(pipeline.database), 2)
+        self.assertEquals(pipeline.batch, [])
+        for match in matches[2:]:
+            pipeline.process_item(match, self.spider)
+        pipeline.close_spider(self.spider)
+
+        database = MatchDatabase(self.path)
+        self.assertEquals(len(database), 5)
+        database.close()
+        self.assertEquals(
+            crawler.stats.get_value("export_sqlite/failed"), 1)
@@ -0,0 +1,73 @@
+# coding: utf-8
+import shutil
+import tempfile
+import unittest
+
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+
+from ..dupefilters import CanonicalDupeFilter
+from ..spiders.hsi import HSISpider
+from ..utils import canonical_url
+from .utils import fake_response_from_file as fakeit
+
+SEASON_URL = "http://hsi.is/motamal/HSI1995.HTM"
+
+
+class CanonicalDupeFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.crawler = get_crawler(HSISpider, {"JOBDIR": self.directory})
+        self.spider = self.crawler._create_spider()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def filter(self):
+        dupefilter = CanonicalDupeFilter.from_crawler(self.crawler)
+        dupefilter.open()
+        return dupefilter
+
+    def test_canonical_url(self):
+        self.assertEquals(
+            canonical_url("http://www.hsi.is/motamal/HSI1995.HTM?b=2&a=1"
+                          "&ASPSESSIONIDQQ=X#top"),
+            "http://hsi.is/motamal/hsi1995.htm?a=1&b=2")
+        # other sites may care about case
+        self.assertEquals(canonical_url("http://example.com/A.htm"),
+                          "http://example.com/A.htm")
+
+    def test_variants_are_duplicates(self):
+        dupefilter = self.filter()
+        self.assertFalse(dupefilter.request_seen(Request(SEASON_URL)))
+        for url in ("http://www.hsi.is/motamal/hsi1995.htm",
+                    SEASON_URL + "?sid=1#top"):
+            request = Request(url)
+            self.assertTrue(dupefilter.request_seen(request))
+            dupefilter.log(request, self.spider)
+        self.assertFalse(dupefilter.request_seen(
+            Request("http://hsi.is/motamal/HSI1996.HTM")))
+
+        stats = self.crawler.stats
+        self.assertEquals(stats.get_value("dupefilter/filtered"), 2)
+        self.assertEquals(stats.get_value("dupefilter/filtered/season"), 2)
+        self.assertEquals(stats.get_value("dupefilter/canonicalized"), 4)
+
+    def test_season_links(self):
+        dupefilter = self.filter()
+        response = fakeit("responses/tournament_list.html")
+        requests = list(self.spider.parse(response)) * 2
+        seen = sum(1 for request in requests
+                   if dupefilter.request_seen(request))
+        self.assertEquals(seen, len(requests) / 2)
+
+    def test_persistent(self):
+        dupefilter = self.filter()
+        dupefilter.request_seen(Request(SEASON_URL))
+        dupefilter.close("shutdown")
+
+        dupefilter = self.filter()
+        self.assertTrue(dupefilter.request_seen(
+            Request("http://hsi.is/motamal/hsi1995.htm")))
+        dupefilter.close("finished")
@@ -0,0 +1,178 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.core.scheduler import Scheduler
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import TimeoutError
+
+from ..frontier import Frontier, FrontierMiddleware, FrontierScheduler
+from ..middlewares import PageClassPriorityMiddleware
+from ..spiders.hsi import HSISpider
+from .utils import fake_response_from_file as fakeit
+
+GAME_URL = "http://hsi.is/motamal/0800000002_0003000{0}.htm"
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_0800000002.htm"
+
+
+class FrontierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "frontier.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_order(self):
+        frontier = Frontier(self.path, window=2)
+        for data, priority in (("a", 0), ("b", 10), ("c", 0), ("d", 10)):
+            frontier.push(data, priority)
+        self.assertEquals(len(frontier), 4)
+        self.assertEquals([frontier.pop()[1] for _ in range(4)],
+                          ["d", "b", "c", "a"])
+        self.assertEquals(frontier.pop(), None)
+        self.assertEquals(len(frontier), 0)
+        frontier.close()
+
+    def test_resume_from_checkpoint(self):
+        frontier = Frontier(self.path)
+        self.assertFalse(frontier.seen(b"1"))
+        self.assertTrue(frontier.seen(b"1"))
+        frontier.push("a", 0)
+        frontier.push("b", 0)
+        request_id, _ = frontier.pop()
+        frontier.checkpoint()
+        frontier.complete(request_id)
+        frontier.push("c", 0)
+        self.assertFalse(frontier.seen(b"2"))
+        # killed before the next checkpoint
+        frontier.db.close()
+
+        frontier = Frontier(self.path)
+        self.assertEquals(frontier.resume(), 2)
+        self.assertEquals(sorted(frontier.pop()[1] for _ in range(2)),
+                          ["a", "b"])
+        self.assertTrue(frontier.seen(b"1"))
+        self.assertFalse(frontier.seen(b"2"))
+        frontier.close()
+
+
+class FrontierSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, settings=None):
+        crawler = get_crawler(HSISpider, dict(
+            {"JOBDIR": self.directory,
+             "FRONTIER_CHECKPOINT_INTERVAL": 0}, **(settings or {})))
+        spider = crawler._create_spider()
+        scheduler = FrontierScheduler.from_crawler(crawler)
+        scheduler.open(spider)
+        return scheduler, spider
+
+    def test_in_memory_without_jobdir(self):
+        crawler = get_crawler(HSISpider)
+        scheduler = FrontierScheduler.from_crawler(crawler)
+        scheduler.open(crawler._create_spider())
+        self.assertIsInstance(scheduler, Scheduler)
+        self.assertTrue(scheduler.enqueue_request(Request(TOURNAMENT_URL)))
+        self.assertFalse(scheduler.enqueue_request(Request(TOURNAMENT_URL)))
+        self.assertEquals(scheduler.next_request().url, TOURNAMENT_URL)
+        scheduler.close("finished")
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory, "frontier.sqlite")))
+
+    def test_resume(self):
+        scheduler, spider = self.open()
+        for i in range(3):
+            scheduler.enqueue_request(Request(
+                GAME_URL.format(i), callback=spider.parse_game,
+                meta={"tournament": u"Olís deild karla"}))
+        self.assertFalse(scheduler.enqueue_request(Request(GAME_URL.format(0))))
+        done = scheduler.next_request()
+        in_flight = scheduler.next_request()
+        self.assertEquals(done.url, GAME_URL.format(2))
+        scheduler.complete(done.meta["frontier_id"])
+        scheduler.close("shutdown")
+
+        scheduler, spider = self.open()
+        self.assertEquals(len(scheduler), 2)
+        requests = [scheduler.next_request() for _ in range(2)]
+        self.assertEquals(sorted(request.url for request in requests),
+                          sorted([in_flight.url, GAME_URL.format(0)]))
+        self.assertEquals(requests[0].callback, spider.parse_game)
+        self.assertEquals(requests[0].meta["tournament"], u"Olís deild karla")
+        self.assertEquals(scheduler.next_request(), None)
+        self.assertFalse(scheduler.enqueue_request(Request(GAME_URL.format(2))))
+        scheduler.close("finished")
+
+    def test_middleware_completes_requests(self):
+        scheduler, spider = self.open()
+        scheduler.enqueue_request(Request(
+            TOURNAMENT_URL, callback=spider.parse_tournament))
+        request = scheduler.next_request()
+
+        crawler = spider.crawler
+        crawler.engine = type("Engine", (), {})()
+        crawler.engine.slot = type("Slot", (), {"scheduler": scheduler})()
+        response = fakeit("responses/tournament.html", TOURNAMENT_URL)
+        response.request = request
+        middleware = FrontierMiddleware.from_crawler(crawler)
+        middleware.process_spider_input(response, spider)
+        games = list(middleware.process_spider_output(
+            response, spider.parse_tournament(response), spider))
+        for game in games:
+            scheduler.enqueue_request(game)
+
+        # the id isn't copied from the meta into the items
+        request = scheduler.next_request()
+        response = fakeit("responses/game.html", request.url)
+        response.request = request
+        middleware.process_spider_input(response, spider)
+        items = list(middleware.process_spider_output(
+            response, spider.parse_game(response), spider))
+        self.assertNotIn("frontier_id", items[0].keys())
+        scheduler.close("shutdown")
+
+        scheduler, spider = self.open()
+        self.assertEquals(len(scheduler), len(games) - 1)
+        scheduler.close("finished")
+
+    def test_retry_replaces_request(self):
+        scheduler, spider = self.open()
+        scheduler.enqueue_request(Request(GAME_URL.format(0)))
+        request = scheduler.next_request()
+        retry = RetryMiddleware.from_crawler(spider.crawler).process_exception(
+            request, TimeoutError(), spider)
+        self.assertEquals(retry.meta["frontier_id"],
+                          request.meta["frontier_id"])
+        self.assertTrue(scheduler.enqueue_request(retry))
+        scheduler.close("shutdown")
+
+        scheduler, spider = self.open()
+        self.assertEquals(len(scheduler), 1)
+        retry = scheduler.next_request()
+        self.assertEquals(retry.meta["retry_times"], 1)
+        scheduler.complete(retry.meta["frontier_id"])
+        scheduler.close("shutdown")
+
+        scheduler, spider = self.open()
+        self.assertEquals(len(scheduler), 0)
+        scheduler.close("finished")
+
+    def test_depth_first_priorities(self):
+        scheduler, spider = self.open()
+        middleware = PageClassPriorityMiddleware.from_crawler(spider.crawler)
+        requests = list(middleware.process_spider_output(None, [
+            Request(TOURNAMENT_URL), Request(GAME_URL.format(0))], spider))
+        self.assertTrue(requests[1].priority > requests[0].priority)
+        scheduler.close("finished")
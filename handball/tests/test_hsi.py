@@ -1,9 +1,15 @@
 # coding: utf-8
 import unittest
 
+from datetime import datetime
+
 from scrapy.http import Request
 
-from ..spiders.hsi import HSISpider
+from ..benchmarks.dates import fixture_dates, has_icelandic_locale
+from ..benchmarks.game import GAME_PAGES, xpath_roster_rows
+from ..items import Match
+from ..spiders.hsi import (
+    HSISpider, _parse_date, _parse_date_strptime, roster_rows)
 from .utils import fake_response_from_file as fakeit, json_fixture
 
 
@@ -20,6 +26,21 @@ class HSITest(unittest.TestCase):
         for item in results:
             self.assertIsInstance(item, Request)
 
+    def test_parse_some_years_and_tournaments(self):
+        spider = HSISpider(years="1995,2014-2015")
+        results = list(spider.parse(fakeit("responses/tournament_list.html")))
+        self.assertEquals(
+            [request.url for request in results],
+            ["http://www.example.com/HSI{0}.HTM".format(year)
+             for year in (1995, 2014, 2015)])
+
+        spider = HSISpider(years="2016",
+                           tournaments=u"olís deild ka,Coca Cola bikar")
+        results = list(spider.parse(fakeit("responses/tournament_list.html")))
+        self.assertEquals(
+            [request.meta["title"] for request in results],
+            [u"Olís deild ka", u"Coca Cola bikar", u"Coca Cola bikar"])
+
     def test_parse_tournament(self):
         results = list(
             self.spider.parse_tournament(fakeit("responses/tournament.html")))
@@ -27,12 +48,31 @@ class HSITest(unittest.TestCase):
         for item in results:
             self.assertIsInstance(item, Request)
 
+    def test_parse_date(self):
+        self.assertEquals(_parse_date(u"Fös.  1.apr.2016 19.30"),
+                          datetime(2016, 4, 1, 19, 30))
+        self.assertEquals(_parse_date(u"Mán. 28.mar.2016 16.00"),
+                          datetime(2016, 3, 28, 16, 0))
+        self.assertEquals(_parse_date(u"Fim. 26.nóv.2015 19.30"),
+                          datetime(2015, 11, 26, 19, 30))
+        self.assertEquals(_parse_date(u"Mán. 31.feb.2016 19.30"),
+                          u"Mán. 31.feb.2016 19.30")
+        self.assertEquals(_parse_date(u"Óákveðið"), u"Óákveðið")
+
+        for date in fixture_dates():
+            self.assertIsInstance(_parse_date(date), datetime)
+
+    @unittest.skipUnless(has_icelandic_locale(), "is_IS locale missing")
+    def test_parse_date_matches_strptime(self):
+        for date in fixture_dates() + [u"Mán. 31.feb.2016 19.30"]:
+            self.assertEquals(_parse_date(date), _parse_date_strptime(date))
+
     def test_parse_game(self):
         results = list(self.spider.parse_game(fakeit("responses/game.html")))
         self.assertEquals(len(results), 1)
 
         item = results[0]
-        self.assertIsInstance(item, dict)
+        self.assertIsInstance(item, Match)
 
         # assert that the player objects look right
         self.assertEquals(item["home"]["name"], u"ÍH")
@@ -43,6 +83,13 @@ class HSITest(unittest.TestCase):
         self.assertItemsEqual(item["away"]["roster"],
                               json_fixture("ih-throttur-away-roster.json"))
 
+    def test_roster_rows_match_xpath(self):
+        for page in GAME_PAGES:
+            response = fakeit("responses/" + page)
+            for team in response.xpath("//td[@class = 'haus']/a"):
+                self.assertEquals(list(roster_rows(team.root)),
+                                  list(xpath_roster_rows(team)))
+
     def test_parse_old_style(self):
         results = list(self.spider.parse_game(fakeit(
             "responses/selfoss-vikingur-1994.html",
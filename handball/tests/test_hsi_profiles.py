@@ -0,0 +1,53 @@
+# coding: utf-8
+import unittest
+
+from ..spiders.hsi_profiles import (
+    get_player_parser, parse_goalkeeper, parse_outfielder, UnknownPlayerType)
+
+GOALKEEPER = (
+    u"", u"Markverðir", u"M", u"", u"G", u"2m", u"R",
+    u"6m M/V", u"9m M/V", u"Víti M/V")
+
+
+class PlayerParserTest(unittest.TestCase):
+
+    def test_known_headers(self):
+        self.assertIs(get_player_parser(GOALKEEPER), parse_goalkeeper)
+        self.assertIs(get_player_parser((
+            u"", u"Útileikmenn", u"Skot  M/V/F", u"%", u"G", u"2m", u"R",
+            u"Skr", u"TB", u"Ruð")), parse_outfielder)
+
+    def test_normalized_header(self):
+        self.assertIs(get_player_parser(
+            (u" ", u"MARKVERÐIR ") + GOALKEEPER[2:]), parse_goalkeeper)
+
+    def test_unknown_header_parsed_by_column(self):
+        header = (u"", u"Útileikmenn", u"2m", u"Skot M/V/F", u"Stoð", u"R")
+        parser = get_player_parser(header)
+        self.assertIs(get_player_parser(header), parser)
+        self.assertEquals(parser((u"7", u"Jón Jónsson", u"2", u"5/1/2/0",
+                                  u"3", u"R")), {
+            "type": "outfielder",
+            "name": u"Jón Jónsson",
+            "number": u"7",
+            "penalties": {
+                "yellow": False,
+                "suspensions": 2,
+                "red": True,
+            },
+            "attempts": {
+                "goals": 5,
+                "saved": 1,
+                "missed": 2,
+            }
+        })
+
+    def test_unknown_header_without_stats(self):
+        parser = get_player_parser((u"", u"Dómarar", u""))
+        self.assertEquals(parser((u"", u"Jón Jónsson", u"")), {
+            "type": "unknown",
+            "name": u"Jón Jónsson",
+        })
+
+    def test_header_without_name_column(self):
+        self.assertRaises(UnknownPlayerType, get_player_parser, (u"",))
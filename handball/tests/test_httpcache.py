@@ -0,0 +1,132 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+
+from ..httpcache import ContentAddressedCacheStorage, replay, url_class
+from ..spiders.hsi import HSISpider
+from .utils import fake_response_from_file as fakeit
+
+START_URL = "http://hsi.is/motamal/"
+SEASON_URL = "http://hsi.is/motamal/HSI1995.HTM"
+GAME_URL = "http://hsi.is/motamal/0800000002_00030004.htm"
+
+
+class ContentAddressedCacheStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spider = HSISpider()
+        self.storage = self.open_storage()
+
+    def tearDown(self):
+        self.storage.close_spider(self.spider)
+        shutil.rmtree(self.directory)
+
+    def open_storage(self, **settings):
+        settings["HTTPCACHE_DIR"] = self.directory
+        storage = ContentAddressedCacheStorage(Settings(settings))
+        storage.open_spider(self.spider)
+        return storage
+
+    def store(self, request, body="<html></html>", timestamp=None):
+        response = HtmlResponse(request.url, body=body, headers={
+            "Content-Type": "text/html; charset=iso-8859-1"})
+        self.storage.store_response(self.spider, request, response)
+        if timestamp is not None:
+            self.storage.db.execute("UPDATE responses SET timestamp = ?",
+                                    (timestamp,))
+
+    def body_files(self):
+        return sum(len(files) for _, _, files in
+                   os.walk(os.path.join(self.storage.path, "bodies")))
+
+    def test_url_class(self):
+        self.assertEquals(url_class(START_URL), "season")
+        self.assertEquals(url_class(SEASON_URL), "season")
+        self.assertEquals(
+            url_class("http://hsi.is/motamal/mot_0800000002.htm"),
+            "tournament")
+        self.assertEquals(url_class(GAME_URL), "game")
+
+    def test_store_and_retrieve(self):
+        request = Request(GAME_URL)
+        self.assertIsNone(
+            self.storage.retrieve_response(self.spider, request))
+        self.store(request, body="<html>\xde\xf3r</html>")
+
+        self.storage.close_spider(self.spider)
+        self.storage = self.open_storage()
+        response = self.storage.retrieve_response(self.spider, request)
+        self.assertIsInstance(response, HtmlResponse)
+        self.assertEquals(response.url, GAME_URL)
+        self.assertEquals(response.body, "<html>\xde\xf3r</html>")
+        self.assertEquals(response.encoding, "cp1252")
+
+    def test_identical_bodies_are_stored_once(self):
+        self.store(Request(GAME_URL))
+        self.store(Request(SEASON_URL))
+        self.store(Request(START_URL), body="<html>other</html>")
+        self.assertEquals(self.body_files(), 2)
+
+    def test_shared_between_crawls(self):
+        other = self.open_storage()
+        try:
+            self.assertEquals(other.db.execute(
+                "PRAGMA journal_mode").fetchone()[0], "wal")
+            self.store(Request(GAME_URL))
+            other.store_response(self.spider, Request(SEASON_URL),
+                                 HtmlResponse(SEASON_URL, body="<html></html>"))
+            for storage in (self.storage, other):
+                for url in (GAME_URL, SEASON_URL):
+                    self.assertIsNotNone(storage.retrieve_response(
+                        self.spider, Request(url)))
+        finally:
+            other.close_spider(self.spider)
+        self.assertEquals(self.body_files(), 1)
+
+    def test_expiration(self):
+        self.spider.current_year = 2018
+        past_game = Request(GAME_URL, meta={"year": 1995})
+        game = Request(GAME_URL, meta={"year": 2018})
+        self.store(past_game, timestamp=0)
+        self.assertIsNotNone(
+            self.storage.retrieve_response(self.spider, past_game))
+        self.assertIsNone(self.storage.retrieve_response(self.spider, game))
+
+        self.store(Request(START_URL), timestamp=0)
+        self.assertIsNone(
+            self.storage.retrieve_response(self.spider, Request(START_URL)))
+
+        self.storage.close_spider(self.spider)
+        self.storage = self.open_storage(HTTPCACHE_OFFLINE=True)
+        self.assertIsNotNone(
+            self.storage.retrieve_response(self.spider, Request(START_URL)))
+
+    def test_replay(self):
+        season = fakeit("responses/tournament_list.html", START_URL)
+        self.store(Request(START_URL), season.body)
+        tournament_request = [
+            request for request in self.spider.parse(season)
+            if request.callback == self.spider.parse_tournament][0]
+        tournament = fakeit("responses/tournament.html",
+                            tournament_request.url)
+        self.store(tournament_request, tournament.body)
+        tournament.request = tournament_request
+        game_request = [
+            request for request in self.spider.parse_tournament(tournament)
+            if isinstance(request, Request)][0]
+        self.store(game_request, fakeit("responses/game.html").body)
+
+        items = list(replay(self.spider, self.storage))
+        games = [item for item in items if item.get("url") == game_request.url]
+        self.assertEquals(len(games), 1)
+        self.assertEquals(games[0]["tournament"],
+                          game_request.meta["tournament"])
+        self.assertTrue(games[0]["home"]["roster"])
+        self.assertTrue(all(item["year"] == game_request.meta["year"]
+                            for item in items))
@@ -0,0 +1,97 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..analyze import count_appearances, count_goals
+from ..identity import PlayerIndex, name_key
+from .utils import parse_games
+
+
+def game(url, home_roster, away_roster=()):
+    return {
+        "url": url,
+        "home": {"name": u"Þróttur", "roster": list(home_roster)},
+        "away": {"name": u"ÍH", "roster": list(away_roster)},
+    }
+
+
+def player(name, number, goals=0):
+    return {
+        "type": "outfielder",
+        "name": name,
+        "number": number,
+        "attempts": {"goals": goals, "saved": 0, "missed": 0},
+    }
+
+
+class PlayerIndexTest(unittest.TestCase):
+
+    def test_name_key(self):
+        self.assertEquals(name_key(u"  Þórður Örn  Ægisson "),
+                          "thordur orn aegisson")
+        self.assertEquals(name_key(u"Guðni Guðmundsson"),
+                          name_key(u"Gudni Gudmundsson"))
+
+    def test_spelling_variants(self):
+        index = PlayerIndex.from_matches([
+            game("1", [player(u"Guðni Karl Guðmundsson", "5", 3)]),
+            game("2", [player(u"Gudni Gudmundsson", "5", 2)]),
+            game("3", [player(u"Guðni Guðmundsson", "7", 1)]),
+        ])
+        self.assertEquals(len(index.players), 1)
+        self.assertEquals(count_goals(u"guðni karl guðmundsson", index), 6)
+        self.assertEquals(count_appearances(u"Gudni Gudmundsson", index), 3)
+
+    def test_missing_middle_name_on_other_team(self):
+        index = PlayerIndex.from_matches([
+            game("1", [player(u"Jón Karl Jónsson", "5")]),
+            game("2", [], [player(u"Jón Jónsson", "5")]),
+        ])
+        self.assertEquals(len(index.players), 2)
+        self.assertEquals(
+            index.resolve(u"Jon Jonsson", u"Þróttur", "5"), 0)
+        self.assertEquals(index.resolve(u"Jón Jónsson", u"ÍH"), 1)
+
+    def test_same_name_on_opposing_teams(self):
+        index = PlayerIndex.from_matches([
+            game("1", [player(u"Jón Jónsson", "5", 2)],
+                 [player(u"Jón Jónsson", "9", 1)]),
+            # moved to the other team, no one else by that name played
+            game("2", [], [player(u"Jón Jónsson", "5", 4)]),
+        ])
+        self.assertEquals(len(index.players), 2)
+        self.assertEquals([entry["teams"] for entry in index.players],
+                          [set([u"throttur"]), set([u"ih"])])
+        self.assertEquals(index.resolve(u"Jón Jónsson", u"Þróttur", "5"), 0)
+        self.assertEquals(index.resolve(u"Jón Jónsson", u"ÍH", "9"), 1)
+        self.assertEquals(index.count_goals(u"Jón Jónsson"), 7)
+
+    def test_matches_are_added_once(self):
+        index = PlayerIndex()
+        match = game("1", [player(u"Jón Jónsson", "5", 2)])
+        index.update([match])
+        index.update([match])
+        self.assertEquals(index.count_goals(u"Jón Jónsson"), 2)
+
+    def test_fixtures_save_and_update(self):
+        matches = parse_games()
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "players.json")
+        try:
+            PlayerIndex.from_matches(matches[:2]).save(path)
+            index = PlayerIndex.load(path)
+            index.update(matches)
+            index.save(path)
+            index = PlayerIndex.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        for name in (u"Guðni Guðmundsson", u"Ellert Vigfússon",
+                     u"Sigurður Aðalsteinn Þorgeirsson"):
+            self.assertEquals(count_goals(name, index),
+                              count_goals(name, matches))
+            self.assertEquals(count_appearances(name, index),
+                              count_appearances(name, matches))
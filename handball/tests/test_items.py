@@ -0,0 +1,69 @@
+# coding: utf-8
+import json
+import pickle
+import unittest
+
+from io import BytesIO
+
+from scrapy.exporters import JsonItemExporter
+
+from ..items import Match, PlayerLine, TeamSheet, serialize
+from ..spiders.hsi import HSISpider
+from .utils import fake_response_from_file as fakeit, json_fixture
+
+
+class RecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        response = fakeit("responses/game.html")
+        response.meta.update({"tournament": u"Olís deild karla",
+                              "year": 2014, "depth": 2})
+        self.match = list(HSISpider().parse_game(response))[0]
+
+    def test_json_shape(self):
+        match = serialize(self.match)
+        self.assertEquals(
+            sorted(match), ["away", "depth", "home", "meta", "tournament",
+                            "year"])
+        self.assertEquals(match["depth"], 2)
+        self.assertEquals(match["home"]["name"], u"ÍH")
+        self.assertItemsEqual(match["home"]["roster"],
+                              json_fixture("ih-throttur-home-roster.json"))
+        self.assertItemsEqual(match["away"]["roster"],
+                              json_fixture("ih-throttur-away-roster.json"))
+
+    def test_reads_like_a_dict(self):
+        player = self.match["away"]["roster"][1]
+        self.assertEquals(player["attempts"]["goals"], 10)
+        self.assertEquals(player.get("saves", {}).get("9m"), None)
+        self.assertNotIn("saves", player)
+        official = self.match["away"]["roster"][-1]
+        self.assertEquals(sorted(official), ["name", "type"])
+        self.assertEquals(official.get("number"), None)
+
+        self.assertRaises(KeyError, lambda: self.match["url"])
+        self.match["url"] = "http://hsi.is/motamal/0800000002_00030004.htm"
+        self.match.update(venue=u"Austurberg")
+        self.assertEquals(self.match["venue"], u"Austurberg")
+        self.assertEquals(dict(self.match)["url"], self.match["url"])
+
+    def test_item_exporter(self):
+        output = BytesIO()
+        exporter = JsonItemExporter(output)
+        exporter.start_exporting()
+        exporter.export_item(self.match)
+        exporter.finish_exporting()
+        self.assertEquals(json.loads(output.getvalue()),
+                          [json.loads(json.dumps(serialize(self.match)))])
+
+    def test_pickle(self):
+        copy = pickle.loads(pickle.dumps(self.match, pickle.HIGHEST_PROTOCOL))
+        self.assertIsInstance(copy, Match)
+        self.assertEquals(copy, self.match)
+
+    def test_equality(self):
+        line = PlayerLine("official", u"Gylfi Gylfason")
+        self.assertEquals(line, {"type": "official", "name": u"Gylfi Gylfason"})
+        self.assertNotEqual(line, PlayerLine("official", u"Antonio Grave"))
+        self.assertEquals(TeamSheet(name=u"ÍH", roster=[line]),
+                          {"name": u"ÍH", "roster": [line.to_dict()]})
@@ -0,0 +1,133 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import leaderboards
+from ..analyze import count_goals
+from ..leaderboards import Leaderboards, contributions
+from ..stats import aggregate
+from .utils import parse_games
+
+
+def parse_matches():
+    return parse_games(tournaments=(u"Olís deild karla", u"Coca Cola bikar"),
+                       years=(2016,))
+
+
+class LeaderboardsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.min_shots = leaderboards.MIN_SHOTS
+        leaderboards.MIN_SHOTS = 1
+        self.matches = parse_matches()
+        self.boards = Leaderboards.from_matches(self.matches)
+
+    def tearDown(self):
+        leaderboards.MIN_SHOTS = self.min_shots
+
+    def test_top_scorers(self):
+        season = self.boards.top("goals", 2016, n=100)
+        expected = aggregate(self.matches, by=("player", "team"))
+        self.assertEquals(
+            sorted((row.player, row.team, row.goals) for row in season),
+            sorted((row.player, row.team, row.goals)
+                   for row in expected if row.goals))
+        self.assertEquals([row.goals for row in season],
+                          sorted((row.goals for row in season), reverse=True))
+        for row in self.boards.top("goals", 2016, u"olís deild karla"):
+            self.assertEquals(row.goals, count_goals(
+                row.player, self.matches[0::2]))
+
+    def test_boards(self):
+        # no saves on the fixture pages
+        keeper = [player for player in self.matches[0]["home"]["roster"]
+                  if player["type"] == "goalkeeper"][0]
+        keeper.set_saves("9m", 10)
+        self.boards = Leaderboards.from_matches(self.matches)
+
+        suspended = self.boards.top("suspensions", 2016, n=100)
+        self.assertTrue(len(suspended))
+        self.assertTrue(all(row.suspensions for row in suspended))
+
+        keepers = self.boards.top("save_percentage", 2016, n=100)
+        self.assertTrue(len(keepers))
+        for row in keepers:
+            self.assertAlmostEqual(
+                row.save_percentage,
+                100.0 * row.saves / (row.saves + row.goals_against))
+        self.assertEquals(keepers.rows[0].player, keeper["name"])
+        self.assertEquals(
+            [row.save_percentage for row in keepers],
+            sorted((row.save_percentage for row in keepers), reverse=True))
+        self.assertRaises(ValueError, self.boards.top, "assists", 2016)
+
+    def test_goals_conceded_from_score(self):
+        match = self.matches[0]
+        keepers = [player for player in match["home"]["roster"]
+                   if player["type"] == "goalkeeper"]
+        for keeper in keepers:
+            keeper.set_saves("9m", 5)
+        # more than the away roster's goals
+        match["full-time"] = u"30-40"
+        conceded = 40
+        rows = [row for row in contributions(match)
+                if row[1] in set(keeper["name"] for keeper in keepers)]
+        self.assertAlmostEqual(sum(row[-1] for row in rows), conceded)
+
+        # the away team's roster is missing
+        rows = [row for row in contributions(dict(match, away=u"KR"))
+                if row[1] in set(keeper["name"] for keeper in keepers)]
+        self.assertAlmostEqual(sum(row[-1] for row in rows), conceded)
+
+    def test_incremental_update(self):
+        before = self.boards.top("goals", 2016, u"Coca Cola bikar").rows
+        self.assertEquals(self.boards.update(parse_matches()), set())
+
+        changed = parse_matches()
+        changed[0]["away"]["roster"] = changed[0]["away"]["roster"][:1]
+        self.assertEquals(self.boards.update(changed),
+                          set([(2016, u"olís deild karla")]))
+        self.assertEquals(
+            self.boards.top("goals", 2016, u"Coca Cola bikar").rows, before)
+        self.assertEquals(
+            [(row.player, row.goals)
+             for row in self.boards.top("goals", 2016, n=100)],
+            [(row.player, row.goals) for row in Leaderboards.from_matches(
+                changed).top("goals", 2016, n=100)])
+
+    def test_match_moves_partition(self):
+        changed = parse_matches()
+        changed[0]["tournament"] = u"Coca Cola bikar"
+        self.assertEquals(self.boards.update(changed), set([
+            (2016, u"olís deild karla"), (2016, u"coca cola bikar")]))
+        expected = Leaderboards.from_matches(changed)
+        for tournament in (None, u"Olís deild karla", u"Coca Cola bikar"):
+            self.assertEquals(
+                self.boards.top("goals", 2016, tournament, n=100).rows,
+                expected.top("goals", 2016, tournament, n=100).rows)
+
+        changed[0]["year"] = 2015
+        self.boards.update(changed)
+        self.assertEquals(self.boards.top("goals", 2015, n=100).rows,
+                          Leaderboards.from_matches(changed[:1]).top(
+                              "goals", 2015, n=100).rows)
+
+        # moving the only match out of a partition removes it
+        self.boards.update([dict(changed[0], year=2014)])
+        self.assertEquals(self.boards.top("goals", 2015).rows, [])
+        self.assertFalse((2015, u"coca cola bikar") in self.boards.matches)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "leaderboards.json")
+            self.boards.save(path)
+            loaded = Leaderboards.load(path)
+        finally:
+            shutil.rmtree(directory)
+        for board in ("goals", "suspensions", "save_percentage"):
+            self.assertEquals(loaded.top(board, 2016, n=100).rows,
+                              self.boards.top(board, 2016, n=100).rows)
+        self.assertEquals(loaded.update(parse_matches()), set())
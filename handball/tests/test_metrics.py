@@ -0,0 +1,92 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from ..metrics import CrawlMetricsMiddleware, Histogram, format_metric
+from ..pipelines import ValidationPipeline
+from ..spiders import hsi
+from ..spiders.hsi import HSISpider
+from .utils import fake_response_from_file as fakeit
+
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_0800000002.htm"
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_format(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        self.assertEquals(
+            format_metric("t", "histogram", "Time.",
+                          [([("callback", "parse")], histogram)]),
+            ["# HELP t Time.",
+             "# TYPE t histogram",
+             't_bucket{callback="parse",le="0.1"} 2',
+             't_bucket{callback="parse",le="1.0"} 3',
+             't_bucket{callback="parse",le="+Inf"} 4',
+             't_sum{callback="parse"} 3.65',
+             't_count{callback="parse"} 4'])
+
+
+class CrawlMetricsMiddlewareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "metrics.prom")
+        self.crawler = get_crawler(settings_dict={
+            "METRICS_ENABLED": True,
+            "METRICS_FILE": self.path,
+            "METRICS_INTERVAL": 0,
+            "METRICS_TIMED_FUNCTIONS": [hsi.__name__ + "._parse_date"],
+        })
+        self.spider = HSISpider()
+        self.middleware = CrawlMetricsMiddleware.from_crawler(self.crawler)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_disabled(self):
+        self.assertRaises(NotConfigured, CrawlMetricsMiddleware,
+                          get_crawler())
+
+    def test_metrics(self):
+        parse_date = hsi._parse_date
+        self.middleware.spider_opened(self.spider)
+        self.assertNotEqual(hsi._parse_date, parse_date)
+
+        response = fakeit("responses/tournament.html", TOURNAMENT_URL)
+        response.request = response.request.replace(
+            callback=self.spider.parse_tournament)
+        self.middleware.process_spider_input(response, self.spider)
+        results = list(self.middleware.process_spider_output(
+            response, self.spider.parse_tournament(response), self.spider))
+        hsi._find_teams("Valur Haukar", TOURNAMENT_URL)
+        # not a parse failure
+        ValidationPipeline(self.crawler.stats).process_item(
+            {"home": u"", "away": u"KR"}, self.spider)
+
+        self.middleware.spider_closed(self.spider, "finished")
+        self.assertEquals(hsi._parse_date, parse_date)
+        self.assertEquals(
+            self.crawler.stats.get_value("parse_failures/_find_teams"), 1)
+        self.assertEquals(
+            self.crawler.stats.get_value("parse_failures/process_item"), None)
+
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('handball_callback_seconds_count'
+                      '{callback="parse_tournament"} 1', lines)
+        self.assertIn('handball_function_seconds_count'
+                      '{{function="_parse_date"}} {0}'.format(len(results)),
+                      lines)
+        self.assertIn('handball_parse_failures_total'
+                      '{function="_find_teams"} 1', lines)
+        self.assertIn("handball_items_total 0", lines)
+        self.assertTrue(any(line.startswith("handball_max_rss_bytes ")
+                            for line in lines))
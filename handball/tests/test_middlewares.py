@@ -0,0 +1,123 @@
+# coding: utf-8
+import unittest
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from ..middlewares import PageClassPriorityMiddleware, \
+    PageClassThrottleMiddleware
+from ..spiders.hsi import HSISpider
+from ..utils import url_class
+from .utils import fake_response_from_file as fakeit
+
+GAME_URL = "http://hsi.is/motamal/0800000002_00030004.htm"
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_0800000002.htm"
+
+
+class FakeDownloader(object):
+
+    def __init__(self):
+        self.slots = {}
+
+
+class FakeEngine(object):
+
+    def __init__(self):
+        self.downloader = FakeDownloader()
+
+
+class PageClassPriorityMiddlewareTest(unittest.TestCase):
+
+    def test_tournaments_first(self):
+        spider = HSISpider()
+        middleware = PageClassPriorityMiddleware.from_crawler(get_crawler())
+        response = fakeit(
+            "responses/tournament_list.html", "http://hsi.is/motamal/")
+        requests = list(middleware.process_spider_output(
+            response, spider.parse(response), spider))
+
+        priorities = dict(
+            (request.callback == spider.parse_tournament, request.priority)
+            for request in requests)
+        self.assertEquals(priorities, {True: 20, False: 10})
+
+    def test_priority_is_kept(self):
+        middleware = PageClassPriorityMiddleware({"game": 5})
+        requests = list(middleware.process_start_requests([
+            Request(GAME_URL), Request(TOURNAMENT_URL, priority=-1)], None))
+        self.assertEquals([request.priority for request in requests], [5, -1])
+
+
+class PageClassThrottleMiddlewareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(settings_dict={
+            "PAGECLASS_THROTTLE_ENABLED": True,
+            "PAGECLASS_THROTTLE_MAX_CONCURRENCY": 4,
+            "PAGECLASS_THROTTLE_TARGET_LATENCY": 0.5,
+        })
+        self.crawler.engine = FakeEngine()
+        self.middleware = PageClassThrottleMiddleware.from_crawler(
+            self.crawler)
+        self.slots = self.crawler.engine.downloader.slots
+
+    def fetch(self, url, latency=0.1, status=200):
+        request = Request(url)
+        self.middleware.process_request(request, None)
+        request.meta["download_latency"] = latency
+        self.middleware.process_response(
+            request, HtmlResponse(url, status=status), None)
+        return self.middleware.classes[url_class(url)]
+
+    def test_disabled(self):
+        self.assertRaises(NotConfigured, PageClassThrottleMiddleware,
+                          get_crawler())
+
+    def test_slot_per_class(self):
+        self.fetch(GAME_URL)
+        self.fetch(TOURNAMENT_URL)
+        self.assertEquals(sorted(self.slots),
+                          ["hsi.is/game", "hsi.is/tournament"])
+
+        # the slot gets the current concurrency and delay with each request
+        self.fetch(GAME_URL, status=503)
+        game = self.fetch(GAME_URL, status=503)
+        self.middleware.process_request(Request(GAME_URL), None)
+        self.assertEquals(self.slots["hsi.is/game"].concurrency,
+                          game.concurrency)
+        self.assertEquals(self.slots["hsi.is/game"].delay, 1.0)
+
+    def test_concurrency_follows_latency_and_errors(self):
+        for _ in range(20):
+            game = self.fetch(GAME_URL)
+        self.assertEquals(game.concurrency, 4)
+
+        # two rounds with errors
+        for _ in range(4):
+            game = self.fetch(GAME_URL, status=503)
+        self.assertEquals(game.concurrency, 1)
+        self.assertEquals(game.delay, 2.0)
+        # the other classes aren't affected
+        self.assertEquals(self.fetch(TOURNAMENT_URL).concurrency, 2)
+
+        for _ in range(20):
+            game = self.fetch(GAME_URL)
+        self.assertEquals(game.concurrency, 4)
+        self.assertEquals(game.delay, 0)
+        for _ in range(20):
+            game = self.fetch(GAME_URL, latency=2.0)
+        self.assertEquals(game.concurrency, 1)
+
+        stats = self.crawler.stats
+        self.assertEquals(stats.get_value("pageclass/game/responses"), 64)
+        self.assertEquals(stats.get_value("pageclass/game/errors"), 4)
+        self.assertEquals(stats.get_value("pageclass/game/concurrency"), 1)
+
+    def test_cached_responses_are_ignored(self):
+        request = Request(GAME_URL, meta={"download_latency": 10.0})
+        self.middleware.process_request(request, None)
+        self.middleware.process_response(
+            request, HtmlResponse(GAME_URL, flags=["cached"]), None)
+        self.assertIsNone(
+            self.crawler.stats.get_value("pageclass/game/responses"))
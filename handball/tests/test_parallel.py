@@ -0,0 +1,89 @@
+# coding: utf-8
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from ..parallel import Shard, crawl, merge, split_years
+from ..spiders.hsi import HSISpider
+from .utils import fake_response_from_file as fakeit
+
+
+class FakeShard(Shard):
+    """
+    A shard that exits with the given status instead of crawling.
+    """
+
+    def __init__(self, number, directory, status):
+        super(FakeShard, self).__init__(number, [2016], directory)
+        self.status = status
+
+    def command(self):
+        return [sys.executable, "-c",
+                "import sys; sys.exit({0})".format(self.status)]
+
+
+class ParallelCrawlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, matches):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            for match in matches:
+                f.write(json.dumps(match) + "\n")
+        return path
+
+    def test_split_years(self):
+        self.assertEquals(split_years(range(1994, 2001), 3),
+                          [[1994, 1997, 2000], [1995, 1998], [1996, 1999]])
+        self.assertEquals(split_years([2015, 2016], 8), [[2015], [2016]])
+
+    def test_shard_command(self):
+        command = Shard(3, [1994, 1998], self.directory, u"Olís deild karla",
+                        ["HTTPCACHE_ENABLED=0"]).command()
+        self.assertIn("years=1994,1998", command)
+        self.assertIn(u"tournaments=Olís deild karla".encode("utf-8"),
+                      command)
+        self.assertIn(os.path.join(self.directory, "shard-03.jl"), command)
+        self.assertEquals(command[-2:], ["-s", "HTTPCACHE_ENABLED=0"])
+
+    def test_crawl_retries_failed_shards(self):
+        shards = [FakeShard(0, self.directory, 0),
+                  FakeShard(1, self.directory, 1),
+                  FakeShard(2, self.directory, 0)]
+        failed = crawl(shards, 2, poll_interval=0.01)
+        self.assertEquals([shard.number for shard in failed], [1])
+        self.assertEquals([shard.done for shard in shards],
+                          [True, False, True])
+
+        shards[1].status = 0
+        started = []
+        for shard in shards:
+            shard.start = (lambda shard: lambda: started.append(shard.number)
+                           or Shard.start(shard))(shard)
+        self.assertEquals(crawl(shards, 2, poll_interval=0.01), [])
+        self.assertEquals(started, [1])
+
+    def test_merge_deduplicates(self):
+        url = "http://hsi.is/motamal/0800000002_00030004.htm"
+        match = list(HSISpider().parse_game(fakeit("responses/game.html", url)))[0]
+        match.update(tournament=u"Olís deild karla", year=2016, url=url)
+        game = json.loads(json.dumps(match.to_dict(), default=str))
+        unplayed = {"tournament": u"Olís deild karla", "year": 2016,
+                    "home": u"ÍH", "away": u"Þróttur", "url": None}
+        paths = [self.write("shard-00.jl", [game, unplayed]),
+                 self.write("shard-01.jl", [game]),
+                 os.path.join(self.directory, "shard-02.jl")]
+        output = os.path.join(self.directory, "merged.jl")
+
+        self.assertEquals(merge(paths, output), (3, 2))
+        with open(output) as f:
+            merged = [json.loads(line) for line in f]
+        self.assertEquals(merged, [game, unplayed])
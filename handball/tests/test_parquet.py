@@ -0,0 +1,128 @@
+# coding: utf-8
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from ..identity import match_key
+from ..parquet import (LINE_COLUMNS, MATCH_COLUMNS, ParquetDataset, line_rows,
+                       match_row, partition_path, pyarrow)
+from ..pipelines import ParquetExportPipeline
+from ..spiders.hsi import HSISpider
+from .utils import parse_games
+
+
+class RowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matches = parse_games(unplayed=True)
+
+    def test_match_row(self):
+        match = self.matches[0]
+        match["datetime"] = datetime(2016, 4, 1, 19, 30)
+        row = dict(zip([name for name, _ in MATCH_COLUMNS], match_row(match)))
+        self.assertEquals(row["key"], match_key(match))
+        self.assertEquals(row["home"], match["home"]["name"])
+        self.assertEquals(row["full_time"], match.get("full-time"))
+        self.assertEquals(row["datetime"], match["datetime"])
+
+        # read back from JSON
+        loaded = json.loads(json.dumps(match.to_dict(), default=lambda value:
+                                       value.strftime("%Y-%m-%d %H:%M:%S")))
+        self.assertEquals(match_row(loaded), match_row(match))
+
+        no_game_page = match_row(self.matches[-1])
+        self.assertEquals(no_game_page[4:6], (u"ÍH", u"Þróttur"))
+        self.assertEquals(line_rows(self.matches[-1]), [])
+
+    def test_line_rows(self):
+        names = [name for name, _ in LINE_COLUMNS]
+        for match in self.matches:
+            rows = [dict(zip(names, row)) for row in line_rows(match)]
+            self.assertTrue(all(row["type"] != "official" for row in rows))
+            self.assertEquals(
+                sum(row["goals"] or 0 for row in rows),
+                sum(player.get("attempts", {}).get("goals", 0)
+                    for side in ("home", "away")
+                    if hasattr(match.get(side), "get")
+                    for player in match[side]["roster"]))
+
+    def test_partition_path(self):
+        self.assertEquals(
+            partition_path(2016, u"Olís deild karla / úrslit"),
+            os.path.join("year=2016", u"tournament=Olís deild karla %2F "
+                         u"úrslit".encode("utf-8")))
+        self.assertEquals(partition_path(2016, u"a=b"),
+                          os.path.join("year=2016", "tournament=a%3Db"))
+        self.assertEquals(partition_path(None, None), os.path.join(
+            "year=__HIVE_DEFAULT_PARTITION__",
+            "tournament=__HIVE_DEFAULT_PARTITION__"))
+
+    def test_pipeline_not_configured(self):
+        self.assertRaises(NotConfigured, ParquetExportPipeline.from_crawler,
+                          get_crawler(HSISpider))
+
+
+@unittest.skipUnless(pyarrow, "pyarrow missing")
+class ParquetDatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.matches = parse_games(unplayed=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read(self):
+        import pyarrow.parquet as pq
+
+        dataset = ParquetDataset.from_matches(self.directory, self.matches,
+                                              batch_size=2)
+        self.assertEquals(len(dataset), 0)
+        self.assertFalse([path for path in dataset.files
+                          if os.path.basename(path).startswith("_")])
+
+        matches = pq.read_table(os.path.join(self.directory, "matches"))
+        self.assertEquals(matches.num_rows, len(self.matches))
+        lines = pq.read_table(
+            os.path.join(self.directory, "player_lines",
+                         partition_path(2016, u"Olís deild karla")),
+            columns=["name", "goals"])
+        self.assertEquals(
+            lines.num_rows,
+            sum(len(line_rows(match)) for match in self.matches
+                if match["year"] == 2016))
+        self.assertTrue(str(lines.schema.field("name").type)
+                        .startswith("dictionary"))
+
+    def test_filter_by_tournament(self):
+        import pyarrow.parquet as pq
+
+        for match in self.matches[1::2]:
+            match["tournament"] = u"Coca Cola bikar"
+        ParquetDataset.from_matches(self.directory, self.matches)
+
+        # pyarrow reads the partition values as native strings, UTF-8 bytes
+        # on Python 2
+        tournament = u"Olís deild karla".encode("utf-8")
+        matches = pq.read_table(os.path.join(self.directory, "matches"))
+        self.assertEquals(
+            sorted(set(matches.column("tournament").to_pylist())),
+            ["Coca Cola bikar", tournament])
+        filtered = pq.read_table(
+            os.path.join(self.directory, "matches"),
+            filters=[("tournament", "=", tournament), ("year", "=", 2016)])
+        self.assertTrue(filtered.num_rows)
+        self.assertEquals(set(filtered.column("tournament").to_pylist()),
+                          set([tournament]))
+        self.assertEquals(
+            sorted(filtered.column("key").to_pylist()),
+            sorted(match_key(match) for match in self.matches
+                   if match["tournament"] == u"Olís deild karla" and
+                   match["year"] == 2016))
@@ -0,0 +1,126 @@
+# coding: utf-8
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from ..pipelines import JsonLinesExportPipeline
+from ..spiders.hsi import HSISpider
+
+
+def match(year, tournament, home=u"ÍH"):
+    return {
+        "tournament": tournament,
+        "year": year,
+        "datetime": datetime(2016, 4, 1, 19, 30),
+        "home": home,
+        "away": u"Þróttur",
+        "url": None,
+    }
+
+
+class JsonLinesExportPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spider = HSISpider()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_manifest(self):
+        with open(os.path.join(self.directory, "manifest.json")) as f:
+            return json.load(f)
+
+    def read_shard(self, path):
+        with gzip.open(os.path.join(self.directory, path)) as f:
+            return [json.loads(line) for line in f]
+
+    def test_disabled_without_directory(self):
+        self.assertRaises(NotConfigured, JsonLinesExportPipeline.from_crawler,
+                          get_crawler(HSISpider))
+
+    def test_partitions_and_manifest(self):
+        pipeline = JsonLinesExportPipeline.from_crawler(get_crawler(
+            HSISpider, {"EXPORT_JSONLINES_DIR": self.directory}))
+        pipeline.open_spider(self.spider)
+        pipeline.process_item(match(2016, u"Olís deild karla"), self.spider)
+        pipeline.process_item(match(2015, u"Olís deild karla"), self.spider)
+        pipeline.process_item(
+            match(2016, u"Olís deild karla", u"KR"), self.spider)
+        self.assertEquals(self.read_manifest(),
+                          {"complete": False, "shards": []})
+
+        pipeline.close_spider(self.spider)
+        manifest = self.read_manifest()
+        self.assertTrue(manifest["complete"])
+        self.assertEquals(
+            sorted((s["year"], s["items"]) for s in manifest["shards"]),
+            [(2015, 1), (2016, 2)])
+
+        shard = [s for s in manifest["shards"] if s["year"] == 2016][0]
+        self.assertEquals(
+            shard["path"],
+            os.path.join(u"year=2016", u"tournament=Olis_deild_karla",
+                         u"part-00000.jsonl.gz"))
+        items = self.read_shard(shard["path"])
+        self.assertEquals([item["home"] for item in items], [u"ÍH", u"KR"])
+        self.assertEquals(items[0]["datetime"], u"2016-04-01 19:30:00")
+
+    def test_rotation(self):
+        pipeline = JsonLinesExportPipeline(
+            self.directory, max_bytes=1, max_open_files=1)
+        pipeline.open_spider(self.spider)
+        for year in (2016, 2016, 2015, 2016):
+            pipeline.process_item(match(year, u"Bikar"), self.spider)
+
+        self.assertEquals(len(self.read_manifest()["shards"]), 4)
+        pipeline.close_spider(self.spider)
+        paths = [s["path"] for s in self.read_manifest()["shards"]]
+        self.assertEquals(len(set(paths)), 4)
+        for path in paths:
+            self.assertEquals(len(self.read_shard(path)), 1)
+
+    def test_partitions_sharing_a_directory(self):
+        pipeline = JsonLinesExportPipeline(self.directory)
+        pipeline.open_spider(self.spider)
+        # both tournament names slug to Olis_deild_karla
+        pipeline.process_item(match(2016, u"Olís deild karla"), self.spider)
+        pipeline.process_item(match(2016, u"Olis deild karla"), self.spider)
+        pipeline.process_item(match(None, None), self.spider)
+        pipeline.close_spider(self.spider)
+
+        paths = sorted(s["path"] for s in self.read_manifest()["shards"])
+        self.assertEquals(paths, [
+            os.path.join(u"year=2016", u"tournament=Olis_deild_karla",
+                         u"part-00000.jsonl.gz"),
+            os.path.join(u"year=2016", u"tournament=Olis_deild_karla",
+                         u"part-00001.jsonl.gz"),
+            os.path.join(u"year=__HIVE_DEFAULT_PARTITION__",
+                         u"tournament=__HIVE_DEFAULT_PARTITION__",
+                         u"part-00000.jsonl.gz"),
+        ])
+        for path in paths:
+            self.assertEquals(len(self.read_shard(path)), 1)
+
+    def test_skips_shards_in_progress(self):
+        directory = os.path.join(self.directory, u"year=2016",
+                                 u"tournament=Bikar")
+        os.makedirs(directory)
+        open(os.path.join(directory, "part-00000.jsonl.gz.inprogress"),
+             "w").close()
+        pipeline = JsonLinesExportPipeline(self.directory)
+        pipeline.open_spider(self.spider)
+        pipeline.process_item(match(2016, u"Bikar"), self.spider)
+        pipeline.close_spider(self.spider)
+        self.assertEquals(
+            [s["path"] for s in self.read_manifest()["shards"]],
+            [os.path.join(u"year=2016", u"tournament=Bikar",
+                          u"part-00001.jsonl.gz")])
@@ -0,0 +1,80 @@
+# coding: utf-8
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import reader
+from ..analyze import (
+    count_appearances, count_goals, match_in_season, match_in_tournament,
+    player_in_match)
+from ..items import serialize
+from ..reader import MatchFile, iter_raw_matches
+from .utils import parse_games
+
+
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.matches = parse_games(years=(2014, 2015, 2016, 2017))
+        self.matches.append({
+            "tournament": u"Bikar \"karla\" {}",
+            "year": 2018,
+            "home": u"ÍH",
+            "away": u"Þróttur",
+            "url": None,
+        })
+
+        # what the matches look like after a round trip through json
+        self.matches = json.loads(json.dumps(serialize(self.matches)))
+
+        self.array_path = os.path.join(self.directory, "output.json")
+        with open(self.array_path, "w") as f:
+            json.dump(self.matches, f, indent=4)
+
+        self.lines_path = os.path.join(self.directory, "output.jl.gz")
+        with gzip.open(self.lines_path, "wb") as f:
+            for match in self.matches:
+                f.write(json.dumps(match) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_all(self):
+        for path in (self.array_path, self.lines_path):
+            self.assertEquals(list(MatchFile(path)), self.matches)
+
+    def test_small_chunks(self):
+        chunk_size = reader.CHUNK_SIZE
+        reader.CHUNK_SIZE = 100
+        try:
+            for path in (self.array_path, self.lines_path):
+                self.assertEquals(list(MatchFile(path)), self.matches)
+        finally:
+            reader.CHUNK_SIZE = chunk_size
+
+    def test_pushdown(self):
+        data = MatchFile(self.array_path)
+        for predicate in (match_in_season(2018),
+                          match_in_tournament(u"OLÍS DEILD KARLA"),
+                          match_in_tournament(u"bikar \"karla\" {}"),
+                          player_in_match(u"bjarki pétursson")):
+            self.assertEquals(list(data.where(predicate)),
+                              filter(predicate, self.matches))
+
+        raw = list(iter_raw_matches(self.array_path))
+        self.assertEquals(
+            len(filter(match_in_season(2018).raw, raw)), 1)
+        self.assertEquals(
+            len(filter(player_in_match(u"Bjarki Pétursson").raw, raw)), 1)
+
+    def test_counts(self):
+        data = MatchFile(self.lines_path)
+        for name in (u"Bjarki Pétursson", u"Sigurður Örn Arnarson"):
+            self.assertEquals(count_goals(name, data),
+                              count_goals(name, self.matches))
+            self.assertEquals(count_appearances(name, data),
+                              count_appearances(name, self.matches))
@@ -0,0 +1,114 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from scrapy.http import Request
+from twisted.web.http_headers import Headers
+
+from ..runner import Runner
+from ..spiders.hsi import HSISpider
+from ..validation import RetryQueue
+from .utils import fake_response_from_file as fakeit
+
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_0800002285.htm"
+
+
+class FakeResponse(object):
+
+    def __init__(self, code):
+        self.code = code
+        self.headers = Headers(
+            {b"Content-Type": [b"text/html; charset=iso-8859-1"]})
+
+
+class RecordingRunner(Runner):
+    """
+    Records the requests instead of downloading them.
+    """
+
+    def _request(self, request, retries):
+        self.requests.append((request, retries))
+
+
+class RunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.items = []
+        self.runner = RecordingRunner(HSISpider(), self.items.append)
+        self.runner.requests = []
+
+    def body(self, path):
+        return fakeit(path).body
+
+    def test_schedule(self):
+        self.runner.crawl()
+        self.assertEquals([request.url for request, _ in self.runner.requests],
+                          HSISpider.start_urls)
+        self.runner.schedule(Request("http://hsi.is/motamal/HSI2015.HTM"))
+        self.runner.schedule(Request(TOURNAMENT_URL))
+        self.runner.schedule(Request(TOURNAMENT_URL.upper()))
+        self.assertEquals(len(self.runner.requests), 2)
+        self.assertEquals(self.runner.stats["skipped/season"], 1)
+        self.assertEquals(self.runner.stats["dupefilter/filtered"], 1)
+
+        runner = RecordingRunner(HSISpider(), self.items.append,
+                                 follow_seasons=True)
+        runner.requests = []
+        runner.schedule(Request("http://hsi.is/motamal/HSI2015.HTM"))
+        self.assertEquals(len(runner.requests), 1)
+
+    def test_retry_queue(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "retry.jl")
+        game_url = "http://hsi.is/motamal/0800002285_00210004.htm"
+        queue = RetryQueue(path)
+        queue.add({"url": game_url, "tournament": u"1.deild karla",
+                   "year": 2016, "home": u"ÍH", "away": u"Þróttur"},
+                  ["goals_mismatch"])
+        queue.close()
+
+        runner = RecordingRunner(HSISpider(retry=path), self.items.append)
+        runner.requests = []
+        runner.crawl()
+        self.assertEquals([request.url for request, _ in runner.requests],
+                          [game_url])
+        request = runner.requests[0][0]
+        self.assertEquals(request.callback, runner.spider.parse_game)
+        self.assertEquals(request.meta["tournament"], u"1.deild karla")
+
+    def test_parse(self):
+        start = Request(HSISpider.start_urls[0])
+        self.runner._parse((FakeResponse(200),
+                            self.body("responses/tournament_list.html")),
+                           start, 2)
+        tournaments = [request for request, _ in self.runner.requests]
+        self.assertTrue(tournaments)
+        self.assertTrue(all(request.callback == self.runner.spider
+                            .parse_tournament for request in tournaments))
+
+        tournament = [request for request in tournaments
+                      if request.url == TOURNAMENT_URL][0]
+        self.runner._parse((FakeResponse(200),
+                            self.body("responses/tournament.html")),
+                           tournament, 2)
+        game = self.runner.requests[-1][0]
+        self.assertEquals(game.meta["tournament"], u"1.deild karla")
+
+        self.runner._parse((FakeResponse(200),
+                            self.body("responses/game.html")), game, 2)
+        self.assertEquals(len(self.items), 1)
+        self.assertEquals(self.items[0]["tournament"], u"1.deild karla")
+        self.assertEquals(self.items[0]["url"], game.url)
+        self.assertEquals(self.runner.stats["item_scraped_count"], 1)
+
+    def test_retry(self):
+        request = Request(TOURNAMENT_URL)
+        self.runner._parse((FakeResponse(503), b""), request, 1)
+        self.assertEquals(self.runner.requests, [(request, 0)])
+        self.runner._parse((FakeResponse(503), b""), request, 0)
+        self.runner._parse((FakeResponse(404), b""), request, 2)
+        self.assertEquals(len(self.runner.requests), 1)
+        self.assertEquals(self.items, [])
@@ -0,0 +1,96 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..spiders.hsi import HSISpider
+from ..state import CrawlState
+from .utils import fake_response_from_file as fakeit
+
+SEASON_URL = "http://hsi.is/motamal/HSI1995.HTM"
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_0800000002.htm"
+GAME_URL = "http://hsi.is/motamal/0800000002_00030004.htm"
+
+
+class CrawlStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "state.db")
+        self.state = CrawlState(self.path)
+
+    def tearDown(self):
+        self.state.close()
+        shutil.rmtree(self.directory)
+
+    def test_past_season_completes_with_its_games(self):
+        self.state.record_page(SEASON_URL, past=True)
+        self.state.record_page(TOURNAMENT_URL, parent=SEASON_URL, past=True)
+        self.state.record_game(GAME_URL, TOURNAMENT_URL)
+        self.state.update_digest(TOURNAMENT_URL, "digest")
+        self.state.complete_tournament(TOURNAMENT_URL)
+        self.assertFalse(self.state.is_complete(TOURNAMENT_URL))
+        self.assertFalse(self.state.is_complete(SEASON_URL))
+
+        self.state.finalize_game(GAME_URL)
+        self.assertTrue(self.state.is_finalized(GAME_URL))
+        self.assertTrue(self.state.is_complete(TOURNAMENT_URL))
+        self.assertTrue(self.state.is_complete(SEASON_URL))
+
+    def test_current_season_never_completes(self):
+        self.state.record_page(TOURNAMENT_URL, past=False)
+        self.state.record_game(GAME_URL, TOURNAMENT_URL)
+        self.state.update_digest(TOURNAMENT_URL, "digest")
+        self.state.finalize_game(GAME_URL)
+        self.assertFalse(self.state.is_complete(TOURNAMENT_URL))
+
+    def test_state_is_persisted(self):
+        self.state.record_game(GAME_URL, TOURNAMENT_URL)
+        self.state.finalize_game(GAME_URL)
+        self.state.close()
+        self.state = CrawlState(self.path)
+        self.assertTrue(self.state.is_finalized(GAME_URL))
+
+    def test_state_is_committed_while_crawling(self):
+        self.state.record_page(TOURNAMENT_URL, past=True)
+        self.state.record_game(GAME_URL, TOURNAMENT_URL)
+        self.state.update_digest(TOURNAMENT_URL, "digest")
+        self.state.complete_tournament(TOURNAMENT_URL)
+        self.state.finalize_game(GAME_URL)
+        # killed without closing the state
+        other = CrawlState(self.path)
+        try:
+            self.assertEquals(other.page_digest(TOURNAMENT_URL), "digest")
+            self.assertTrue(other.is_finalized(GAME_URL))
+            self.assertTrue(other.is_complete(TOURNAMENT_URL))
+        finally:
+            other.close()
+
+
+class IncrementalSpiderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spider = HSISpider(state=os.path.join(self.directory, "state.db"))
+
+    def tearDown(self):
+        self.spider.closed("finished")
+        shutil.rmtree(self.directory)
+
+    def test_parse_skips_complete_seasons(self):
+        response = fakeit(
+            "responses/tournament_list.html", "http://hsi.is/motamal/")
+        self.assertEquals(len(list(self.spider.parse(response))), 93)
+
+        self.spider.crawl_state.db.execute(
+            "UPDATE pages SET complete = 1 WHERE url = ?", (SEASON_URL,))
+        urls = [r.url for r in self.spider.parse(response)]
+        self.assertEquals(len(urls), 92)
+        self.assertNotIn(SEASON_URL, urls)
+
+    def test_parse_game_finalizes_played_game(self):
+        response = fakeit("responses/game.html", GAME_URL)
+        response.meta.update({"url": GAME_URL, "full-time": "25-27"})
+        list(self.spider.parse_game(response))
+        self.assertTrue(self.spider.crawl_state.is_finalized(GAME_URL))
@@ -0,0 +1,57 @@
+# coding: utf-8
+import unittest
+
+from .. import stats
+from ..analyze import count_appearances, count_goals
+from ..stats import aggregate, aggregate_all
+from ..store import MatchStore
+from .utils import parse_games
+
+
+class AggregateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matches = parse_games(years=(2015, 2016))
+        self.store = MatchStore.from_matches(self.matches)
+
+    def check_players(self):
+        players = aggregate(self.store)
+        self.assertEquals(players.columns[0], "player")
+        for row in players:
+            self.assertEquals(row.goals, count_goals(row.player, self.store))
+            self.assertEquals(row.appearances,
+                              count_appearances(row.player, self.store))
+
+        self.assertEquals(
+            [(row.player, row.goals) for row in players.top("goals", 2)],
+            [(u"Guðni Guðmundsson", 18), (u"Ellert Vigfússon", 13)])
+
+    def test_players(self):
+        self.check_players()
+
+    def test_players_without_numpy(self):
+        numpy = stats.numpy
+        stats.numpy = None
+        try:
+            self.check_players()
+        finally:
+            stats.numpy = numpy
+
+    def test_groupings_in_one_pass(self):
+        tables = aggregate_all(self.matches, (("team",), ("year",),
+                                              ("player", "year")))
+        seasons = dict((row.year, row) for row in tables[("year",)])
+        self.assertEquals(sorted(seasons), [2015, 2016])
+        self.assertEquals(
+            sum(row.goals for row in tables[("team",)]),
+            sum(row.goals for row in seasons.values()))
+        self.assertEquals(
+            sum(row.saves_9m for row in tables[("player", "year")]),
+            seasons[2015].saves_9m + seasons[2016].saves_9m)
+
+        ih = [row for row in tables[("team",)] if row.team == u"ÍH"][0]
+        self.assertEquals(ih.goals, 25)
+        self.assertEquals(ih.yellow, 3)
+
+    def test_unknown_key(self):
+        self.assertRaises(ValueError, aggregate, self.store, ("venue",))
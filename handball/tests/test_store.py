@@ -0,0 +1,56 @@
+# coding: utf-8
+import shutil
+import tempfile
+import unittest
+
+from ..analyze import count_appearances, count_goals
+from ..store import MatchStore
+from .utils import parse_games
+
+
+class MatchStoreTest(unittest.TestCase):
+    maxDiff = None
+
+    def setUp(self):
+        self.matches = parse_games(unplayed=True)
+        self.store = MatchStore.from_matches(self.matches)
+
+    def test_player_queries_match_scan(self):
+        for name in (u"Sigurður Aðalsteinn Þorgeirsson",
+                     u"sigurður aðalsteinn þorgeirsson",
+                     u"Bjarki Pétursson",
+                     u"Nobody"):
+            self.assertEquals(count_goals(name, self.store),
+                              count_goals(name, self.matches))
+            self.assertEquals(count_appearances(name, self.store),
+                              count_appearances(name, self.matches))
+
+    def test_season_and_tournament_index(self):
+        self.assertEquals(self.store.matches_in_season(2016), [0, 4])
+        self.assertEquals(self.store.matches_in_season(1900), [])
+        self.assertEquals(
+            self.store.matches_in_tournament(u"OLÍS DEILD KARLA"),
+            range(len(self.matches)))
+
+    def test_rebuilt_match(self):
+        match = self.store.match(0)
+        self.assertEquals(match["home"]["name"], u"ÍH")
+        self.assertItemsEqual(match["home"]["roster"],
+                              self.matches[0]["home"]["roster"])
+        self.assertItemsEqual(match["away"]["roster"],
+                              self.matches[0]["away"]["roster"])
+        self.assertEquals(self.store.match(4)["home"], u"ÍH")
+
+    def test_save_and_load(self):
+        path = tempfile.mkdtemp()
+        try:
+            self.store.save(path)
+            loaded = MatchStore.load(path)
+        finally:
+            shutil.rmtree(path)
+
+        self.assertEquals(len(loaded), len(self.store))
+        self.assertEquals(list(loaded), list(self.store))
+        self.assertEquals(
+            loaded.count_goals(u"Bjarki Pétursson"),
+            self.store.count_goals(u"Bjarki Pétursson"))
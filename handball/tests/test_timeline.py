@@ -0,0 +1,89 @@
+# coding: utf-8
+import json
+import unittest
+
+from datetime import datetime
+
+from ..spiders.hsi import HSISpider, tournament_games
+from ..timeline import Timeline, parse_score
+from .utils import fake_response_from_file as fakeit
+
+
+def season_matches():
+    _, matches = tournament_games(fakeit("responses/tournament.html"))
+    for match in matches:
+        match.update(tournament=u"1.deild karla", year=2016)
+    return matches
+
+
+class TimelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matches = season_matches()
+        self.timeline = Timeline(reversed(self.matches))
+
+    def test_sorted_and_parsed(self):
+        self.assertEquals(len(self.timeline), 84)
+        datetimes = [result.datetime for result in self.timeline]
+        self.assertEquals(datetimes, sorted(datetimes))
+        first = self.timeline.results[0]
+        self.assertEquals((first.home_goals, first.away_goals,
+                           first.home_half_time, first.away_half_time),
+                          parse_score(u"24-22") + parse_score(u"(15-9)"))
+
+    def test_json_datetimes(self):
+        matches = json.loads(json.dumps(self.matches, default=lambda value:
+                                        value.strftime("%Y-%m-%d %H:%M:%S")))
+        self.assertEquals(Timeline(matches).results, self.timeline.results)
+
+    def test_head_to_head(self):
+        record = self.timeline.head_to_head(u"stjarnan", u"HK")
+        self.assertEquals(record[:6], (3, 3, 0, 0, 102, 79))
+        reverse = self.timeline.head_to_head(u"HK", u"Stjarnan")
+        self.assertEquals(reverse[:6], (3, 0, 0, 3, 79, 102))
+        before = self.timeline.head_to_head(
+            u"Stjarnan", u"HK", before=record.results[1].datetime)
+        self.assertEquals(before.results, record.results[:1])
+
+    def test_form(self):
+        self.assertEquals(self.timeline.form(u"ÍH", 3), ["L", "L", "W"])
+        self.assertEquals(
+            self.timeline.form(u"ÍH", 1, before=datetime(2015, 9, 19)),
+            ["L"])
+        self.assertEquals(self.timeline.form(u"Nobody"), [])
+
+    def test_running_table(self):
+        days = list(self.timeline.running_table(u"1.deild karla", 2016))
+        self.assertEquals(days[0][0], datetime(2015, 9, 18).date())
+        self.assertEquals(sum(row.played for row in days[0][1]), 8)
+
+        table = self.timeline.table(u"1.deild karla", 2016)
+        self.assertEquals(days[-1][1].rows, table.rows)
+        self.assertEquals([row.team for row in table][:2],
+                          [u"Stjarnan", u"Fjölnir"])
+        self.assertEquals(table.rows[0].points, 36)
+        self.assertEquals(sum(row.played for row in table), 2 * 84)
+        self.assertEquals(len(self.timeline.table(u"1.deild karla", 2015)), 0)
+
+
+class StreakTest(unittest.TestCase):
+
+    def test_scoring_streak(self):
+        spider = HSISpider()
+        matches = []
+        for day in (1, 2, 3, 4, 5):
+            for match in spider.parse_game(fakeit("responses/game.html")):
+                match.update(datetime=datetime(2016, 4, day, 19, 30),
+                             **{"full-time": u"25-24"})
+                matches.append(match)
+        name = matches[0]["away"]["roster"][1]["name"]
+        matches[0]["away"]["roster"][1].goals = 0
+        # not on the roster, doesn't break the streak
+        matches[2]["away"]["roster"] = []
+
+        timeline = Timeline(matches)
+        streak = timeline.scoring_streak(name)
+        self.assertEquals(streak.length, 3)
+        self.assertEquals(streak.start.datetime, datetime(2016, 4, 2, 19, 30))
+        self.assertEquals(timeline.current_streak(name).length, 3)
+        self.assertEquals(timeline.scoring_streak(name, 50).length, 0)
@@ -0,0 +1,124 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from scrapy.utils.test import get_crawler
+
+from ..pipelines import ValidationPipeline
+from ..spiders.hsi import HSISpider
+from ..validation import RetryQueue, check
+from .utils import fake_response_from_file as fakeit
+
+GAME_URL = "http://hsi.is/motamal/0800002285_00210004.htm"
+
+
+def parse_game(path="responses/game.html", **fields):
+    meta = {
+        "tournament": u"1.deild karla",
+        "year": 2016,
+        "datetime": datetime(2016, 4, 1, 20, 15),
+        "venue": u"Kaplakriki",
+        "home": u"ÍH",
+        "away": u"Þróttur",
+        "full-time": u"25-27",
+        "half-time": u"(10-11)",
+        "url": GAME_URL,
+    }
+    meta.update(fields)
+    response = fakeit(path, GAME_URL)
+    response.meta.update(meta)
+    return HSISpider().parse_game(response)[0]
+
+
+class CheckTest(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEquals(check(parse_game()), [])
+        # unplayed games and matches without a game page
+        self.assertEquals(check(parse_game(**{"full-time": u""})), [])
+        self.assertEquals(check({"home": u"ÍH", "away": u"KR",
+                                 "full-time": u"25-24"}), [])
+
+    def test_problems(self):
+        self.assertEquals(check(parse_game(**{"full-time": u"24-27"})),
+                          ["goals_mismatch"])
+        self.assertEquals(check(parse_game(datetime=u"Fös. 1.apx.2016 20.15")),
+                          ["unparsed_date"])
+        self.assertEquals(check({"home": u"", "away": u"KR"}),
+                          ["missing_team"])
+        self.assertEquals(
+            check(parse_game("responses/selfoss-stjarnan-1994-missing-team"
+                             ".html")),
+            ["missing_roster"])
+        # not played yet, there are no rosters
+        self.assertEquals(
+            check(parse_game("responses/selfoss-stjarnan-1994-missing-team"
+                             ".html", **{"full-time": u""})), [])
+
+
+class ValidationPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "retry.jl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_retry_queue(self):
+        crawler = get_crawler(HSISpider,
+                              {"VALIDATION_RETRY_FILE": self.path})
+        spider = crawler._create_spider()
+        pipeline = ValidationPipeline.from_crawler(crawler)
+        pipeline.open_spider(spider)
+        items = [
+            parse_game(),
+            parse_game(**{"full-time": u"24-27"}),
+            parse_game(**{"full-time": u"24-27"}),
+            parse_game(datetime=u"Fös. 1.apx.2016 20.15",
+                       url=GAME_URL.replace("4.htm", "5.htm")),
+            {"home": u"", "away": u"KR"},
+        ]
+        for item in items:
+            self.assertTrue(pipeline.process_item(item, spider) is item)
+        self.assertFalse(os.path.exists(self.path))
+        pipeline.close_spider(spider)
+
+        stats = crawler.stats.get_stats()
+        self.assertEquals(stats["validation/failed"], 4)
+        self.assertEquals(stats["validation/goals_mismatch"], 2)
+        self.assertEquals(stats["validation/queued"], 2)
+        queued = list(RetryQueue.read(self.path))
+        self.assertEquals([url for url, _ in queued],
+                          [GAME_URL, GAME_URL.replace("4.htm", "5.htm")])
+
+        spider = HSISpider(retry=self.path)
+        requests = list(spider.start_requests())
+        self.assertEquals([request.url for request in requests],
+                          [url for url, _ in queued])
+        self.assertEquals(requests[0].callback, spider.parse_game)
+        self.assertEquals(requests[0].meta["datetime"],
+                          datetime(2016, 4, 1, 20, 15))
+        self.assertEquals(requests[1].meta["datetime"],
+                          u"Fös. 1.apx.2016 20.15")
+
+        response = fakeit("responses/game.html", requests[0].url)
+        response.meta.update(requests[0].meta)
+        match = spider.parse_game(response)[0]
+        self.assertEquals(match["full-time"], u"24-27")
+        self.assertEquals(match["home"]["name"], items[1]["home"]["name"])
+
+    def test_without_retry_file(self):
+        crawler = get_crawler(HSISpider)
+        spider = crawler._create_spider()
+        pipeline = ValidationPipeline.from_crawler(crawler)
+        pipeline.open_spider(spider)
+        pipeline.process_item({"home": u"", "away": u"KR"}, spider)
+        pipeline.close_spider(spider)
+        self.assertEquals(crawler.stats.get_value("validation/missing_team"),
+                          1)
+        self.assertEquals(crawler.stats.get_value("validation/queued"), None)
@@ -0,0 +1,91 @@
+# coding: utf-8
+import os
+
+from scrapy.http import Request
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from ..spiders.hsi import HSISpider
+from ..workers import ParseWorkerError, ParseWorkerPool
+from .utils import fake_response_from_file as fakeit
+
+TOURNAMENT_URL = "http://hsi.is/motamal/mot_0800000002.htm"
+
+
+def broken_parser(response):
+    raise ValueError(response.url)
+
+
+def unpicklable_parser(response):
+    return lambda: response
+
+
+def crashing_parser(response):
+    os._exit(1)
+
+
+class ParseWorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inline = HSISpider()
+        self.spider = HSISpider(parse_workers="2")
+
+    def tearDown(self):
+        self.spider.closed("finished")
+
+    @defer.inlineCallbacks
+    def test_parse_tournament(self):
+        expected = list(self.inline.parse_tournament(
+            fakeit("responses/tournament.html", TOURNAMENT_URL)))
+        results = yield self.spider.parse_tournament(
+            fakeit("responses/tournament.html", TOURNAMENT_URL))
+
+        self.assertEquals(len(results), len(expected))
+        for result, request in zip(results, expected):
+            if isinstance(request, Request):
+                self.assertEquals(result.url, request.url)
+                self.assertEquals(result.meta, request.meta)
+                self.assertEquals(result.callback, self.spider.parse_game)
+            else:
+                self.assertEquals(result, request)
+
+    @defer.inlineCallbacks
+    def test_parse_game_keeps_meta(self):
+        request = [
+            result for result in self.inline.parse_tournament(
+                fakeit("responses/tournament.html", TOURNAMENT_URL))
+            if isinstance(result, Request)][0]
+
+        def game_response():
+            response = fakeit("responses/game.html", request.url)
+            response.request = request
+            return response
+
+        expected = list(self.inline.parse_game(game_response()))
+        results = yield self.spider.parse_game(game_response())
+        self.assertEquals(results, expected)
+        self.assertEquals(results[0]["tournament"],
+                          request.meta["tournament"])
+        self.assertEquals(results[0]["datetime"], request.meta["datetime"])
+
+    def test_worker_errors(self):
+        d = self.spider.workers.submit(
+            broken_parser, fakeit("responses/game.html"))
+        return self.assertFailure(d, ParseWorkerError)
+
+    def test_pickling_errors(self):
+        response = fakeit("responses/game.html")
+        response.meta["callback"] = lambda: None
+        d = self.spider.workers.submit(broken_parser, response)
+        self.assertFailure(d, ParseWorkerError)
+
+        result = self.spider.workers.submit(
+            unpicklable_parser, fakeit("responses/game.html"))
+        return defer.DeferredList([
+            d, self.assertFailure(result, ParseWorkerError)])
+
+    def test_worker_crash(self):
+        workers = ParseWorkerPool(1, timeout=1)
+        self.addCleanup(workers.close)
+        d = workers.submit(crashing_parser, fakeit("responses/game.html"))
+        return self.assertFailure(d, ParseWorkerError)
@@ -4,6 +4,19 @@ import os
 
 from scrapy.http import HtmlResponse, Request
 
+from ..spiders.hsi import HSISpider
+
+# game pages with rosters that are complete, missing a column or a team
+GAMES = (
+    "responses/game.html",
+    "responses/kr-throttur-missing-column.html",
+    "responses/selfoss-vikingur-1994.html",
+    "responses/selfoss-stjarnan-1994-missing-team.html",
+)
+
+# the contents of the response files, which are read once
+_file_contents = {}
+
 
 def fake_response_from_file(file_name, url=None):
     """
@@ -25,7 +38,10 @@ def fake_response_from_file(file_name, url=None):
     else:
         file_path = file_name
 
-    file_content = open(file_path, 'r').read()
+    if file_path not in _file_contents:
+        with open(file_path, 'r') as f:
+            _file_contents[file_path] = f.read()
+    file_content = _file_contents[file_path]
 
     response = HtmlResponse(
         url=url,
@@ -44,3 +60,30 @@ def json_fixture(filename):
         os.path.dirname(os.path.realpath(__file__)),
         "fixtures")
     return json.load(open(os.path.join(fixture_path, filename), "r"))
+
+
+def parse_games(tournaments=(u"Olís deild karla",),
+                years=(2016, 2017, 2018, 2019), unplayed=False):
+    """
+    The matches parsed from the game pages in GAMES, each with its own url.
+    The tournament and year of the i-th game are taken from ``tournaments``
+    and ``years`` in turn. With ``unplayed`` a match without a game page is
+    added at the end.
+    """
+    spider = HSISpider()
+    matches = []
+    for i, game in enumerate(GAMES):
+        url = "http://hsi.is/motamal/0800000002_0003000{0}.htm".format(i)
+        for match in spider.parse_game(fake_response_from_file(game, url)):
+            match.update(tournament=tournaments[i % len(tournaments)],
+                         year=years[i % len(years)], url=url)
+            matches.append(match)
+    if unplayed:
+        matches.append({
+            "tournament": tournaments[0],
+            "year": years[0],
+            "home": u"ÍH",
+            "away": u"Þróttur",
+            "url": None,
+        })
+    return matches
@@ -0,0 +1,266 @@
+# coding: utf-8
+"""
+Questions about results over time: head-to-head records, team form,
+running league tables and player scoring streaks.
+
+A ``Timeline`` is built from the matches once (in a single pass, from any
+iterable of match dicts, a ``MatchFile`` or a ``MatchStore``). It keeps the
+played matches sorted by datetime as ``Result`` tuples with the scores
+parsed into integers, and indexes them by team and by player, so the
+queries don't parse score strings or sort again:
+
+    timeline = Timeline(data)
+    timeline.head_to_head(u"Haukar", u"FH")
+    timeline.form(u"Haukar", 5)
+    for day, table in timeline.running_table(u"Olís deild karla", 2016):
+        ...
+    timeline.scoring_streak(u"Halldór Rúnarsson")
+
+Matches without a final score (not played yet) aren't part of the timeline.
+"""
+import bisect
+import re
+
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from .stats import StatsTable
+from .utils import SIDES, parse_datetime, team_name
+
+SCORE_RE = re.compile(r"(\d+)\s*-\s*(\d+)")
+
+# points for a win and a draw
+WIN_POINTS = 2
+DRAW_POINTS = 1
+
+Result = namedtuple("Result", (
+    "datetime", "year", "tournament", "home", "away", "home_goals",
+    "away_goals", "home_half_time", "away_half_time", "url"))
+
+HeadToHead = namedtuple("HeadToHead", (
+    "played", "won", "drawn", "lost", "goals_for", "goals_against",
+    "results"))
+
+Streak = namedtuple("Streak", ("length", "start", "end"))
+
+TABLE_COLUMNS = ("team", "played", "won", "drawn", "lost", "goals_for",
+                 "goals_against", "goal_difference", "points")
+
+
+def parse_score(text):
+    """
+    The two numbers of a score like "24-22" or "(15-9)", or None.
+
+    >>> parse_score(u"(15 - 9)")
+    (15, 9)
+    """
+    found = SCORE_RE.search(text or "")
+    return (int(found.group(1)), int(found.group(2))) if found else None
+
+
+def _outcome(goals_for, goals_against):
+    if goals_for > goals_against:
+        return "W"
+    if goals_for < goals_against:
+        return "L"
+    return "D"
+
+
+class Timeline(object):
+    """
+    The played matches in datetime order with indexes on team and player
+    (both case insensitive).
+    """
+
+    def __init__(self, matches):
+        played = []
+        for match in matches:
+            full_time = parse_score(match.get("full-time"))
+            if full_time is None:
+                continue
+            half_time = parse_score(match.get("half-time")) or (None, None)
+            result = Result(
+                parse_datetime(match.get("datetime")) or datetime.min,
+                match.get("year"), match.get("tournament"),
+                team_name(match.get("home")), team_name(match.get("away")),
+                full_time[0], full_time[1], half_time[0], half_time[1],
+                match.get("url"))
+            played.append((result, self._player_goals(match)))
+        # matches at the same time in game page (i.e. game number) order
+        played.sort(key=lambda entry: (
+            entry[0].datetime, entry[0].url or u"", entry[0].home or u""))
+
+        self.results = [result for result, _ in played]
+        self.datetimes = [result.datetime for result in self.results]
+        self.team_index = defaultdict(list)
+        # (result index, goals) for each player
+        self.player_index = defaultdict(list)
+        for i, (result, goals) in enumerate(played):
+            for team in (result.home, result.away):
+                if team:
+                    self.team_index[team.lower()].append(i)
+            for name, count in goals.iteritems():
+                self.player_index[name].append((i, count))
+
+    @staticmethod
+    def _player_goals(match):
+        """
+        Goals per (lowercased) player name on the rosters of the match.
+        """
+        goals = {}
+        for side in SIDES:
+            team = match.get(side)
+            if not hasattr(team, "get"):
+                continue
+            for player in team.get("roster", []):
+                if player.get("type") == "official" or not player.get("name"):
+                    continue
+                name = player["name"].lower()
+                goals[name] = goals.get(name, 0) + \
+                    player.get("attempts", {}).get("goals", 0)
+        return goals
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def between(self, start=None, end=None):
+        """
+        The results from ``start`` up to (not including) ``end``.
+        """
+        first = bisect.bisect_left(self.datetimes, start) if start else 0
+        last = bisect.bisect_left(self.datetimes, end) if end \
+            else len(self.results)
+        return self.results[first:last]
+
+    def team_results(self, team, before=None):
+        """
+        The results of the team, in datetime order, before the datetime
+        ``before`` if given.
+        """
+        indexes = self.team_index.get(team.lower(), [])
+        if before is not None:
+            indexes = indexes[:bisect.bisect_left(
+                indexes, bisect.bisect_left(self.datetimes, before))]
+        return [self.results[i] for i in indexes]
+
+    def head_to_head(self, team, opponent, before=None):
+        """
+        The record of ``team`` in its matches against ``opponent``.
+        """
+        opponent = opponent.lower()
+        results = [
+            result for result in self.team_results(team, before)
+            if opponent in ((result.home or u"").lower(),
+                            (result.away or u"").lower())]
+        outcomes = defaultdict(int)
+        goals_for = goals_against = 0
+        for result in results:
+            scored, conceded = self._goals(result, team)
+            goals_for += scored
+            goals_against += conceded
+            outcomes[_outcome(scored, conceded)] += 1
+        return HeadToHead(len(results), outcomes["W"], outcomes["D"],
+                          outcomes["L"], goals_for, goals_against, results)
+
+    def form(self, team, n=5, before=None):
+        """
+        The outcomes ("W", "D" or "L") of the team's last ``n`` matches
+        (before the datetime ``before`` if given), oldest first.
+        """
+        return [_outcome(*self._goals(result, team))
+                for result in self.team_results(team, before)[-n:]]
+
+    def table(self, tournament, year, until=None):
+        """
+        The league table of a tournament, from the matches played before
+        ``until`` if given, as a ``StatsTable`` sorted by points, goal
+        difference and goals scored.
+        """
+        totals = {}
+        for _, totals in self._running_totals(tournament, year, until):
+            pass
+        return self._standings(totals)
+
+    def running_table(self, tournament, year, until=None):
+        """
+        Yield (date, league table) after each day of matches in the
+        tournament, in a single pass over its results.
+        """
+        for day, totals in self._running_totals(tournament, year, until):
+            yield day, self._standings(totals)
+
+    def _running_totals(self, tournament, year, until):
+        tournament = tournament.lower()
+        totals = defaultdict(lambda: [0] * (len(TABLE_COLUMNS) - 1))
+        day = None
+        for result in self.between(end=until):
+            if result.year != year or \
+                    (result.tournament or u"").lower() != tournament:
+                continue
+            if day is not None and result.datetime.date() != day:
+                yield day, totals
+            day = result.datetime.date()
+            for team, scored, conceded in (
+                    (result.home, result.home_goals, result.away_goals),
+                    (result.away, result.away_goals, result.home_goals)):
+                row = totals[team]
+                outcome = _outcome(scored, conceded)
+                row[0] += 1
+                row[1] += outcome == "W"
+                row[2] += outcome == "D"
+                row[3] += outcome == "L"
+                row[4] += scored
+                row[5] += conceded
+                row[6] += scored - conceded
+                row[7] += WIN_POINTS if outcome == "W" else \
+                    DRAW_POINTS if outcome == "D" else 0
+        if day is not None:
+            yield day, totals
+
+    @staticmethod
+    def _standings(totals):
+        rows = sorted(
+            ((team,) + tuple(row) for team, row in totals.iteritems()),
+            key=lambda row: (-row[8], -row[7], -row[5], row[0]))
+        return StatsTable(TABLE_COLUMNS, rows)
+
+    def scoring_streak(self, name, min_goals=1):
+        """
+        The player's longest run of consecutive matches (of the matches the
+        player was on the roster for) with at least ``min_goals`` goals, as
+        a ``Streak`` with the first and last result of the run (length 0 if
+        there's none).
+        """
+        return self._streaks(name, min_goals)[0]
+
+    def current_streak(self, name, min_goals=1):
+        """
+        The player's run of matches with at least ``min_goals`` goals up to
+        the last match the player played.
+        """
+        return self._streaks(name, min_goals)[1]
+
+    def _streaks(self, name, min_goals):
+        longest = current = Streak(0, None, None)
+        for i, goals in self.player_index.get(name.lower(), []):
+            if goals < min_goals:
+                current = Streak(0, None, None)
+                continue
+            result = self.results[i]
+            current = Streak(current.length + 1, current.start or result,
+                             result)
+            if current.length > longest.length:
+                longest = current
+        return longest, current
+
+    @staticmethod
+    def _goals(result, team):
+        """
+        (scored, conceded) by the team in the result.
+        """
+        if (result.home or u"").lower() == team.lower():
+            return result.home_goals, result.away_goals
+        return result.away_goals, result.home_goals
@@ -1,4 +1,128 @@
 # coding: utf-8
+import re
+import unicodedata
+
+from datetime import datetime
+from urllib import urlencode
+from urlparse import parse_qsl, urlsplit, urlunsplit
+
+from w3lib.url import canonicalize_url
+
+# Icelandic letters that don't decompose into a base letter and an accent
+FOLDED_LETTERS = {
+    ord(u"ð"): u"d",
+    ord(u"Ð"): u"D",
+    ord(u"þ"): u"th",
+    ord(u"Þ"): u"Th",
+    ord(u"æ"): u"ae",
+    ord(u"Æ"): u"Ae",
+}
+
+GAME_URL_RE = re.compile(r"/\d+_\d+\.htm$", re.IGNORECASE)
+TOURNAMENT_URL_RE = re.compile(r"/mot_\d+\.htm$", re.IGNORECASE)
+SEASON_URL_RE = re.compile(r"/HSI(\d{4})\.HTM$", re.IGNORECASE)
+
+# query parameters (compared lowercased) that only identify a session
+SESSION_PARAMS = frozenset(
+    ("sid", "sessionid", "session_id", "phpsessid", "jsessionid"))
+SESSION_PARAM_RE = re.compile(r"^aspsessionid", re.IGNORECASE)
+
+# the teams of a match, in the order they're listed
+SIDES = ("home", "away")
+
+# how match datetimes are written as text (JSON exports, the store and the
+# database)
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def url_class(url):
+    """
+    What kind of hsi.is page is at ``url``: "season", "tournament", "game"
+    or "other".
+
+    >>> url_class("http://hsi.is/motamal/mot_0800000002.htm")
+    'tournament'
+    """
+    if GAME_URL_RE.search(url):
+        return "game"
+    if TOURNAMENT_URL_RE.search(url):
+        return "tournament"
+    if SEASON_URL_RE.search(url) or url.rstrip("/").endswith("/motamal"):
+        return "season"
+    return "other"
+
+
+def canonical_url(url):
+    """
+    The url in a canonical form, so urls for the same page compare equal:
+    the query arguments are sorted, session parameters and the fragment are
+    dropped and, for hsi.is, the host loses its "www." and the path is
+    lowercased (the server doesn't care about case).
+
+    >>> canonical_url("http://WWW.hsi.is/motamal/HSI1995.HTM?b=2&a=1#top")
+    'http://hsi.is/motamal/hsi1995.htm?a=1&b=2'
+    >>> canonical_url("http://hsi.is/motamal/mot_0800000002.htm?sid=42")
+    'http://hsi.is/motamal/mot_0800000002.htm'
+    """
+    scheme, netloc, path, query, _ = urlsplit(canonicalize_url(url))
+    netloc = netloc.lower()
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(query, True)
+        if key.lower() not in SESSION_PARAMS and
+        not SESSION_PARAM_RE.match(key)])
+    if netloc == "www.hsi.is":
+        netloc = "hsi.is"
+    if netloc == "hsi.is":
+        path = path.lower()
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def parse_years(text):
+    """
+    The years in a comma separated list of years and ranges of years.
+
+    >>> sorted(parse_years("1994-1996,2001"))
+    [1994, 1995, 1996, 2001]
+    """
+    years = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        years.update(range(int(first), int(last or first) + 1))
+    return years
+
+
+def team_name(team):
+    """
+    The name of a team in a match. Matches without a game page only have
+    the team name instead of the team with its roster.
+
+    >>> team_name({"name": u"Haukar", "roster": []})
+    u'Haukar'
+    >>> team_name(u"Haukar")
+    u'Haukar'
+    """
+    return team.get("name") if hasattr(team, "get") else team
+
+
+def parse_datetime(value):
+    """
+    A match datetime, which matches read back from JSON have as text, or
+    None if the text isn't in DATETIME_FORMAT.
+
+    >>> parse_datetime(u"2016-04-01 19:30:00")
+    datetime.datetime(2016, 4, 1, 19, 30)
+    >>> parse_datetime(u"Fös. 1.apr.2016") is None
+    True
+    """
+    if isinstance(value, datetime) or value is None:
+        return value
+    try:
+        return datetime.strptime(value, DATETIME_FORMAT)
+    except ValueError:
+        return None
 
 
 def just(n, seq, default=None):
@@ -34,6 +158,20 @@ def just(n, seq, default=None):
         yield next(it, default)
     yield tuple(it)
 
+
+def ascii_fold(text):
+    """
+    Strip the accents from a unicode string and spell out the Icelandic
+    letters that have no ASCII counterpart.
+
+    >>> ascii_fold(u"\\xde\\xf3r\\xf0ur \\xc6gisson")
+    'Thordur Aegisson'
+    """
+    decomposed = unicodedata.normalize(
+        "NFKD", text.translate(FOLDED_LETTERS))
+    return decomposed.encode("ascii", "ignore")
+
+
 def ignore_exception(exception=Exception, default=None):
     """Returns a decorator that ignores an exception raised by the function it
     decorates.
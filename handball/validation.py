@@ -0,0 +1,122 @@
+# coding: utf-8
+"""
+Cheap consistency checks on the scraped matches, and a queue of the game
+pages that failed them so they can be fetched again on their own.
+
+``check`` returns the problems with a match:
+
+* **missing_team** - the home or away team name is empty (``_find_teams``
+  couldn't split the teams or the game page has no team heading)
+* **missing_roster** - a played game's page has no roster for one of the
+  teams (e.g. the team sheet is empty)
+* **unparsed_date** - the date on the tournament page didn't parse
+* **goals_mismatch** - the goals on a team's roster don't add up to its
+  score (e.g. a column missing from the roster table)
+
+``ValidationPipeline`` counts the problems in the crawl stats
+(``validation/<problem>``) and, with VALIDATION_RETRY_FILE set, writes the
+game pages with problems to the retry queue. After fixing the parser only
+those pages are fetched by passing the queue to the spider:
+
+    scrapy crawl -s VALIDATION_RETRY_FILE=retry.jl -o output.jl hsi-scraper
+    scrapy crawl -s VALIDATION_RETRY_FILE=retry.jl -a retry=retry.jl \\
+        -o repaired.jl hsi-scraper
+
+The queue is replaced at the end of every crawl, so the second command
+leaves in it only the pages that still fail.
+"""
+import json
+import os
+
+from datetime import datetime
+
+from scrapy.utils.serialize import ScrapyJSONEncoder
+
+from .timeline import parse_score
+from .utils import SIDES, team_name
+
+# the fields of a match that come from the tournament page and are passed
+# to the game page in the request meta
+TOURNAMENT_FIELDS = ("tournament", "year", "datetime", "venue", "home",
+                     "away", "full-time", "half-time", "url")
+
+
+def _roster_goals(team):
+    """
+    The goals on a team's roster, or None if the roster has no stats.
+    """
+    goals = [player.get("attempts", {}).get("goals")
+             for player in team.get("roster", [])]
+    goals = [value for value in goals if value is not None]
+    return sum(goals) if goals else None
+
+
+def check(match):
+    """
+    The names of the problems with a match, empty if there are none.
+    """
+    problems = []
+    teams = [match.get(side) for side in SIDES]
+    if not all(team_name(team) for team in teams):
+        problems.append("missing_team")
+    if match.get("datetime") is not None and \
+            not isinstance(match.get("datetime"), datetime):
+        problems.append("unparsed_date")
+
+    score = parse_score(match.get("full-time"))
+    if score and all(hasattr(team, "get") for team in teams):
+        if not all(team.get("roster") for team in teams):
+            problems.append("missing_roster")
+        goals = tuple(_roster_goals(team) for team in teams)
+        if None not in goals and goals != score:
+            problems.append("goals_mismatch")
+    return problems
+
+
+class RetryQueue(object):
+    """
+    The game pages to fetch again, one JSON object per line with the url,
+    the problems and the request meta (the fields of the match from the
+    tournament page). Written to a temporary file that replaces the queue
+    when it's closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.urls = set()
+        self.encoder = ScrapyJSONEncoder()
+        self._file = open(path + ".tmp", "w")
+
+    def add(self, match, problems):
+        url = match.get("url")
+        if not url or url in self.urls:
+            return False
+        self.urls.add(url)
+        meta = dict((field, match.get(field)) for field in TOURNAMENT_FIELDS)
+        meta["home"] = team_name(meta["home"])
+        meta["away"] = team_name(meta["away"])
+        self._file.write(self.encoder.encode({
+            "url": url,
+            "problems": problems,
+            "meta": meta,
+        }) + "\n")
+        return True
+
+    def __len__(self):
+        return len(self.urls)
+
+    def close(self):
+        self._file.close()
+        os.rename(self.path + ".tmp", self.path)
+
+    @staticmethod
+    def read(path):
+        """
+        (url, meta) for each page in the queue at ``path``. The datetime in
+        the meta is text.
+        """
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry["url"], entry["meta"]
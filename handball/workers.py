@@ -0,0 +1,118 @@
+# coding: utf-8
+"""
+Parse pages in a pool of worker processes.
+
+Scrapy runs the spider callbacks in the reactor thread, so with a high
+CONCURRENT_REQUESTS one core ends up doing all the XPath work while the
+downloads wait. ``ParseWorkerPool.submit`` sends the response (url, body,
+encoding and meta) to a worker process instead, where a parse function
+runs over a rebuilt response, and returns a Deferred that fires with the
+result in the reactor thread. Scrapy waits for Deferreds returned by the
+callbacks, so a callback can simply return one:
+
+    def parse_game(self, response):
+        return self.workers.submit(game_item, response)
+
+The parse functions must be module level functions (so they can be
+pickled) that return plain data: dicts, lists, strings, numbers and
+datetimes.
+"""
+import cPickle as pickle
+import multiprocessing
+import signal
+import traceback
+
+from scrapy.http import HtmlResponse, Request
+from twisted.internet import defer, reactor
+
+
+class ParseWorkerError(Exception):
+    """
+    A parse function raised an exception in a worker process, or its
+    arguments or result couldn't be pickled, or no result came back in
+    time. The message is the traceback.
+    """
+
+
+def _init_worker():
+    # Ctrl-C goes to the whole process group, let Scrapy shut the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _parse(data):
+    """
+    Run a function over a response rebuilt from its parts, ``data`` is the
+    pickled (function, url, body, encoding, meta). Returns a tuple (ok,
+    result), where result is the pickled return value or the traceback if
+    it failed. The result is pickled here so a value that can't be pickled
+    fails like an exception does, instead of being lost by the pool. Runs
+    in the worker processes.
+    """
+    try:
+        function, url, body, encoding, meta = pickle.loads(data)
+        response = HtmlResponse(url=url, request=Request(url, meta=meta),
+                                body=body, encoding=encoding)
+        return True, pickle.dumps(function(response), pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+class ParseWorkerPool(object):
+    """
+    A pool of ``processes`` worker processes (one per core by default)
+    running parse functions. A result that doesn't come back within
+    ``timeout`` seconds (e.g. the worker was killed) fails.
+    """
+
+    def __init__(self, processes=None, timeout=180):
+        self.pool = multiprocessing.Pool(processes, _init_worker)
+        self.timeout = timeout
+        self.lost = False
+
+    def submit(self, function, response):
+        """
+        Run ``function(response)`` in a worker. Returns a Deferred that fires
+        with the result, or fails with ``ParseWorkerError``.
+        """
+        try:
+            data = pickle.dumps(
+                (function, response.url, response.body, response.encoding,
+                 dict(response.meta)), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return defer.fail(ParseWorkerError(traceback.format_exc()))
+
+        d = defer.Deferred()
+        timeout = reactor.callLater(self.timeout, self._timed_out, d)
+        self.pool.apply_async(
+            _parse, (data,),
+            callback=lambda result: reactor.callFromThread(
+                self._done, d, timeout, result))
+        return d
+
+    def _done(self, d, timeout, result):
+        if d.called:
+            return
+        timeout.cancel()
+        ok, value = result
+        if ok:
+            try:
+                value = pickle.loads(value)
+            except Exception:
+                d.errback(ParseWorkerError(traceback.format_exc()))
+                return
+            d.callback(value)
+        else:
+            d.errback(ParseWorkerError(value))
+
+    def _timed_out(self, d):
+        # the pool keeps waiting for the result, so it can't be joined
+        self.lost = True
+        d.errback(ParseWorkerError(
+            "No result from the worker in {0} seconds".format(self.timeout)))
+
+    def close(self):
+        if self.lost:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()